@@ -325,10 +325,13 @@ rst_epilog = """
 
 .. |Experiment| replace:: :class:`~experimentator.Experiment`
 .. |ExperimentSection| replace:: :class:`~experimentator.section.ExperimentSection`
+.. |ReadOnlySection| replace:: :class:`~experimentator.readonly.ReadOnlySection`
+.. |save_columns| replace:: :func:`~experimentator.readonly.save_columns`
 .. |Design| replace:: :class:`~experimentator.Design`
 .. |DesignTree| replace:: :class:`~experimentator.DesignTree`
 .. |Ordering| replace:: :class:`~experimentator.order.Ordering`
 .. |Shuffle| replace:: :class:`~experimentator.order.Shuffle`
+.. |ConstrainedShuffle| replace:: :class:`~experimentator.order.ConstrainedShuffle`
 .. |NonAtomicOrdering| replace:: :class:`~experimentator.order.NonAtomicOrdering`
 .. |non-atomic orderings| replace:: :class:`non-atomic orderings <experimentator.order.NonAtomicOrdering>`
 .. |CompleteCounterbalance| replace:: :class:`~experimentator.order.CompleteCounterbalance`
@@ -340,13 +343,32 @@ rst_epilog = """
 .. |Experiment.session_data| replace:: :attr:`Experiment.session_data`
 .. |Experiment.dataframe| replace:: :attr:`Experiment.dataframe <experimentator.Experiment.dataframe>`
 .. |Experiment.save| replace:: :meth:`Experiment.save <experimentator.Experiment.save>`
+.. |Experiment.save_columns| replace:: :meth:`Experiment.save_columns <experimentator.Experiment.save_columns>`
+.. |Experiment.open_readonly| replace:: :meth:`Experiment.open_readonly <experimentator.Experiment.open_readonly>`
+.. |Experiment.export_data| replace:: :meth:`Experiment.export_data <experimentator.Experiment.export_data>`
 .. |Experiment.filename| replace:: :attr:`Experiment.filename <experimentator.Experiment.filename>`
 .. |Experiment.experiment_data| replace:: :attr:`Experiment.experiment_data <experimentator.Experiment.experiment_data>`
+.. |Experiment.min_array_bytes| replace:: :attr:`Experiment.min_array_bytes <experimentator.Experiment.min_array_bytes>`
 .. |Experiment.callback_by_level| replace:: :attr:`Experiment.callback_by_level <experimentator.Experiment.callback_by_level>`
 .. |Experiment.from_yaml_file| replace:: :meth:`Experiment.from_yaml_file <experimentator.Experiment.from_yaml_file>`
 .. |Experiment.from_dict| replace:: :meth:`Experiment.from_dict <experimentator.Experiment.from_dict>`
 .. |Experiment.run_section| replace:: :meth:`Experiment.run_section <experimentator.Experiment.run_section>`
+.. |Experiment.compile_run_plan| replace:: :meth:`Experiment.compile_run_plan <experimentator.Experiment.compile_run_plan>`
+.. |Experiment.run_plan| replace:: :meth:`Experiment.run_plan <experimentator.Experiment.run_plan>`
+.. |Experiment.run_section_async| replace:: :meth:`Experiment.run_section_async <experimentator.Experiment.run_section_async>`
+.. |Experiment.step_section| replace:: :meth:`Experiment.step_section <experimentator.Experiment.step_section>`
+.. |SectionStepper| replace:: :class:`SectionStepper <experimentator.experiment.SectionStepper>`
+.. |SectionStepper.advance| replace:: :meth:`SectionStepper.advance <experimentator.experiment.SectionStepper.advance>`
+.. |SectionStepper.record| replace:: :meth:`SectionStepper.record <experimentator.experiment.SectionStepper.record>`
+.. |SectionStepper.close| replace:: :meth:`SectionStepper.close <experimentator.experiment.SectionStepper.close>`
 .. |Experiment.add_callback| replace:: :meth:`Experiment.add_callback <experimentator.Experiment.add_callback>`
+.. |Experiment.asset_cache| replace:: :meth:`Experiment.asset_cache <experimentator.Experiment.asset_cache>`
+.. |AssetCache| replace:: :class:`AssetCache <experimentator.cache.AssetCache>`
+.. |AssetCache.get| replace:: :meth:`AssetCache.get <experimentator.cache.AssetCache.get>`
+.. |AssetCache.warm| replace:: :meth:`AssetCache.warm <experimentator.cache.AssetCache.warm>`
+.. |Design.conditions| replace:: :meth:`Design.conditions <experimentator.Design.conditions>`
+.. |sys.getsizeof| replace:: :func:`sys.getsizeof`
+.. |Experiment.add_prepare_callback| replace:: :meth:`Experiment.add_prepare_callback <experimentator.Experiment.add_prepare_callback>`
 .. |Experiment.within_subjects| replace:: :meth:`Experiment.within_subjects <experimentator.Experiment.within_subjects>`
 .. |Experiment.blocked| replace:: :meth:`Experiment.blocked <experimentator.Experiment.blocked>`
 .. |Experiment.basic| replace:: :meth:`Experiment.basic <experimentator.Experiment.basic>`
@@ -355,19 +377,38 @@ rst_epilog = """
 .. |ExperimentSection.add_data| replace:: :meth:`ExperimentSection.add_data <experimentator.section.ExperimentSection.add_data>`
 .. |ExperimentSection.append_child| replace:: :meth:`ExperimentSection.append_child <experimentator.section.ExperimentSection.append_child>`
 .. |ExperimentSection.append_design_tree| replace:: :meth:`ExperimentSection.append_design_tree <experimentator.section.ExperimentSection.append_design_tree>`
+.. |ExperimentSection.stream_design_tree| replace:: :meth:`ExperimentSection.stream_design_tree <experimentator.section.ExperimentSection.stream_design_tree>`
 .. |ExperimentSection.subsection| replace:: :meth:`ExperimentSection.subsection <experimentator.section.ExperimentSection.subsection>`
+.. |ExperimentSection.long_dataframe| replace:: :meth:`ExperimentSection.long_dataframe <experimentator.section.ExperimentSection.long_dataframe>`
 .. |ExperimentSection.data| replace:: :attr:`ExperimentSection.data <experimentator.section.ExperimentSection.data>`
 .. |ExperimentSection.new| replace:: :meth:`ExperimentSection.new <experimentator.ExperimentSection.new>`
 .. |data| replace:: :attr:`data <experimentator.section.ExperimentSection.data>`
 .. |Design.first_pass| replace:: :meth:`Design.first_pass <experimentator.Design.first_pass>`
 .. |first_pass| replace:: :meth:`~experimentator.Design.first_pass`
+.. |fractional_factorial| replace:: :func:`~experimentator.design.fractional_factorial`
+.. |orthogonal_array| replace:: :func:`~experimentator.design.orthogonal_array`
 .. |Design.from_dict| replace:: :meth:`Design.from_dict <experimentator.Design.from_dict>`
+.. |Design.get_order| replace:: :meth:`Design.get_order <experimentator.Design.get_order>`
+.. |Design.get_orders| replace:: :meth:`Design.get_orders <experimentator.Design.get_orders>`
+.. |Design.iter_order| replace:: :meth:`Design.iter_order <experimentator.Design.iter_order>`
 .. |DesignTree.from_spec| replace:: :meth:`DesignTree.from_spec <experimentator.DesignTree.from_spec>`
 .. |DesignTree.new| replace:: :meth:`DesignTree.new <experimentator.DesignTree.new>`
+.. |DesignTree.cache_dir| replace:: :attr:`DesignTree.cache_dir <experimentator.DesignTree.cache_dir>`
+.. |DesignTree.cache_enabled| replace:: :attr:`DesignTree.cache_enabled <experimentator.DesignTree.cache_enabled>`
+.. |DesignTree.clear_cache| replace:: :meth:`DesignTree.clear_cache <experimentator.DesignTree.clear_cache>`
+.. |DesignTree.first_pass| replace:: :meth:`DesignTree.first_pass <experimentator.DesignTree.first_pass>`
+.. |DesignTree.plan| replace:: :meth:`DesignTree.plan <experimentator.DesignTree.plan>`
+.. |DesignTree.plan_spec| replace:: :meth:`DesignTree.plan_spec <experimentator.DesignTree.plan_spec>`
 .. |run_experiment_section| replace:: :func:`~experimentator.Experiment.run_experiment_section`
 .. |Ordering.number| replace:: :attr:`Ordering.number <experimentator.order.Ordering.number>`
+.. |Ordering.first_pass| replace:: :meth:`Ordering.first_pass <experimentator.order.Ordering.first_pass>`
+.. |Ordering.is_deterministic| replace:: :attr:`Ordering.is_deterministic <experimentator.order.Ordering.is_deterministic>`
+.. |Ordering.get_order| replace:: :meth:`Ordering.get_order <experimentator.order.Ordering.get_order>`
+.. |Ordering.iter_order| replace:: :meth:`Ordering.iter_order <experimentator.order.Ordering.iter_order>`
+.. |Shuffle.get_order_matrix| replace:: :meth:`Shuffle.get_order_matrix <experimentator.order.Shuffle.get_order_matrix>`
 .. |latin_square| replace:: :func:`~experimentator.order.latin_square`
 .. |balanced_latin_square| replace:: :func:`~experimentator.order.balanced_latin_square`
+.. |williams_design| replace:: :func:`~experimentator.order.williams_design`
 
 .. |experimentator.order| replace:: :mod:`experimentator.order`
 
@@ -379,9 +420,12 @@ rst_epilog = """
 .. |context-managers| replace:: :ref:`context-managers`
 .. |contextlib| replace:: :mod:`contextlib`
 .. |contextlib.contextmanager| replace:: :func:`contextlib.contextmanager`
+.. |contextlib.asynccontextmanager| replace:: :func:`contextlib.asynccontextmanager`
+.. |asyncio| replace:: :mod:`asyncio`
 .. |picklable| replace:: :ref:`picklable <pickle-picklable>`
 
 .. |numpy array| replace:: :class:`numpy array <numpy.ndarray>`
+.. |numpy arrays| replace:: :class:`numpy arrays <numpy.ndarray>`
 .. |DataFrame| replace:: :class:`~pandas.DataFrame`
 .. |DataFrame.to_csv| replace:: :meth:`pandas.DataFrame.to_csv`
 .. |networkx.DiGraph| replace:: :class:`networkx.DiGraph`
@@ -3,7 +3,9 @@
 Usage:
   exp run [options] <exp-file> (--next=<level>  [--not-finished] | (<level> <n>)... [--from=<n>])
   exp resume [options] <exp-file> (<level> | (<level> <n>)...)
-  exp export <exp-file> <data-file> [ --no-index-label --delim=<sep> --skip=<columns> --float=<format> --nan=<rep>]
+  exp export <exp-file> <file>... [ --no-index-label --delim=<sep> --skip=<columns> --float=<format> --nan=<rep>]
+                                [--incremental | --long]
+  exp plan <spec-file> [--max-orders=<n>]
   exp -h | --help
   exp --version
 
@@ -23,6 +25,11 @@ Export options (see pandas.DataFrame.to_csv documentation):
   --skip=<columns>    Comma-separated list of columns to skip.
   --float=<format>    Format string for floating point numbers.
   --nan=<rep>         Missing data representation.
+  --incremental       Only export finished trials, appending those finished since the last incremental export.
+  --long              Only export compound results (e.g. a time series per trial), with one row per element.
+
+Plan options:
+  --max-orders=<n>    Warn about non-atomic orderings creating IVs with more than <n> values [default: 120].
 
 Other options:
   -h, --help        Show full help.
@@ -41,19 +48,28 @@ Commands:
                                        section must have been started but not finished. E.g.:
                                          exp resume exp1.exp participant 2 session 2
 
-  export <exp-file> <data-file>      Export the data in <exp-file> to csv format as <data-file>.
+  export <exp-file> <file>...        Export the data in <exp-file> to csv format as the last <file>, the data file.
+                                     Any other <file> arguments are more experiment files, to combine their data,
+                                     which are loaded in parallel. E.g.:
+                                       exp export site-a.exp site-b.exp two_sites.csv
+                                     Each experiment file can also be a (quoted) glob pattern, e.g. 'site-*.exp'.
                                      Note: This will not produce readable csv files for experiments with results as
-                                           collections (e.g., series, dict). Either write a custom export script, or
-                                           skip the problematic column(s) using the --skip <columns> option.
+                                           collections (e.g., arrays, series). Skip the problematic column(s) using
+                                           the --skip <columns> option, and export them separately using --long.
+
+  plan <spec-file>                   Print the number of sections that the experiment specified in the YAML file
+                                     <spec-file> would have at each level, and estimates of its size in memory and
+                                     on disk, without creating it.
 
 """
 import sys
 import os
 import logging
+from glob import glob
 from docopt import docopt
 from schema import Schema, Use, And, Or
 
-from experimentator import __version__, Experiment, run_experiment_section, export_experiment_data
+from experimentator import __version__, yaml, Experiment, DesignTree, run_experiment_section, export_experiment_data
 
 
 def main(args=None):
@@ -64,6 +80,9 @@ def main(args=None):
                      '--delim': str,
                      '--demo': bool,
                      '--help': bool,
+                     '--incremental': bool,
+                     '--long': bool,
+                     '--max-orders': And(Use(int), lambda n: n > 0),
                      '--float': Or(None, str),
                      '--from': Or(None, Use(lambda x: list(map(int, x.split(','))))),
                      '--nan': Or(None, str),
@@ -74,11 +93,13 @@ def main(args=None):
                      '--skip': Or(None, Use(lambda x: x.split(','))),
                      '--skip-parents': bool,
                      '--version': bool,
-                     '<data-file>': Or(None, str),
-                     '<exp-file>': Or(lambda x: x is None, os.path.exists, error='Invalid <exp-file>'),
+                     '<exp-file>': Or(None, os.path.exists, glob, error='Invalid <exp-file>'),
+                     '<file>': [str],
+                     '<spec-file>': Or(None, os.path.exists, error='Invalid <spec-file>'),
                      '<level>': [str],
                      '<n>': [And(Use(int), lambda n: n > 0)],
                      'export': bool,
+                     'plan': bool,
                      'resume': bool,
                      'run': bool,
                      })
@@ -110,9 +131,40 @@ def main(args=None):
         run_experiment_section(exp, **kwargs)
 
     elif options['export']:
-        export_experiment_data(options['<exp-file>'], options['<data-file>'],
+        *exp_files, data_file = [options['<exp-file>']] + options['<file>']
+        Schema([Or(os.path.exists, glob, error='Invalid <exp-file>')]).validate(exp_files)
+        export_experiment_data(exp_files[0] if len(exp_files) == 1 else exp_files, data_file,
                                float_format=options['--float'],
                                skip_columns=options['--skip'],
                                index_label=False if options['--no-index-label'] else None,
                                na_rep=options['--nan'],
-                               sep=options['--delim'])
+                               sep=options['--delim'],
+                               incremental=options['--incremental'],
+                               long_format=options['--long'])
+
+    elif options['plan']:
+        with open(options['<spec-file>'], 'r') as f:
+            spec = yaml.load(f)
+        plan = DesignTree.plan_spec(spec['design'], max_orders=options['--max-orders'])
+        print(format_plan(plan))
+
+
+def format_plan(plan):
+    width = max(len(level) for level in list(plan.sections) + ['total'])
+    lines = ['{:<{}}  {:>12,}'.format(level, width, n) for level, n in plan.sections.items()]
+    lines.append('{:<{}}  {:>12,}'.format('total', width, plan.n_sections))
+    lines.append('')
+    lines.append('Estimated memory: {}'.format(_format_bytes(plan.memory)))
+    lines.append('Estimated file size: {}'.format(_format_bytes(plan.disk)))
+    lines.extend('Warning: {}'.format(warning) for warning in plan.warnings)
+    return '\n'.join(lines)
+
+
+def _format_bytes(n_bytes):
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if n_bytes < 1000:
+            break
+        n_bytes /= 1000
+    else:
+        unit = 'TB'
+    return '{:.3g} {}'.format(n_bytes, unit)
@@ -0,0 +1,62 @@
+"""
+Asynchronous version of |Experiment.run_section|, for callbacks that are coroutine functions
+or asynchronous context managers. This module uses ``async`` syntax (and is supported on Python 3.7 or later),
+so it is only imported when |Experiment.run_section_async| is called.
+
+"""
+import asyncio
+import inspect
+
+from experimentator.experiment import _plan_steps, _PREPARE, _CALL, _ENTER, _EXIT
+
+
+async def run_section(experiment, section, demo=False, parent_callbacks=True, from_section=None):
+    await run_plan(experiment, experiment.compile_run_plan(section,
+                                                           demo=demo,
+                                                           parent_callbacks=parent_callbacks,
+                                                           from_section=from_section))
+
+
+async def run_plan(experiment, plan):
+    """
+    Run a plan compiled by |Experiment.compile_run_plan|, like |Experiment.run_plan|,
+    but awaiting coroutine callbacks and asynchronous context managers.
+    Performs the steps yielded by ``experimentator.experiment._plan_steps``.
+
+    """
+    steps = _plan_steps(experiment, plan)
+    try:
+        step, value, section = next(steps)
+    except StopIteration:
+        return
+
+    while True:
+        try:
+            if step is _CALL:
+                if inspect.isawaitable(value):
+                    value = await value
+            elif step is _ENTER:
+                if hasattr(value, '__aenter__'):
+                    value = await value.__aenter__()
+                else:
+                    value = value.__enter__()
+            elif step is _EXIT:
+                context, exc_info = value
+                if hasattr(context, '__aexit__'):
+                    value = await context.__aexit__(*exc_info)
+                else:
+                    value = context.__exit__(*exc_info)
+            elif step is _PREPARE:
+                value = await asyncio.wrap_future(value)
+            else:
+                value = None
+        except BaseException as error:
+            try:
+                step, value, section = steps.throw(error)
+            except StopIteration:
+                return
+        else:
+            try:
+                step, value, section = steps.send(value)
+            except StopIteration:
+                return
@@ -1,7 +1,14 @@
+import os
+import re
+import hashlib
+import threading
+from logging import getLogger
 from collections.abc import Iterable
+from contextlib import contextmanager
 import yaml
 import numpy as np
 
+logger = getLogger(__name__)
 
 DTYPE_REPLACEMENTS = {
     'str256': '<U8',
@@ -36,11 +43,130 @@ def safe_ignore_aliases(data):
 yaml.representer.SafeRepresenter.ignore_aliases = staticmethod(safe_ignore_aliases)
 
 
-@add_representer(np.ndarray)
+class _ArrayStore:
+    """Sidecar directory of ``.npy`` files holding large arrays, named by a hash of their contents."""
+    def __init__(self, filename, min_bytes=None):
+        self.base = os.path.dirname(os.path.abspath(filename))
+        self.filename = os.path.basename(filename)
+        self.directory = self.filename + '.arrays'
+        self.min_bytes = min_bytes
+        self.referenced = set()
+
+    def accepts(self, array):
+        if self.is_stored(array):
+            return True
+        return self.min_bytes is not None and array.nbytes >= self.min_bytes and not array.dtype.hasobject
+
+    def is_stored(self, array):
+        # Arrays loaded from this store stay in it, whatever the threshold.
+        filename = getattr(array, 'filename', None)
+        return (isinstance(array, np.memmap) and filename is not None
+                and os.path.dirname(filename) == os.path.join(self.base, self.directory))
+
+    def write(self, array):
+        digest = hashlib.sha1('{}{}'.format(array.dtype.str, array.shape).encode())
+        digest.update(np.ascontiguousarray(array))
+        name = '{}/{}.npy'.format(self.directory, digest.hexdigest())
+        path = os.path.join(self.base, name)
+        # Identical contents always get the same name, so arrays saved previously aren't rewritten.
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, array, allow_pickle=False)
+        self.referenced.add(name)
+        return name
+
+    def read(self, name):
+        return np.load(os.path.join(self.base, name), mmap_mode='r')
+
+    def remove_unreferenced(self):
+        """
+        Delete array files that were not written (or reused) since this store was created,
+        unless another file still refers to them.
+
+        """
+        directory = os.path.join(self.base, self.directory)
+        if not os.path.isdir(directory):
+            return
+        referenced = self.referenced | self.referenced_elsewhere()
+        for file in os.listdir(directory):
+            if file.endswith('.npy') and '{}/{}'.format(self.directory, file) not in referenced:
+                try:
+                    os.remove(os.path.join(directory, file))
+                except OSError:
+                    logger.warning('Could not remove unused array file {}.'.format(file))
+        if not os.listdir(directory):
+            os.rmdir(directory)
+
+    def referenced_elsewhere(self):
+        """
+        Find the array files referred to by other files named after this one,
+        such as the backups written by ``run_experiment_section``, which refer to the same directory.
+
+        """
+        pattern = re.compile(re.escape(self.directory) + r'/[0-9a-f]+\.npy')
+        referenced = set()
+        for file in os.listdir(self.base):
+            path = os.path.join(self.base, file)
+            if not file.startswith(self.filename + '.') or file == self.directory or not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'r', errors='ignore') as f:
+                    for line in f:
+                        if '!npy' in line:
+                            referenced.update(pattern.findall(line))
+            except OSError:
+                logger.warning('Could not read {} to check for arrays it uses.'.format(file))
+        return referenced
+
+# The store in use by the current thread, so that threads can save and load experiments independently.
+_local = threading.local()
+
+
+@contextmanager
+def array_store(filename, min_bytes=None, dumping=False):
+    """
+    Within this context, store large arrays in files next to the YAML file `filename` rather than in the YAML itself.
+
+    When dumping, arrays of at least `min_bytes` bytes are saved in the directory ``<filename>.arrays``
+    and represented in the YAML by their path.
+    Arrays loaded from that directory are saved there again, even if `min_bytes` is None.
+    If `dumping` is True, array files no longer referenced by `filename` are removed afterwards,
+    unless another file whose name starts with `filename` (e.g., a backup) still refers to them.
+    When loading, such arrays are memory-mapped (read-only) from the files they were saved in.
+
+    """
+    previous = getattr(_local, 'store', None)
+    _local.store = store = _ArrayStore(filename, min_bytes)
+    try:
+        yield
+    finally:
+        _local.store = previous
+    if dumping:
+        store.remove_unreferenced()
+
+
+def _active_store():
+    return getattr(_local, 'store', None)
+
+
+@add_representer([np.ndarray, np.memmap])
 def ndarray_representer(dumper, data):
+    store = _active_store()
+    if store and store.accepts(data):
+        return dumper.represent_scalar('!npy', store.write(data))
     return dumper.represent_list(data.tolist())
 
 
+@add_constructor('!npy')
+def ndarray_file_constructor(loader, node):
+    name = loader.construct_scalar(node)
+    store = _active_store()
+    if not store:
+        raise ValueError("Cannot load array file '{}' without knowing the file it belongs to; "
+                         "use Experiment.load".format(name))
+    return store.read(name)
+
+
 @add_representer([complex, np.complex, np.complex128])
 def complex_representer(dumper, data):
     return dumper.represent_scalar('!complex', repr(data).strip('()'))
@@ -0,0 +1,214 @@
+"""
+This module contains |AssetCache|, a cache for resources such as stimuli, keyed by IV values.
+Callbacks get an |AssetCache| from |Experiment.asset_cache|,
+so that a resource shared by many sections is only loaded once per session.
+
+"""
+import sys
+import threading
+from logging import getLogger
+from collections import OrderedDict, namedtuple
+
+from experimentator.section import ExperimentSection
+from experimentator.design import Design
+
+logger = getLogger(__name__)
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'evictions', 'size', 'nbytes'))
+
+
+def default_sizeof(value):
+    """
+    Estimate the size of a value in bytes, using its ``nbytes`` attribute if it has one
+    (as numpy arrays do), or |sys.getsizeof| otherwise.
+
+    """
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(value)
+
+
+class AssetCache:
+    """
+    A least-recently-used cache of resources, keyed by the IV values of sections.
+
+    The resource for a section is loaded by calling `load` with a dictionary of the section's IV values,
+    the first time a section with those values is passed to |AssetCache.get|.
+    After that, sections in the same condition get the same resource without loading it again,
+    until it is evicted to keep the cache within `maxsize` items and `maxbytes` bytes.
+    An |AssetCache| can be shared between threads, such as prepare callbacks
+    (see |Experiment.add_prepare_callback|).
+
+    Parameters
+    ----------
+    load : function
+        Called with a dictionary mapping IV names to values, returns the resource for that condition.
+    ivs : list of str, optional
+        The names of the IVs that determine the resource.
+        By default, these are the IVs of the designs at the section's level.
+        Passing IV names is necessary when the resource depends on the IVs of a higher level.
+    maxsize : int, optional
+        The maximum number of resources to keep (default 128). If None, the number is not limited.
+    maxbytes : int, optional
+        The maximum total size of the resources to keep, in bytes. If None (the default), the size is not limited.
+        A resource larger than this is returned without being cached.
+    sizeof : function, optional
+        Called with a resource, returns its size in bytes.
+        By default, the ``nbytes`` attribute is used if it exists (as with numpy arrays),
+        otherwise |sys.getsizeof|, which doesn't count the contents of containers.
+
+    Examples
+    --------
+    >>> from experimentator.cache import AssetCache
+    >>> images = AssetCache(lambda condition: load_image(condition['image_file']), maxbytes=500e6)
+    >>> image = images.get(section)
+
+    """
+    def __init__(self, load, ivs=None, maxsize=128, maxbytes=None, sizeof=None):
+        if maxsize is not None and maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        if maxbytes is not None and maxbytes <= 0:
+            raise ValueError('maxbytes must be positive')
+
+        self.load = load
+        self.ivs = None if ivs is None else list(ivs)
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof or default_sizeof
+
+        self._items = OrderedDict()  # Maps keys to (resource, size) pairs, least recently used first.
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def key(self, condition):
+        """
+        Get the cache key of a section or condition.
+
+        Parameters
+        ----------
+        condition : |ExperimentSection| or dict
+            A section, or a dictionary mapping IV names to values.
+
+        Returns
+        -------
+        tuple
+            Pairs of IV names and values, sorted by name unless `ivs` was passed to the constructor.
+
+        """
+        if isinstance(condition, ExperimentSection):
+            data = condition.data
+            if self.ivs is None:
+                iv_names = {name for design in condition.tree[0].design for name in design.iv_names}
+                names = sorted(name for name in iv_names if name in data)
+            else:
+                names = self.ivs
+        else:
+            data = condition
+            names = sorted(condition) if self.ivs is None else self.ivs
+
+        return tuple((name, data[name]) for name in names)
+
+    def get(self, condition):
+        """
+        Get the resource for a section or condition, loading it if it isn't cached.
+
+        Parameters
+        ----------
+        condition : |ExperimentSection| or dict
+            A section, or a dictionary mapping IV names to values.
+
+        Returns
+        -------
+        object
+            The value returned by `load`.
+
+        """
+        key = self.key(condition)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self._hits += 1
+                return self._items[key][0]
+            self._misses += 1
+
+        # Load without holding the lock, so other threads can use the cache in the meantime.
+        resource = self.load(dict(key))
+        self._add(key, resource)
+        return resource
+
+    def warm(self, conditions):
+        """
+        Load the resources for many conditions ahead of time, e.g. before a session starts.
+
+        Parameters
+        ----------
+        conditions : |Design| or iterable
+            A |Design|, in which case every condition of the design is loaded (see |Design.conditions|),
+            or an iterable of sections or dictionaries mapping IV names to values.
+
+        """
+        if isinstance(conditions, Design):
+            conditions = conditions.conditions()
+
+        evictions = self._evictions
+        for condition in conditions:
+            key = self.key(condition)
+            with self._lock:
+                if key in self._items:
+                    continue
+            self._add(key, self.load(dict(key)))
+
+        if self._evictions > evictions:
+            logger.warning('The asset cache is too small to hold every condition; {} were evicted while warming.'
+                           .format(self._evictions - evictions))
+
+    def _add(self, key, resource):
+        size = self.sizeof(resource) if self.maxbytes is not None else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            logger.debug('Not caching resource of {} bytes for {}.'.format(size, key))
+            return
+
+        with self._lock:
+            if key in self._items:  # Loaded by another thread in the meantime.
+                return
+            self._items[key] = resource, size
+            self._nbytes += size
+
+            while ((self.maxsize is not None and len(self._items) > self.maxsize) or
+                   (self.maxbytes is not None and self._nbytes > self.maxbytes)):
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._nbytes -= evicted_size
+                self._evictions += 1
+
+    def cache_info(self):
+        """
+        Get statistics about the cache.
+
+        Returns
+        -------
+        CacheInfo
+            A namedtuple with the number of ``hits``, ``misses`` and ``evictions`` so far,
+            and the current number of resources (``size``) and their total size in bytes (``nbytes``,
+            only counted when `maxbytes` is set).
+
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, len(self._items), self._nbytes)
+
+    def clear(self):
+        """
+        Remove every resource from the cache. Statistics are kept.
+
+        """
+        with self._lock:
+            self._items.clear()
+            self._nbytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, condition):
+        return self.key(condition) in self._items
@@ -3,16 +3,30 @@ This module contains objects related to experimental design abstractions.
 Public objects are imported in ``__init__.py``.
 
 """
-from collections.abc import Iterable
+from collections.abc import Iterable, Sequence
+import os
+import pickle
+import hashlib
 import itertools
 import collections
-from copy import copy
+import logging
+from copy import copy, deepcopy
+from math import factorial
+import sys
 import numpy as np
 from schema import Schema, Or, Optional, And, Use
 
 import experimentator.order as order
+from experimentator import yaml
+from experimentator.section import ExperimentSection
+from experimentator.__version__ import __version__
+
+logger = logging.getLogger(__name__)
 
 Level = collections.namedtuple('Level', ('name', 'design'))
+Plan = collections.namedtuple('Plan', ('sections', 'n_sections', 'memory', 'disk', 'warnings'))
+_LevelLayout = collections.namedtuple('_LevelLayout', ('level', 'n_sections', 'n_children', 'depth', 'n_maps',
+                                                       'is_bottom', 'designs', 'conditions'))
 
 
 class Design:
@@ -44,6 +58,14 @@ class Design:
     extra_data : dict, optional
         Items from this dictionary will be included in the |data| attribute
         of any |ExperimentSection| instances created with this |Design|.
+    resolution : int, optional
+        If passed, rather than fully crossing the IVs, use a regular two-level fractional factorial design
+        of this resolution (see |fractional_factorial|).
+        Every IV must have two levels.
+    strength : int, optional
+        If passed, rather than fully crossing the IVs, use an orthogonal array of this strength
+        (see |orthogonal_array|).
+        Every IV must have the same number of levels.
 
     Attributes
     ----------
@@ -51,6 +73,8 @@ class Design:
     iv_values : list of tuple
     design_matrix : array-like
     extra_data : dict
+    resolution : int
+    strength : int
     ordering : |Ordering|
     heterogeneous_design_iv_name : str
         The IV name that triggers a heterogeneous (i.e., branching) tree structure when it is encountered.
@@ -84,7 +108,7 @@ class Design:
     """
     heterogeneous_design_iv_name = 'design'
 
-    def __init__(self, ivs=None, design_matrix=None, ordering=None, extra_data=None):
+    def __init__(self, ivs=None, design_matrix=None, ordering=None, extra_data=None, resolution=None, strength=None):
         if isinstance(ivs, dict):
             ivs = list(ivs.items())
         if ivs:
@@ -95,8 +119,13 @@ class Design:
             self.iv_names = []
             self.iv_values = []
 
+        if sum(arg is not None for arg in (design_matrix, resolution, strength)) > 1:
+            raise ValueError('Pass at most one of design_matrix, resolution, and strength')
+
         self.design_matrix = design_matrix
         self.extra_data = extra_data or {}
+        self.resolution = resolution
+        self.strength = strength
 
         if ordering:
             self.ordering = ordering
@@ -118,8 +147,9 @@ class Design:
             A dictionary containing some of the following keys (all optional):
             ``'name'``, the name of the level;
             ``'ivs'``, ``'design_matrix'``, ``'extra_data'``, keyword arguments to the |Design| constructor;
-            ``'order'`` or ``'ordering'``, a string, dictionary, or list determining the ordering method; and
-            ``'n'`` or ``'number'``, the ``number`` argument to the specified ordering.
+            ``'order'`` or ``'ordering'``, a string, dictionary, or list determining the ordering method;
+            ``'n'`` or ``'number'``, the ``number`` argument to the specified ordering; and
+            ``'resolution'`` or ``'strength'``, to generate a fractional design.
             A dictionary containing any fields not otherwise used
             is passed to the |Design| constructor as the ``extra_data`` argument.
             See the |description in the docs| for more information.
@@ -142,7 +172,7 @@ class Design:
         ...'ordering': 'Shuffle',
         ...'n': 3}
         >>> Design.from_dict(design_spec)
-        Level(name='block', design=Design(ivs=[('speed', [1, 2, 3]), ('size', [15, 30])], design_matrix=None, ordering=Shuffle(number=3, avoid_repeats=False), extra_data={}))
+        Level(name='block', design=Design(ivs=[('speed', [1, 2, 3]), ('size', [15, 30])], design_matrix=None, ordering=Shuffle(number=3, avoid_repeats=False), extra_data={}, resolution=None, strength=None))
 
         """
         inputs = Schema({
@@ -151,8 +181,11 @@ class Design:
             Optional('design_matrix'): Use(np.asarray),
             Optional(Or('order', 'ordering')): Use(order.OrderSchema.from_any),
             Optional(Or('n', 'number')): int,
+            Optional('resolution'): int,
+            Optional('strength'): int,
             Optional(
-                lambda x: x not in {'name', 'ivs', 'design_matrix', 'order', 'ordering', 'n', 'number'}
+                lambda x: x not in {'name', 'ivs', 'design_matrix', 'order', 'ordering', 'n', 'number',
+                                    'resolution', 'strength'}
                 # Necessary due to https://github.com/keleshev/schema/issues/57
             ): object,
         }).validate(spec)
@@ -169,7 +202,7 @@ class Design:
 
         name = inputs.pop('name', None)
 
-        extra_keys = set(inputs) - {'ivs', 'design_matrix', 'ordering'}
+        extra_keys = set(inputs) - {'ivs', 'design_matrix', 'ordering', 'resolution', 'strength'}
         if extra_keys:
             inputs['extra_data'] = {key: inputs.pop(key) for key in extra_keys}
 
@@ -177,14 +210,21 @@ class Design:
         return Level(name, self) if name else self
 
     def __repr__(self):
-        return 'Design(ivs={}, design_matrix={}, ordering={}, extra_data={})'.format(
-            list(zip(self.iv_names, self.iv_values)), self.design_matrix, self.ordering, self.extra_data)
+        return 'Design(ivs={}, design_matrix={}, ordering={}, extra_data={}, resolution={}, strength={})'.format(
+            list(zip(self.iv_names, self.iv_values)), self.design_matrix, self.ordering, self.extra_data,
+            self.resolution, self.strength)
 
     def __eq__(self, other):
         if isinstance(other, type(self)):
             return self.__dict__ == other.__dict__
         return False
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Designs saved before fractional designs existed.
+        self.__dict__.setdefault('resolution', None)
+        self.__dict__.setdefault('strength', None)
+
     def get_order(self, data=None):
         """Order the conditions.
 
@@ -194,9 +234,44 @@ class Design:
             A list of dictionaries, each specifying a condition (a mapping from IV names to values).
 
         """
-        condition_order = self.ordering.get_order(data)
-        for condition in condition_order:
-            condition.update(self.extra_data)
+        return self._add_extra_data(self.ordering.get_order(data))
+
+    def iter_order(self, data=None):
+        """Iterate over an order of the conditions, generated lazily if the ordering supports it
+        (see |Ordering.iter_order|).
+
+        Yields
+        ------
+        dict
+            A condition, a mapping from IV names to values.
+
+        """
+        for condition in self.ordering.iter_order(data):
+            yield self._add_extra_data([condition])[0]
+
+    def get_orders(self, data_list):
+        """Order the conditions for several sections at once.
+
+        Parameters
+        ----------
+        data_list : sequence of dict
+            For each section to order, the data of its parent section.
+
+        Returns
+        -------
+        list of list of dict
+            For each element of `data_list`, a list of conditions as returned by |Design.get_order|.
+
+        """
+        return [self._add_extra_data(condition_order) for condition_order in self.ordering.get_orders(data_list)]
+
+    def _add_extra_data(self, condition_order):
+        # Conditions are given their extra data in first_pass,
+        # but designs saved by earlier versions, which added it here, may have conditions without it.
+        if self.extra_data:
+            for condition in condition_order:
+                if not self.extra_data.keys() <= condition.keys():
+                    condition.update(self.extra_data)
         return condition_order
 
     def first_pass(self):
@@ -218,17 +293,38 @@ class Design:
             The possible values of the IV.
             Empty for atomic orderings.
 
+        """
+        all_conditions = self.conditions()
+        iv = self.ordering.first_pass(all_conditions)
+
+        # Every section in a condition refers to the same dictionary, so extra data is only added once.
+        # Orderings keep the dictionaries they are passed, so this can follow the ordering's first pass,
+        # which sees only IV values.
+        for condition in all_conditions:
+            condition.update(self.extra_data)
+
+        return iv
+
+    def conditions(self):
+        """
+        Get the conditions of the design, from its design matrix or by crossing the IVs, before any ordering.
+
+        Returns
+        -------
+        list of dict
+            Each condition is a dictionary mapping IV names to IV values.
+
         """
         if self.design_matrix is not None:
             if not np.shape(self.design_matrix)[1] == len(self.iv_names):
                 raise TypeError("Size of design matrix doesn't match number of IVs")
 
-            all_conditions = self._parse_design_matrix(self.design_matrix)
+            return self._parse_design_matrix(self.design_matrix)
 
-        else:
-            all_conditions = self.full_cross(self.iv_names, self.iv_values)
+        elif self.resolution is not None or self.strength is not None:
+            return self._parse_design_matrix(self._fractional_design_matrix())
 
-        return self.ordering.first_pass(all_conditions)
+        return list(self.full_cross(self.iv_names, self.iv_values))
 
     def update(self, names, values):
         """
@@ -268,23 +364,58 @@ class Design:
         yield from (dict(zip(iv_names, iv_combination)) for iv_combination in iv_combinations)
 
     def _parse_design_matrix(self, design_matrix):
-        values_per_factor = [np.unique(column) for column in np.transpose(design_matrix)]
-        if any(iv_values and not len(iv_values) == len(values)
-               for iv_values, values in zip(self.iv_values, values_per_factor)):
+        columns = np.transpose(design_matrix)
+        codes_per_factor = [np.unique(column, return_inverse=True) for column in columns]
+        if any(iv_values and not len(iv_values) == len(codes)
+               for iv_values, (codes, _) in zip(self.iv_values, codes_per_factor)):
             raise ValueError('Unique elements in design matrix do not match number of values in IV definition')
 
-        conditions = []
-        for row in design_matrix:
-            condition = self.extra_data.copy()
-            for iv_name, iv_values, factor_values, design_matrix_value in zip(
-                    self.iv_names, self.iv_values, values_per_factor, row):
-                if iv_values:
-                    condition.update({iv_name: np.array(iv_values)[factor_values == design_matrix_value][0]})
-                else:
-                    condition.update({iv_name: design_matrix_value})
-            conditions.append(condition)
-
-        return conditions
+        values_per_factor = []
+        for iv_values, column, (_, inverse) in zip(self.iv_values, columns, codes_per_factor):
+            if iv_values:
+                # The nth smallest code stands for the nth IV value.
+                # An object array keeps the IV values as they were given, rather than as numpy scalars.
+                values = np.empty(len(iv_values), dtype=object)
+                for i, value in enumerate(iv_values):
+                    values[i] = value
+                values_per_factor.append(values[inverse].tolist())
+            else:
+                values_per_factor.append(column.tolist())
+
+        return [dict(zip(self.iv_names, row)) for row in zip(*values_per_factor)]
+
+    def _count_conditions(self, extra_iv_counts=()):
+        # For each distinct condition, how many times it would be passed to the ordering;
+        # and how many conditions would have each value of the heterogeneous design IV.
+        # `extra_iv_counts` are the numbers of values of IVs added by non-atomic orderings one level down.
+        n_extra = int(np.prod(extra_iv_counts, dtype=object))
+        branch_iv = self.heterogeneous_design_iv_name
+
+        if self.design_matrix is None and self.resolution is None and self.strength is None:
+            n_values = [len(iv_values) for iv_values in self.iv_values]
+            counts = int(np.prod(n_values, dtype=object)) * n_extra * [1]
+            if not self.is_heterogeneous:
+                return counts, {}
+            branches = self.branches
+            return counts, {branch: len(counts) // len(branches) for branch in branches}
+
+        matrix = self.design_matrix if self.design_matrix is not None else self._fractional_design_matrix()
+        conditions = self._parse_design_matrix(matrix)
+        _, counts = order._count_distinct(conditions)
+        counts = [count for count in counts for _ in range(n_extra)]
+        branches = collections.Counter(condition[branch_iv] for condition in conditions if branch_iv in condition)
+        return counts, {branch: n_extra * n for branch, n in branches.items()}
+
+    def _fractional_design_matrix(self):
+        n_levels = {len(iv_values) for iv_values in self.iv_values}
+        if self.resolution is not None:
+            if n_levels != {2}:
+                raise ValueError('Every IV must have two levels to use a fractional factorial design')
+            return fractional_factorial(len(self.iv_names), self.resolution)
+
+        if len(n_levels) != 1:
+            raise ValueError('Every IV must have the same number of levels to use an orthogonal array')
+        return orthogonal_array(n_levels.pop(), len(self.iv_names), self.strength)
 
     @property
     def is_heterogeneous(self):
@@ -311,6 +442,20 @@ class DesignTree:
     other_designs : dict
     branches : dict
         Only those items from `other_designs` that follow directly from this tree.
+    cache_enabled : bool
+        A class attribute, ``False`` by default.
+        If True, the results of |DesignTree.first_pass| are cached in memory,
+        keyed by a hash of the designs (and experimentator's version),
+        so that creating the same tree again in this Python session doesn't repeat the work.
+        Nothing is written to disk unless `cache_dir` is also set.
+        Trees are only cached if every ordering is deterministic (see |Ordering.is_deterministic|;
+        e.g., not |LatinSquare| without a `seed`) and every IV's values are a sequence.
+        Use |DesignTree.clear_cache| to empty the in-memory cache.
+    cache_dir : str
+        A class attribute, ``None`` by default.
+        If `cache_dir` is set, the results of |DesignTree.first_pass| are also cached as files in this directory
+        (and in memory, whether or not `cache_enabled` is True),
+        so that creating the same tree again, even in another Python session, doesn't repeat the work.
 
     Notes
     -----
@@ -321,6 +466,11 @@ class DesignTree:
     and the values are the corresponding |DesignTree| instances.
 
     """
+    cache_enabled = False
+    cache_dir = None
+    _first_pass_cache = {}
+    _CACHED_ATTRIBUTES = ('_next', '_length')
+
     def __init__(self, levels_and_designs=None, other_designs=None, branches=None):
         self.levels_and_designs = levels_and_designs or []
         self.other_designs = other_designs or {}
@@ -351,16 +501,7 @@ class DesignTree:
             determines which |DesignTree| is used for children of that section.
 
         """
-        if isinstance(levels_and_designs, collections.OrderedDict):
-            levels_and_designs = list(levels_and_designs.items())
-
-        # Check for singleton Designs.
-        for i, (level, design) in enumerate(levels_and_designs):
-            if isinstance(design, Design):
-                levels_and_designs[i] = (level, [design])
-
-        # Convert to namedtuples.
-        levels_and_designs = [Level(*level) for level in levels_and_designs]
+        levels_and_designs = cls._to_levels(levels_and_designs)
 
         # Handle heterogeneous trees.
         bottom_level_design = levels_and_designs[-1].design[0]
@@ -381,6 +522,146 @@ class DesignTree:
         self.first_pass(self.levels_and_designs)
         return self
 
+    @staticmethod
+    def _to_levels(levels_and_designs):
+        if isinstance(levels_and_designs, collections.OrderedDict):
+            levels_and_designs = list(levels_and_designs.items())
+
+        # Check for singleton Designs and convert to namedtuples.
+        return [Level(level, [design] if isinstance(design, Design) else design)
+                for level, design in levels_and_designs]
+
+    @classmethod
+    def plan(cls, levels_and_designs, max_orders=120, **other_designs):
+        """
+        Plan the sections a |DesignTree| would create, without creating it.
+        Takes the same arguments as |DesignTree.new|;
+        the numbers of sections are computed from the designs rather than by creating the tree,
+        so no |Design| is modified and no ordering's |Ordering.first_pass| is called.
+
+        Parameters
+        ----------
+        levels_and_designs : |OrderedDict| or list of tuple
+            See |DesignTree.new|.
+        max_orders : int, optional
+            Warn if a non-atomic ordering (e.g., |CompleteCounterbalance| or |LatinSquare|)
+            would create an IV with more values than this (default 120).
+            Every value of such an IV is crossed with the other IVs one level up.
+        **other_designs
+            See |DesignTree.new|.
+
+        Returns
+        -------
+        sections : |OrderedDict|
+            The number of sections at each level, from the top down,
+            counting the top level as the children of a single section
+            (e.g., the base section of an |Experiment|).
+            Levels of heterogeneous branches with the same name are counted together.
+        n_sections : int
+            The total number of sections.
+        memory : int
+            An estimate of the memory used by the sections, in bytes, before any results are added.
+        disk : int
+            An estimate of the size of the saved |Experiment|, in bytes, before any results are added.
+        warnings : list of str
+
+        Notes
+        -----
+        Each section holds its own section number and refers to the data of its condition and of its parents,
+        which are shared rather than copied (see |ExperimentSection|).
+        The estimates therefore add, for every section,
+        the size of the section itself and of those references (in memory, or as YAML aliases on disk),
+        to the size of every distinct condition, computed from the IV values and extra data of its design.
+
+        See Also
+        --------
+        experimentator.DesignTree.plan_spec
+
+        """
+        sections = collections.OrderedDict()
+        warnings = []
+        layouts = []
+        cls._plan_levels(levels_and_designs, other_designs, 1, sections, warnings, max_orders, layouts)
+        memory, disk = _estimate_sizes(layouts)
+        return Plan(sections, sum(sections.values()), memory, disk, warnings)
+
+    @classmethod
+    def plan_spec(cls, spec, max_orders=120):
+        """
+        Plan the sections a |DesignTree| would create from a specification, without creating it.
+        See |DesignTree.from_spec| and |DesignTree.plan|.
+
+        """
+        main_tree, other_trees = cls._parse_spec(spec)
+        return cls.plan(main_tree, max_orders=max_orders, **other_trees)
+
+    @classmethod
+    def _plan_levels(cls, levels_and_designs, other_designs, n_parents, sections, warnings, max_orders, layouts,
+                     depth=1, n_maps=1):
+        # `depth` is the depth of the top level below the base section,
+        # and `n_maps` the number of layers in the data of its parents.
+        if isinstance(levels_and_designs, DesignTree):
+            # Already created, so the IVs of non-atomic orderings are already included.
+            levels = levels_and_designs.levels_and_designs
+            extra_ivs = [[] for _ in levels]
+            other_designs = dict(other_designs, **levels_and_designs.branches)
+        else:
+            levels = cls._to_levels(levels_and_designs)
+            extra_ivs = cls._plan_non_atomic_ivs(levels, warnings, max_orders)
+
+        branches = {}
+        for i, ((level, designs), extra) in enumerate(zip(levels, extra_ivs)):
+            extra_counts = [n for _, n in extra]
+            n_children = 0
+            child_maps = n_maps + 1
+            branches = collections.Counter()
+            conditions = []
+            for design in designs:
+                counts, design_branches = design._count_conditions(extra_counts)
+                n_children += design.ordering.number * sum(counts)
+                for branch, n in design_branches.items():
+                    branches[branch] += design.ordering.number * n * n_parents
+                if design.iv_names or design.extra_data or extra:
+                    # A condition with data gets its own layer.
+                    child_maps = n_maps + 2
+                    conditions.append((design, extra, len(counts)))
+
+            is_bottom = i == len(levels) - 1 and not branches
+            layouts.append(_LevelLayout(level, n_parents * n_children, n_children, depth + i, child_maps,
+                                        is_bottom, designs, conditions))
+            sections[level] = sections.get(level, 0) + n_parents * n_children
+            n_parents *= n_children
+            n_maps = child_maps
+
+        # Only the bottom level of a tree can be heterogeneous.
+        for branch, n_branch_parents in branches.items():
+            if branch not in other_designs:
+                raise ValueError("No design named '{}' for a heterogeneous tree".format(branch))
+            other_trees = {name: tree for name, tree in other_designs.items() if name != branch}
+            cls._plan_levels(other_designs[branch], other_trees, n_branch_parents, sections, warnings, max_orders,
+                             layouts, depth + len(levels), n_maps)
+
+    @staticmethod
+    def _plan_non_atomic_ivs(levels, warnings, max_orders):
+        # Mirror DesignTree.first_pass: each non-atomic ordering adds an IV one level up.
+        # Returns the name and number of values of each such IV, by level.
+        extra_ivs = [[] for _ in levels]
+        for i in reversed(range(len(levels))):
+            for design in levels[i].design:
+                counts, _ = design._count_conditions([n for _, n in extra_ivs[i]])
+                n_orders = design.ordering.count_orders(counts)
+                if not n_orders:
+                    continue
+                if not i:
+                    raise ValueError('Cannot have a non-atomic ordering at the top level of a DesignTree. ')
+                if n_orders > max_orders:
+                    warnings.append("{} at level '{}' creates an IV with {} values at level '{}', "
+                                    "multiplying the number of '{}' sections by {}".format(
+                                        design.ordering, levels[i].name, n_orders, levels[i - 1].name,
+                                        levels[i - 1].name, n_orders))
+                extra_ivs[i - 1].append((design.ordering.iv_name, n_orders))
+        return extra_ivs
+
     @classmethod
     def from_spec(cls, spec):
         """
@@ -401,8 +682,14 @@ class DesignTree:
         |DesignTree|
 
         """
+        main_tree, other_trees = cls._parse_spec(spec)
+        return cls.new(main_tree, **other_trees)
+
+    @classmethod
+    def _parse_spec(cls, spec):
         if isinstance(spec, dict):
             # The normal case.
+            spec = dict(spec)
             main_tree = list(cls._design_specs_to_designs(spec.pop('main')))
             other_trees = {name: list(cls._design_specs_to_designs(specs)) for name, specs in spec.items()}
         else:
@@ -410,7 +697,7 @@ class DesignTree:
             main_tree = list(cls._design_specs_to_designs(spec))
             other_trees = {}
 
-        return cls.new(main_tree, **other_trees)
+        return main_tree, other_trees
 
     @staticmethod
     def _design_specs_to_designs(specs):
@@ -438,39 +725,131 @@ class DesignTree:
                 yield name, designs
 
     def __next__(self):
-        if len(self) == 1:
-            raise StopIteration
+        # Every section at a level asks for the same next tree, so it's only created once.
+        if '_next' not in self.__dict__:
+            if len(self) == 1:
+                raise StopIteration
 
-        if len(self.levels_and_designs) == 1:
-            return self.branches
+            if len(self.levels_and_designs) == 1:
+                self._next = self.branches
 
-        next_design = copy(self)
-        next_design.levels_and_designs = next_design.levels_and_designs[1:]
-        return next_design
+            else:
+                self._next = copy(self)
+                self._next.levels_and_designs = self.levels_and_designs[1:]
+
+        return self._next
 
     def __len__(self):
-        length = len(self.levels_and_designs)
-        if self.branches:
-            length += len(list(self.branches.values())[0])
-        return length
+        if '_length' not in self.__dict__:
+            self._length = len(self.levels_and_designs)
+            if self.branches:
+                self._length += len(next(iter(self.branches.values())))
+        return self._length
 
     def __getitem__(self, item):
         return self.levels_and_designs[item]
 
+    def __getstate__(self):
+        # The cached next tree and length are not part of the tree's state.
+        return {key: value for key, value in self.__dict__.items() if key not in self._CACHED_ATTRIBUTES}
+
     def __eq__(self, other):
         if isinstance(other, type(self)):
-            return self.__dict__ == other.__dict__
+            return self.__getstate__() == other.__getstate__()
         return False
 
-    @staticmethod
-    def first_pass(levels_and_designs):
+    def _clear_cached_attributes(self):
+        for attribute in self._CACHED_ATTRIBUTES:
+            self.__dict__.pop(attribute, None)
+
+    @classmethod
+    def first_pass(cls, levels_and_designs):
         """
         Make a first pass of all designs in a |DesignTree|, from bottom to top.
         This calls |Design.first_pass| on every |Design| instance in the tree in the proper order,
         updating designs when a new IV is returned.
         This is necessary for |non-atomic orderings| because they modify the parent |Design|.
+        Results can be cached (see |DesignTree.cache_enabled| and |DesignTree.cache_dir|).
+
+        """
+        designs = [design for _, level_designs in levels_and_designs for design in level_designs]
+        key = cls._cache_key(levels_and_designs) if cls.cache_enabled or cls.cache_dir is not None else None
+        if key is None:
+            cls._first_pass(levels_and_designs)
+            return
+
+        cached = cls._load_first_pass(key)
+        if cached is None:
+            cls._first_pass(levels_and_designs)
+            cls._save_first_pass(key, deepcopy(designs))
+            return
+
+        logger.debug('Using cached first pass {}.'.format(key))
+        for design, cached_design in zip(designs, deepcopy(cached)):
+            design.__dict__.update(cached_design.__dict__)
+
+    @classmethod
+    def clear_cache(cls):
+        """
+        Empty the in-memory cache of |DesignTree.first_pass| results.
+        Files in |DesignTree.cache_dir| are not removed.
 
         """
+        cls._first_pass_cache.clear()
+
+    @staticmethod
+    def _cache_key(levels_and_designs):
+        # A hash of everything that determines the result of the first pass,
+        # or None if the first pass can't be cached.
+        designs = [design for _, level_designs in levels_and_designs for design in level_designs]
+        if not all(design.ordering.is_deterministic for design in designs):
+            return None
+        # Other iterables (e.g., generators) can only be read once, by the first pass itself.
+        if not all(values is None or isinstance(values, (Sequence, np.ndarray))
+                   for design in designs for values in design.iv_values):
+            return None
+
+        spec = [(level, [(design.iv_names,
+                          design.iv_values,
+                          design.design_matrix,
+                          design.ordering,
+                          design.extra_data,
+                          design.resolution,
+                          design.strength)
+                         for design in designs])
+                for level, designs in levels_and_designs]
+        try:
+            serialized = pickle.dumps((__version__, spec), protocol=3)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return None
+        return hashlib.sha1(serialized).hexdigest()
+
+    @classmethod
+    def _load_first_pass(cls, key):
+        if key in cls._first_pass_cache:
+            return cls._first_pass_cache[key]
+        if cls.cache_dir is None:
+            return None
+
+        path = os.path.join(cls.cache_dir, key + '.pickle')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                cls._first_pass_cache[key] = pickle.load(f)
+            return cls._first_pass_cache[key]
+
+        return None
+
+    @classmethod
+    def _save_first_pass(cls, key, designs):
+        cls._first_pass_cache[key] = designs
+        if cls.cache_dir is None:
+            return
+        os.makedirs(cls.cache_dir, exist_ok=True)
+        with open(os.path.join(cls.cache_dir, key + '.pickle'), 'wb') as f:
+            pickle.dump(designs, f)
+
+    @staticmethod
+    def _first_pass(levels_and_designs):
         for (level, designs), (level_above, designs_above) in \
                 zip(reversed(levels_and_designs[1:]), reversed(levels_and_designs[:-1])):
 
@@ -506,3 +885,272 @@ class DesignTree:
 
         """
         self.levels_and_designs.insert(0, Level('_base', Design()))
+        self._clear_cached_attributes()
+
+
+def _estimate_sizes(layouts):
+    # Sections above the bottom level and conditions are written in full where they first appear in the YAML file,
+    # and as aliases wherever else they are referred to.
+    n_anchors = sum(layout.n_sections for layout in layouts if not layout.is_bottom)
+    n_anchors += sum(n for layout in layouts for _, _, n in layout.conditions)
+    alias = '*id' + max(3, len(str(n_anchors))) * '0'
+
+    memory = disk = 0
+    for layout in layouts:
+        # The largest section number stands for a typical one.
+        memory += layout.n_sections * _section_memory(layout.level, layout.n_children, layout.n_maps)
+        disk += layout.n_sections * _section_disk(layout.level, layout.n_children, layout.depth, layout.n_maps,
+                                                  layout.is_bottom, alias)
+        disk += sum(len(yaml.dump(design)) for design in layout.designs)
+        for design, extra_ivs, n_conditions in layout.conditions:
+            condition_memory, condition_disk = _condition_sizes(design, extra_ivs, layout.depth)
+            memory += n_conditions * condition_memory
+            disk += n_conditions * condition_disk
+    return memory, disk
+
+
+def _section_memory(level, number, n_maps):
+    # The objects each section owns; the layers of its condition and parents are shared.
+    section = ExperimentSection(None, collections.ChainMap({level: number}, *(n_maps - 1) * [{}]))
+    parts = [section, section.data, section.data.maps, section.data.maps[0], section._children, number]
+    if sys.version_info < (3, 11):
+        # Before Python 3.11, instance attributes are held in a separate dictionary.
+        parts.extend([vars(section), vars(section.data)])
+    return sum(sys.getsizeof(part) for part in parts)
+
+
+def _section_disk(level, number, depth, n_maps, is_bottom, alias):
+    # The YAML lines of a section (see ExperimentSection.__getstate__), indented by its depth.
+    indent = 4 * depth
+    lines = [(indent - 2, '- !!python/object:experimentator.section.ExperimentSection')]
+    if is_bottom:
+        lines.append((indent, '_children: !!python/object/apply:collections.deque []'))
+    else:
+        lines.extend([(indent, '_children: !!python/object/apply:collections.deque'), (indent + 2, 'listitems:')])
+    lines.extend([(indent, 'data: !!python/object:collections.ChainMap'), (indent + 2, 'maps:')])
+
+    # One line per layer of its data. A bottom-level section's own layer is written in place;
+    # the layers of other sections are written once, where a descendant first refers to them.
+    own_layer = '{}: {}'.format(level, number)
+    lines.extend((n_maps - 1) * [(indent + 2, '- ' + alias)])
+    lines.append((indent + 2, '- ' + own_layer) if is_bottom else (indent + 2, '- ' + alias))
+    if not is_bottom:
+        lines.append((indent + 4, own_layer))
+
+    lines.extend([(indent, 'has_finished: false'), (indent, 'has_started: false'), (indent, 'tree: ' + alias)])
+    return sum(n_spaces + len(line) + 1 for n_spaces, line in lines)
+
+
+def _condition_sizes(design, extra_ivs, depth):
+    # The memory and YAML size of one condition of `design`, from the average size of each IV's values.
+    # Its values are the IV values of the design, so only the dictionary itself is counted in memory.
+    keys = list(design.iv_names) + [name for name, _ in extra_ivs] + list(design.extra_data)
+    memory = sys.getsizeof(dict.fromkeys(keys))
+
+    lines = []
+    for i, name in enumerate(design.iv_names):
+        values = design.iv_values[i] if i < len(design.iv_values) else []
+        if not len(values) and design.design_matrix is not None:
+            values = np.unique(np.transpose(design.design_matrix)[i]).tolist()
+        lengths = [len(yaml.dump({name: value}, default_flow_style=False)) for value in values]
+        lines.append(sum(lengths) / len(lengths) if lengths else 0)
+    lines.extend(len('{}: {}\n'.format(name, n - 1)) for name, n in extra_ivs)
+    if design.extra_data:
+        lines.append(len(yaml.dump(design.extra_data, default_flow_style=False)))
+
+    # Conditions are first written in the orderings of the tree, indented below the first bottom-level section.
+    indent = 4 * depth + 12
+    disk = indent + len('- &id000\n') + sum(lines) + len(keys) * (indent + 2)
+    return memory, int(disk)
+
+
+def fractional_factorial(n_factors, resolution):
+    """
+    Construct a regular two-level fractional factorial design.
+    The design has as few runs as a greedy search can find for the requested resolution:
+    with resolution 3, no main effect is aliased with another main effect;
+    with resolution 4, no main effect is aliased with a two-factor interaction;
+    with resolution 5, no two-factor interaction is aliased with another.
+
+    The first factors form a full factorial (in standard order)
+    and each remaining factor is generated as the product of several of these,
+    preferring higher-order interactions.
+    For resolutions 3 and 4 the number of runs is the minimum possible;
+    for higher resolutions it may occasionally be more.
+
+    Parameters
+    ----------
+    n_factors : int
+        The number of factors (columns).
+    resolution : int
+        The minimum resolution of the design. Must be at least 3.
+
+    Returns
+    -------
+    |numpy array|
+        A design matrix of ``-1`` and ``1``, with one row per run and one column per factor.
+
+    Examples
+    --------
+    >>> fractional_factorial(4, 4)
+    array([[-1, -1, -1, -1],
+           [ 1, -1, -1,  1],
+           [-1,  1, -1,  1],
+           [ 1,  1, -1, -1],
+           [-1, -1,  1,  1],
+           [ 1, -1,  1, -1],
+           [-1,  1,  1, -1],
+           [ 1,  1,  1,  1]])
+
+    """
+    if resolution < 3:
+        raise ValueError('Fractional factorial designs must have resolution of at least 3')
+    if n_factors < 1:
+        raise ValueError('Fractional factorial designs must have at least one factor')
+
+    for n_base in range(1, n_factors + 1):
+        if 2 ** n_base < _min_runs(n_factors, resolution):
+            continue
+        generators = _find_generators(n_base, n_factors - n_base, resolution)
+        if generators is not None:
+            break
+
+    # Each factor is the product of the base factors in its mask;
+    # in 0/1 coding a product is the parity of the sum.
+    masks = np.array([1 << i for i in range(n_base)] + generators)
+    bits = np.arange(n_base)
+    runs = (np.arange(2 ** n_base)[:, np.newaxis] >> bits) & 1
+    factors = (masks[np.newaxis, :] >> bits[:, np.newaxis]) & 1
+    return 2 * (runs.dot(factors) % 2) - 1
+
+
+def _min_runs(n_factors, resolution):
+    # Rao's bound: no design with fewer runs can have this resolution.
+    t = (resolution - 1) // 2
+    bound = sum(_n_choose_k(n_factors, i) for i in range(t + 1))
+    if resolution % 2 == 0:
+        bound += _n_choose_k(n_factors - 1, t)
+    return bound
+
+
+def _n_choose_k(n, k):
+    return factorial(n) // (factorial(k) * factorial(n - k)) if 0 <= k <= n else 0
+
+
+def _find_generators(n_base, n_generators, resolution):
+    # Choose generators (bit masks of base factors) one at a time.
+    # A generator can't be the product of fewer than `resolution - 1` factors already chosen,
+    # or together with them it would form a word shorter than `resolution` in the defining relation.
+    # Odd products come first: no three of them multiply to the identity, so they give resolution 4 cheaply.
+    candidates = sorted(range(1, 2 ** n_base), key=lambda mask: (_n_letters(mask) % 2 == 0, -_n_letters(mask)))
+    # The products of exactly i factors, for i < resolution - 1.
+    products = [{0}] + [set() for _ in range(resolution - 2)]
+    for mask in (1 << i for i in range(n_base)):
+        _add_factor(products, mask)
+
+    generators = []
+    for mask in candidates:
+        if len(generators) == n_generators:
+            break
+        if not any(mask in products_of_size for products_of_size in products):
+            generators.append(mask)
+            _add_factor(products, mask)
+
+    return generators if len(generators) == n_generators else None
+
+
+def _add_factor(products, mask):
+    for size in reversed(range(1, len(products))):
+        products[size].update(product ^ mask for product in products[size - 1])
+
+
+def _n_letters(mask):
+    return bin(mask).count('1')
+
+
+def orthogonal_array(n_levels, n_factors, strength=2):
+    """
+    Construct an orthogonal array.
+    In an orthogonal array of strength `t`,
+    every combination of levels of any `t` factors appears equally often.
+    Strength 2 is enough to estimate all main effects independently of one another.
+
+    Two-level arrays are regular fractional factorial designs of resolution ``strength + 1``
+    (see |fractional_factorial|).
+    Otherwise, the number of levels must be prime.
+    Arrays of strength 2 are constructed with the Rao-Hamming construction,
+    and arrays of higher strength with Bush's construction, which allows at most ``n_levels + 1`` factors.
+
+    Parameters
+    ----------
+    n_levels : int
+        The number of levels of every factor.
+    n_factors : int
+        The number of factors (columns).
+    strength : int, optional
+        The strength of the array (default 2).
+
+    Returns
+    -------
+    |numpy array|
+        A design matrix of integers from ``0`` to ``n_levels - 1``,
+        with one row per run and one column per factor.
+
+    Examples
+    --------
+    >>> orthogonal_array(3, 4)
+    array([[0, 0, 0, 0],
+           [1, 0, 1, 1],
+           [2, 0, 2, 2],
+           [0, 1, 1, 2],
+           [1, 1, 2, 0],
+           [2, 1, 0, 1],
+           [0, 2, 2, 1],
+           [1, 2, 0, 2],
+           [2, 2, 1, 0]])
+
+    """
+    if strength < 1:
+        raise ValueError('Orthogonal arrays must have strength of at least 1')
+    if n_levels == 2:
+        return (fractional_factorial(n_factors, strength + 1) + 1) // 2
+    if n_levels < 2 or any(n_levels % i == 0 for i in range(2, int(n_levels ** 0.5) + 1)):
+        raise ValueError('Orthogonal arrays can only be constructed for 2 or a prime number of levels')
+
+    if n_factors <= strength:
+        # The full factorial.
+        return _all_vectors(n_levels, n_factors)
+
+    if strength == 1:
+        return np.tile(np.arange(n_levels)[:, np.newaxis], (1, n_factors))
+
+    if strength == 2:
+        # Rao-Hamming: rows are all vectors over GF(n_levels) of length m,
+        # columns are their dot products with pairwise linearly independent vectors.
+        m = 2
+        while (n_levels ** m - 1) // (n_levels - 1) < n_factors:
+            m += 1
+        candidates = _all_vectors(n_levels, m)[1:]
+        # Keep vectors whose first nonzero element is 1, unit vectors first,
+        # so that the first m columns form a full factorial.
+        leading = candidates[np.arange(len(candidates)), np.argmax(candidates > 0, axis=1)]
+        candidates = candidates[leading == 1]
+        candidates = candidates[np.argsort((candidates > 0).sum(axis=1), kind='mergesort')]
+        return _all_vectors(n_levels, m).dot(candidates[:n_factors].T) % n_levels
+
+    if n_factors > n_levels + 1:
+        raise ValueError('Orthogonal arrays of strength {} and {} levels can have at most {} factors'.format(
+            strength, n_levels, n_levels + 1))
+
+    # Bush: rows are all polynomials of degree less than `strength`, columns are their values at each point,
+    # plus a column for the point at infinity (the leading coefficient).
+    coefficients = _all_vectors(n_levels, strength)
+    powers = np.arange(n_levels)[np.newaxis, :] ** np.arange(strength)[:, np.newaxis] % n_levels
+    array = np.hstack([coefficients.dot(powers) % n_levels, coefficients[:, -1:]])
+    return array[:, :n_factors]
+
+
+def _all_vectors(n_levels, length):
+    # Every vector of the given length over 0, ..., n_levels - 1, with the first element changing fastest.
+    return np.arange(n_levels ** length)[:, np.newaxis] // n_levels ** np.arange(length) % n_levels
+
@@ -4,21 +4,29 @@ Public objects are imported in ``__init__.py``.
 
 """
 import os
+import sys
 import pickle
 import inspect
-from logging import getLogger
+from glob import glob
+from logging import getLogger, DEBUG
 from importlib import import_module
-from contextlib import contextmanager, ExitStack
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from collections import namedtuple
+from collections import namedtuple, deque
 
 from experimentator import yaml
+from experimentator._patched_yaml import array_store
+from experimentator.readonly import save_columns, open_columns
 from experimentator.section import ExperimentSection
 from experimentator.design import DesignTree, Design
+from experimentator.cache import AssetCache
 import experimentator.order as order
 
 logger = getLogger(__name__)
 FunctionReference = namedtuple('FunctionReference', ('module', 'name'))
+RunPlan = namedtuple('RunPlan', ('events', 'demo'))
+EnterEvent = namedtuple('EnterEvent', ('section', 'callback', 'is_context', 'prepare', 'pause', 'exit_index'))
+ExitEvent = namedtuple('ExitEvent', ('section', 'finish', 'ancestors'))
 
 
 def run_experiment_section(experiment, section_obj=None, demo=False, resume=False, parent_callbacks=True,
@@ -98,31 +106,95 @@ def run_experiment_section(experiment, section_obj=None, demo=False, resume=Fals
         exp.save()
 
 
-def export_experiment_data(exp_filename, data_filename, **kwargs):
+def export_experiment_data(exp_filename, data_filename, processes=None, **kwargs):
     """
     Reads a pickled |Experiment| instance and saves its data in ``.csv`` format.
 
+    Several experiment files can be combined into one data file,
+    by passing a list of file locations or glob patterns (e.g. ``'site-*.exp'``) as `exp_filename`.
+    In this case the files are loaded in parallel,
+    and an index level ``'source'`` is prepended to the data containing the file each row came from.
+    Files are combined in the order given, with the files matching each glob pattern in sorted order.
+
     Parameters
      ----------
-    exp_filename : str
-        The file location where an |Experiment| instance is pickled.
+    exp_filename : str or list of str
+        The file location where an |Experiment| instance is pickled,
+        or a glob pattern or list of file locations and glob patterns.
     data_filename : str
         The file location where the data will be written.
+    processes : int, optional
+        When combining several files, the number of worker processes to load them with.
+        The default is the number of CPUs.
+        Loading in parallel requires Python 3.7 or later; on earlier versions, the files are loaded one at a time.
     skip_columns : list of str, optional
         Data columns to skip.
+    incremental : bool, optional
+        If True, only append sections that have finished since the last incremental export.
+        See |Experiment.export_data|.
+        Not supported when combining several files.
+    long_format : bool, optional
+        If True, export only compound columns, with one row per element.
+        See |Experiment.export_data|.
+        Not supported when combining several files.
     **kwargs
         Arbitrary keyword arguments passed through to |DataFrame.to_csv|.
 
     Notes
     -----
-    This shortcut function is not recommended for experiments with compound data types,
-    for example an experiment which stores a time series for every trial.
-    In such cases it is recommended to write a custom script
-    that parses |Experiment.dataframe| as desired
-    (or use the `skip_columns` option to ignore the compound data).
+    For experiments with compound data types,
+    for example an experiment which stores a time series for every trial,
+    use the `skip_columns` option to ignore the compound data,
+    and export it separately using the `long_format` option.
 
     """
-    Experiment.load(exp_filename).export_data(data_filename, **kwargs)
+    if isinstance(exp_filename, str) and os.path.exists(exp_filename):
+        Experiment.load(exp_filename).export_data(data_filename, **kwargs)
+        return
+
+    patterns = [exp_filename] if isinstance(exp_filename, str) else exp_filename
+    filenames = [filename for pattern in patterns
+                 for filename in ([pattern] if os.path.exists(pattern) else sorted(glob(pattern)))]
+    if not filenames:
+        raise ValueError('No experiment files found matching {}'.format(exp_filename))
+    if kwargs.pop('incremental', False):
+        raise ValueError('Incremental export is not supported when combining several experiment files')
+    if kwargs.pop('long_format', False):
+        raise ValueError('Long-format export is not supported when combining several experiment files')
+
+    from pandas import concat
+    logger.debug('Loading {} experiment files.'.format(len(filenames)))
+    if sys.version_info < (3, 7):
+        # Worker initializers are needed to import callbacks (see _init_worker).
+        dataframes = [_load_dataframe(filename) for filename in filenames]
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(os.getcwd(),)) as executor:
+            dataframes = list(executor.map(_load_dataframe, filenames))
+
+    _write_csv(concat(dataframes, keys=filenames, names=['source']), data_filename, **kwargs)
+
+
+def _init_worker(directory):
+    """
+    Make callback modules in `directory` importable in a worker process.
+    Loading an |Experiment| re-imports its callbacks, which are found relative to the directory
+    the export was started from, as they are in the main process.
+
+    """
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+
+def _load_dataframe(filename):
+    return Experiment.load(filename).dataframe
+
+
+def _write_csv(df, filename, skip_columns=None, **kwargs):
+    if skip_columns:
+        kwargs['columns'] = set(df.columns) - set(skip_columns)
+
+    with open(filename, 'w') as f:
+        df.to_csv(f, **kwargs)
 
 
 class Experiment(ExperimentSection):
@@ -156,6 +228,11 @@ class Experiment(ExperimentSection):
     callback_type_by_level : dict
         A dictionary mapping level names to either the string ``'context'`` or ``'function'``.
         This keeps track of which callbacks in |Experiment.callback_by_level| are context managers.
+    prepare_callback_by_level : dict
+        A dictionary mapping level names to prepare callbacks, set by |Experiment.add_prepare_callback|.
+    prepare_lookahead_by_level : dict
+        A dictionary mapping level names to the number of upcoming sections
+        that are prepared ahead of time at that level.
     session_data : dict
         A dictionary where temporary data can be stored,
         persistent only within one session of the Python interpreter.
@@ -167,6 +244,10 @@ class Experiment(ExperimentSection):
     experiment_data : dict
         A dictionary where data can be stored that is persistent across Python sessions.
         Everything stored here must be |picklable|.
+    min_array_bytes : int
+        If not None, |numpy arrays| of at least this many bytes are saved in separate files
+        rather than in the experiment file itself (see |Experiment.save|).
+        This is saved with the |Experiment|, so it applies to every later save, e.g. by ``exp run``.
 
     """
     def __init__(self, tree,
@@ -180,6 +261,10 @@ class Experiment(ExperimentSection):
                  session_data=None,
                  experiment_data=None,
                  _callback_info=None,
+                 prepare_callback_by_level=None,
+                 prepare_lookahead_by_level=None,
+                 _prepare_callback_info=None,
+                 min_array_bytes=None,
                  ):
         super().__init__(tree, data=data, has_started=has_started, has_finished=has_finished, _children=_children)
         self.filename = filename
@@ -188,6 +273,10 @@ class Experiment(ExperimentSection):
         self.session_data = {} if session_data is None else session_data
         self.experiment_data = {} if experiment_data is None else experiment_data
         self._callback_info = {} if _callback_info is None else _callback_info
+        self.prepare_callback_by_level = {} if prepare_callback_by_level is None else prepare_callback_by_level
+        self.prepare_lookahead_by_level = {} if prepare_lookahead_by_level is None else prepare_lookahead_by_level
+        self._prepare_callback_info = {} if _prepare_callback_info is None else _prepare_callback_info
+        self.min_array_bytes = min_array_bytes
 
     @classmethod
     def new(cls, tree, filename=None):
@@ -221,7 +310,7 @@ class Experiment(ExperimentSection):
         |Experiment|
 
         """
-        with open(filename, 'r') as f:
+        with open(filename, 'r') as f, array_store(filename):
             self = yaml.load(f)
         self.filename = filename
         return self
@@ -416,25 +505,89 @@ class Experiment(ExperimentSection):
 
         return cls.new(DesignTree.new(levels_and_designs), filename=filename)
 
-    def save(self, filename=None):
+    def save(self, filename=None, min_array_bytes=None):
         """Save the |Experiment| to disk.
 
+        Optionally, large |numpy arrays| in the experiment's data (e.g., sensor data returned by a callback)
+        are not written into the file itself but saved as ``.npy`` files in a directory next to it,
+        named after the file with ``'.arrays'`` appended.
+        When the |Experiment| is loaded, these arrays are memory-mapped (read-only),
+        so they are only read from disk when they are used,
+        and they are saved in the same files again, even without a threshold.
+        The file is then no longer complete by itself; the directory must be kept (and copied) with it.
+        Array files in the directory that the saved experiment no longer refers to are removed,
+        unless a backup of the file (written by |run_experiment_section| when a run fails) still refers to them.
+
         Parameters
         ----------
         filename : str, optional
             If specified, overrides |Experiment.filename|.
+        min_array_bytes : int, optional
+            If specified, arrays of at least this many bytes are saved in separate files,
+            in this and every later save (see |Experiment.min_array_bytes|).
+            By default, |Experiment.min_array_bytes| is used,
+            which is None (all arrays saved in the file itself) unless set by an earlier save.
 
         """
+        if min_array_bytes is not None:
+            self.min_array_bytes = min_array_bytes
+
         filename = filename or self.filename
         if filename:
             logger.debug('Saving Experiment instance to {}.'.format(filename))
-            with open(filename, 'w') as f:
+            with open(filename, 'w') as f, array_store(filename, self.min_array_bytes, dumping=True):
                 yaml.dump(self, f)
 
         else:
             logger.warning('Cannot save experiment: No filename provided.')
 
-    def export_data(self, filename, skip_columns=None, **kwargs):
+    def save_columns(self, directory=None):
+        """Save the |Experiment| in a columnar format that can be opened read-only with |Experiment.open_readonly|.
+
+        Data and section attributes are saved as one ``.npy`` file per column,
+        so that analysis scripts (possibly many at once) can memory-map them rather than loading the full experiment.
+        Callbacks and other settings needed to run the experiment are not saved;
+        keep using |Experiment.save| for that.
+        Only experiments in which all bottom-level sections are at the same level can be saved in this format.
+
+        Parameters
+        ----------
+        directory : str, optional
+            The directory to save in.
+            By default, |Experiment.filename| with ``'.columns'`` appended.
+
+        """
+        directory = directory or (self.filename and self.filename + '.columns')
+        if directory:
+            logger.debug('Saving Experiment columns to {}.'.format(directory))
+            save_columns(self, directory)
+
+        else:
+            logger.warning('Cannot save experiment: No filename provided.')
+
+    @staticmethod
+    def open_readonly(directory):
+        """
+        Open an experiment saved by |Experiment.save_columns|, without loading it into memory.
+
+        Parameters
+        ----------
+        directory : str
+            The directory passed to |Experiment.save_columns|.
+            For convenience, the experiment's filename is also accepted if its columns were saved in the default location.
+
+        Returns
+        -------
+        |ReadOnlySection|
+            A read-only view of the top level of the experiment,
+            supporting the ``subsection``, ``walk``, and ``dataframe`` interfaces of |ExperimentSection|.
+
+        """
+        if not os.path.isdir(directory) and os.path.isdir(directory + '.columns'):
+            directory += '.columns'
+        return open_columns(directory)
+
+    def export_data(self, filename, skip_columns=None, incremental=False, long_format=False, **kwargs):
         """
         Export |Experiment.dataframe| in ``.csv`` format.
 
@@ -444,24 +597,98 @@ class Experiment(ExperimentSection):
             A file location where the data should be saved.
         skip_columns : list of str, optional
             Columns to skip.
+        incremental : bool, optional
+            If True (default is False), only export bottom-level sections that have finished,
+            appending to `filename` those that have finished since the last incremental export.
+            The sections already exported are tracked in a state file next to `filename`
+            (with ``'.state'`` appended to the name).
+            The IVs and extra data of every design in the experiment's tree are written as columns from the start,
+            so sections from other branches of a heterogeneous tree are appended like any others.
+            However, if a callback returns a result that no exported section has,
+            the file is rewritten with the new column,
+            so the results returned by callbacks should stay the same throughout the experiment.
+        long_format : bool, optional
+            If True (default is False), export only the compound columns (e.g., a time series for every trial),
+            with one row per element, as given by |ExperimentSection.long_dataframe|.
+            The data is written in chunks, so it never all has to be in memory at once.
         **kwargs
             Arbitrary keyword arguments to pass to |DataFrame.to_csv|.
 
         Notes
         -----
-        This method is not recommended for experiments with compound data types,
-        for example an experiment which stores a time series for every trial.
-        In those cases it is recommended to write a custom script
-        that parses the |Experiment.dataframe| attribute as desired,
-        or use the `skip_columns` option to skip any compound columns.
+        Experiments with compound data types,
+        for example an experiment which stores a time series for every trial,
+        should be exported twice:
+        once using the `skip_columns` option to skip any compound columns,
+        and once with `long_format` to export only the compound columns.
+
+        An incremental export never revisits rows it has already written;
+        if a section is rerun after being exported, delete the state file to export everything again.
 
         """
-        df = self.dataframe
-        if skip_columns:
-            kwargs['columns'] = set(df.columns) - set(skip_columns)
+        if incremental and long_format:
+            raise ValueError('Incremental export is not supported in long format')
+        if incremental:
+            return self._export_data_incremental(filename, skip_columns=skip_columns, **kwargs)
+        if long_format:
+            return self._export_data_long(filename, skip_columns=skip_columns, **kwargs)
+
+        _write_csv(self.dataframe, filename, skip_columns=skip_columns, **kwargs)
+
+    def _export_data_incremental(self, filename, skip_columns=None, **kwargs):
+        from pandas import DataFrame
+
+        state_filename = filename + '.state'
+        if os.path.exists(state_filename) and os.path.exists(filename):
+            with open(state_filename, 'r') as f:
+                state = yaml.load(f)
+        else:
+            state = {'columns': [], 'exported': []}
+
+        levels = self.levels
+        skip_columns = set(skip_columns or ()) | set(levels)
+        exported = set(tuple(path) for path in state['exported'])
+        finished = [(tuple(section.data.get(level) for level in levels), section)
+                    for section in self.walk() if section.is_bottom_level and section.has_finished]
+
+        new_sections = [(path, section) for path, section in finished if path not in exported]
+        if not new_sections:
+            logger.debug('No newly finished sections to export to {}.'.format(filename))
+            return
+
+        # Columns known from the designs are written from the start, so that only new results grow the schema.
+        new_columns = [] if state['columns'] else [
+            column for column in _design_columns(self.tree) if column not in skip_columns]
+        for _, section in new_sections:
+            for column in section.data:
+                if column not in skip_columns and column not in state['columns'] and column not in new_columns:
+                    new_columns.append(column)
+
+        if state['columns'] and not new_columns:
+            mode, header = 'a', False
+        else:
+            if state['columns']:
+                # The schema grew; the rows already written lack the new columns, so start over.
+                logger.debug('New columns {} found; rewriting {}.'.format(new_columns, filename))
+                new_sections = finished
+            mode, header = 'w', True
+            state['exported'] = []
+
+        state['columns'].extend(new_columns)
+        df = DataFrame([section.data for _, section in new_sections]).set_index(levels)
+        with open(filename, mode) as f:
+            df.reindex(columns=state['columns']).to_csv(f, header=header, **kwargs)
+
+        state['exported'].extend(list(path) for path, _ in new_sections)
+        with open(state_filename, 'w') as f:
+            yaml.dump(state, f)
+
+    def _export_data_long(self, filename, skip_columns=None, **kwargs):
+        columns = [column for column in self._compound_columns() if column not in (skip_columns or ())]
 
         with open(filename, 'w') as f:
-            df.to_csv(f, **kwargs)
+            for i, df in enumerate(self.iter_long_dataframes(columns)):
+                df.to_csv(f, header=not i, **kwargs)
 
     def run_section(self, section, demo=False, parent_callbacks=True, from_section=None):
         """
@@ -490,49 +717,233 @@ class Experiment(ExperimentSection):
         The wrapper function :func:`run_experiment_section` should be used instead of this method, if possible.
 
         """
-        logger.debug('Running {}.'.format(section.description))
+        self.run_plan(self.compile_run_plan(section,
+                                            demo=demo,
+                                            parent_callbacks=parent_callbacks,
+                                            from_section=from_section))
 
-        with ExitStack() as stack:
-            stack.enter_context(self._parent_context(section, parent_callbacks=parent_callbacks, demo=demo))
-            stack.enter_context(self._section_context(section, demo=demo))
+    def compile_run_plan(self, section, demo=False, parent_callbacks=True, from_section=None):
+        """
+        Compile the sequence of events of running a section, to be executed by |Experiment.run_plan|.
+        |Experiment.run_section| compiles a plan and then runs it.
+        Compiling a plan separately makes it possible to measure the time spent in the framework,
+        apart from the callbacks, as in the example below.
 
-            if len(section):  # If the section has children.
-                from_section, next_from_section = self._parse_from_section(from_section)
-                for next_section in section[from_section[0]:]:
-                    self.run_section(next_section,
-                                     demo=demo,
-                                     parent_callbacks=False,
-                                     from_section=next_from_section)
+        The plan is a flat list of events, in the order they occur.
+        Each section has an event when it is entered, and an event when it is exited.
+        Callbacks, the parents to check when a section finishes, and the sections to run
+        (taking `from_section` into account) are all determined when compiling,
+        so a plan should be run before any callbacks are changed.
 
-            if not demo:
-                section.has_finished = True
+        Parameters
+        ----------
+        section : |ExperimentSection|
+            The section to be run.
+        demo : bool, optional
+            Data will only be saved if `demo` is False (the default).
+        parent_callbacks : bool, optional
+            If True (the default), all parent callbacks will be called.
+        from_section : int or list of int, optional
+            Which section to start running from. See |Experiment.run_section|.
 
-            if parent_callbacks:
-                logger.debug('Exiting all parent levels...')
+        Returns
+        -------
+        RunPlan
+            A namedtuple with fields ``events`` (the list of events) and ``demo``.
+
+        Examples
+        --------
+        >>> import time
+        >>> plan = exp.compile_run_plan(exp.subsection(participant=1))
+        >>> start = time.perf_counter()
+        >>> exp.run_plan(plan)
+        >>> n_trials = sum(1 for event in plan.events if isinstance(event, EnterEvent) and event.pause)
+        >>> time_per_trial = (time.perf_counter() - start) / n_trials
+
+        """
+        events = []
+        parents = list(self.parents(section))
+
+        if parent_callbacks:
+            for parent in parents:
+                events.append(self._enter_event(parent, pause=False, exit_index=None))
+        n_parent_events = len(events)
+
+        self._compile_section(events, section, parents[::-1], from_section)
+
+        if parent_callbacks:
+            # Parents are exited in reverse order, and only then is the section's parents' completion checked.
+            top_exit = events[-1]
+            events[-1] = top_exit._replace(ancestors=())
+            for i in reversed(range(n_parent_events)):
+                events[i] = events[i]._replace(exit_index=len(events))
+                events.append(ExitEvent(events[i].section, False, ()))
+            events[-1] = events[-1]._replace(ancestors=top_exit.ancestors)
+
+        return RunPlan(events, demo)
+
+    def _compile_section(self, events, section, ancestors, from_section):
+        enter_index = len(events)
+        events.append(None)
+
+        if len(section):  # If the section has children.
+            from_section, next_from_section = self._parse_from_section(from_section)
+            child_ancestors = [section] + ancestors
+            for next_section in section[from_section[0]:]:
+                self._compile_section(events, next_section, child_ancestors, next_from_section)
+
+        events[enter_index] = self._enter_event(section, pause=not len(section), exit_index=len(events))
+        events.append(ExitEvent(section, True, ancestors))
+
+    def _enter_event(self, section, pause, exit_index):
+        level = section.level
+        callback_type = self.callback_type_by_level.get(level)
+        callback = self.callback_by_level[level] if callback_type in ('context', 'function') else None
+        return EnterEvent(section, callback, callback_type == 'context',
+                          level in self.prepare_callback_by_level, pause, exit_index)
+
+    def run_plan(self, plan):
+        """
+        Run a plan compiled by |Experiment.compile_run_plan|.
+
+        Parameters
+        ----------
+        plan : RunPlan
+            The plan to run.
 
-        # Finished parents detection.
-        if not section.level == '_base':
-            for parent in reversed(list(self.parents(section))):
-                if all(child.has_finished for child in parent):
-                    parent.has_finished = True
+        """
+        for _ in self._execute_plan(plan):
+            pass
+
+    def run_section_async(self, section, demo=False, parent_callbacks=True, from_section=None):
+        """
+        Run a section and all its descendant sections, awaiting asynchronous callbacks.
+        This is a coroutine version of |Experiment.run_section|, to be run in an |asyncio| event loop.
+
+        In addition to regular callbacks, any callback can be a coroutine function (defined with ``async def``),
+        or an asynchronous context manager
+        (e.g., an async generator function decorated with |contextlib.asynccontextmanager|).
+        These are awaited, so other tasks in the event loop (such as reading from hardware or saving data)
+        can run while a callback is waiting. Requires Python 3.7 or later.
+
+        Parameters
+        ----------
+        section : |ExperimentSection|
+            The section to be run.
+        demo : bool, optional
+            Data will only be saved if `demo` is False (the default).
+        parent_callbacks : bool, optional
+            If True (the default), all parent callbacks will be called.
+        from_section : int or list of int, optional
+            Which section to start running from. See |Experiment.run_section|.
+
+        Returns
+        -------
+        coroutine
+
+        Examples
+        --------
+        >>> import asyncio
+        >>> asyncio.get_event_loop().run_until_complete(exp.run_section_async(exp.subsection(participant=1)))
+
+        """
+        from experimentator._async_run import run_section
+        return run_section(self, section, demo=demo, parent_callbacks=parent_callbacks, from_section=from_section)
+
+    def step_section(self, section, demo=False, parent_callbacks=True, from_section=None):
+        """
+        Run a section one lowest-level section at a time, under the control of the caller.
+        This is an alternative to |Experiment.run_section| for frontends that run their own event loop,
+        such as GUI or stimulus-presentation frameworks that need to draw every frame.
+
+        The sections are traversed exactly as by |Experiment.run_section|,
+        entering and exiting the same callbacks, but the traversal pauses at every lowest-level section
+        (inside all of its context managers) until |SectionStepper.advance| is called.
+        In the meantime, the frontend runs the trial itself
+        and passes the results to |SectionStepper.record|.
+
+        Parameters
+        ----------
+        section : |ExperimentSection|
+            The section to be run.
+        demo : bool, optional
+            Data will only be saved if `demo` is False (the default).
+        parent_callbacks : bool, optional
+            If True (the default), all parent callbacks will be called.
+        from_section : int or list of int, optional
+            Which section to start running from. See |Experiment.run_section|.
+
+        Returns
+        -------
+        |SectionStepper|
 
-    @contextmanager
-    def _section_context(self, section, demo=False):
-        with ExitStack() as stack:
-            if not demo:
-                section.has_started = True
+        Examples
+        --------
+        >>> stepper = exp.step_section(exp.subsection(participant=1))
+        >>> trial = stepper.advance()
+        >>> # ...present the trial over several frames, then:
+        >>> stepper.record({'response': response})
+        >>> trial = stepper.advance()
 
-            if self.callback_type_by_level.get(section.level) == 'context':
-                self.session_data[section.level] = stack.enter_context(
-                    self.callback_by_level[section.level](self, section)
-                )
+        """
+        return SectionStepper(self._execute_plan(self.compile_run_plan(section,
+                                                                       demo=demo,
+                                                                       parent_callbacks=parent_callbacks,
+                                                                       from_section=from_section)),
+                              demo=demo)
 
-            elif self.callback_type_by_level.get(section.level) == 'function':
-                results = self.callback_by_level[section.level](self, section)
-                if results and not demo:
-                    section.add_data(results)
+    def _execute_plan(self, plan):
+        """
+        Run a plan, yielding each lowest-level section while its callbacks are entered.
+        Performs the steps yielded by ``_plan_steps`` synchronously.
 
-            yield
+        """
+        steps = _plan_steps(self, plan)
+        try:
+            step, value, section = next(steps)
+        except StopIteration:
+            return
+
+        while True:
+            try:
+                if step is _CALL:
+                    if value and type(value) is not dict and inspect.isawaitable(value):
+                        if inspect.iscoroutine(value):
+                            value.close()
+                        raise TypeError(("The '{}' callback returned an awaitable; " +
+                                         "use Experiment.run_section_async.").format(section.level))
+                elif step is _ENTER:
+                    if not hasattr(value, '__enter__') and hasattr(value, '__aenter__'):
+                        raise TypeError(("The '{}' callback is an asynchronous context manager; " +
+                                         "use Experiment.run_section_async.").format(section.level))
+                    value = value.__enter__()
+                elif step is _EXIT:
+                    context, exc_info = value
+                    value = context.__exit__(*exc_info)
+                elif step is _PREPARE:
+                    value = value.result()
+                else:
+                    yield section
+                    value = None
+            except BaseException as error:
+                try:
+                    step, value, section = steps.throw(error)
+                except StopIteration:
+                    return
+            else:
+                try:
+                    step, value, section = steps.send(value)
+                except StopIteration:
+                    return
+
+    def _start_prefetcher(self, plan):
+        if not self.prepare_callback_by_level:
+            return None
+
+        def run_order():
+            return (event.section for event in plan.events if type(event) is EnterEvent)
+
+        return _Prefetcher(self, run_order)
 
     @staticmethod
     def _parse_from_section(from_section):
@@ -546,15 +957,6 @@ class Experiment(ExperimentSection):
             next_from_section = [1]
         return from_section, next_from_section
 
-    @contextmanager
-    def _parent_context(self, section, parent_callbacks=True, demo=False):
-        with ExitStack() as stack:
-            for parent in self.parents(section):
-                if parent_callbacks:
-                    logger.debug('Entering {} context.'.format(parent.description))
-                    stack.enter_context(self._section_context(parent, demo=demo))
-            yield
-
     def resume_section(self, section, **kwargs):
         """Rerun a section that has been started but not finished, starting where running last left off.
 
@@ -604,6 +1006,9 @@ class Experiment(ExperimentSection):
         In theory, it should map dependent-variable names to results.
         See the |callback docs| for more details.
 
+        Callbacks can also be coroutine functions or asynchronous context managers,
+        in which case the experiment must be run with |Experiment.run_section_async|.
+
         Parameters
         ----------
         level : str
@@ -632,6 +1037,82 @@ class Experiment(ExperimentSection):
         reference = FunctionReference(func_module or reference[0], func_name or reference[1])
         self._callback_info[level] = [reference, args, kwargs]
 
+    def add_prepare_callback(self, level, callback, *args, lookahead=1, func_module=None, func_name=None,
+                             **kwargs):
+        """Add a callback that prepares sections at a certain level ahead of time.
+
+        While a section is running, the prepare callback is called in a background thread
+        for each of the next `lookahead` sections at the level, in the order they will be run.
+        When one of those sections starts, the value returned by its prepare callback
+        is stored in |Experiment.session_data| under ``['prepared'][level]``,
+        before the section's own callback is called (waiting for the prepare callback to finish, if necessary).
+        This is useful for loading stimuli named by IV values, such as images or sounds,
+        so that it happens during the previous trial instead of at the start of each trial.
+
+        Prepare callbacks run concurrently with the experiment,
+        so they should only read from the section and the |Experiment|, not modify them.
+        An exception raised by a prepare callback is raised again when its section starts.
+
+        Parameters
+        ----------
+        level : str
+            Which level of the hierarchy to prepare.
+        callback : function
+            The callback should have the signature ``callback(experiment, section, *args, **kwargs)``,
+            like the callbacks of |Experiment.add_callback|, and return anything.
+        *args
+            Any arbitrary positional arguments to be passed to `callback`.
+        lookahead : int, optional
+            How many sections to prepare ahead of the running one (default 1).
+        func_module : str, optional
+        func_name : str, optional
+            Where the given function should be imported from in future Python sessions.
+            See |Experiment.add_callback|.
+        **kwargs
+            Any arbitrary keyword arguments to be passed to `callback`.
+
+        """
+        if lookahead < 1:
+            raise ValueError('lookahead must be at least 1')
+
+        self.prepare_callback_by_level[level] = _callback_partial(callback, args, kwargs)
+        self.prepare_lookahead_by_level[level] = lookahead
+
+        reference = _get_func_reference(callback)
+        reference = FunctionReference(func_module or reference[0], func_name or reference[1])
+        self._prepare_callback_info[level] = [reference, args, kwargs]
+
+    def asset_cache(self, name, load=None, **kwargs):
+        """
+        Get an |AssetCache| stored in |Experiment.session_data|, creating it the first time.
+        This lets callbacks share resources, such as stimuli, that depend only on IV values,
+        so that each is loaded once per session rather than once per section:
+
+            >>> def trial(experiment, section):
+            ...     image = experiment.asset_cache('images', load_image).get(section)
+
+        Parameters
+        ----------
+        name : str
+            The name of the cache. Caches are stored in ``session_data['asset_caches'][name]``.
+        load : function, optional
+            Called with a dictionary mapping IV names to values, returns the resource for that condition.
+            Required when the cache doesn't exist yet.
+        **kwargs
+            Other arguments to the |AssetCache| constructor, used when the cache doesn't exist yet.
+
+        Returns
+        -------
+        |AssetCache|
+
+        """
+        caches = self.session_data.setdefault('asset_caches', {})
+        if name not in caches:
+            if load is None:
+                raise ValueError("No asset cache named '{}'; pass a load function to create it".format(name))
+            caches[name] = AssetCache(load, **kwargs)
+        return caches[name]
+
     def __getstate__(self):
         state = self.__dict__.copy()
         #  Clear session_data before pickling.
@@ -639,15 +1120,305 @@ class Experiment(ExperimentSection):
 
         # Clear functions.
         del state['callback_by_level']
+        del state['prepare_callback_by_level']
 
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        # Experiments saved before prepare callbacks existed.
+        self.__dict__.setdefault('prepare_lookahead_by_level', {})
+        self.__dict__.setdefault('_prepare_callback_info', {})
+        # Experiments saved before the array threshold was saved with them.
+        self.__dict__.setdefault('min_array_bytes', None)
 
         # Reload callbacks.
         self.callback_by_level = {level: _callback_partial(*self._callback_info[level])
                                   for level in self._callback_info}
+        self.prepare_callback_by_level = {level: _callback_partial(*self._prepare_callback_info[level])
+                                          for level in self._prepare_callback_info}
+
+
+def _design_columns(tree):
+    # The IVs and extra data of every design in a tree and its heterogeneous branches, from the top down.
+    columns = []
+    trees = [tree]
+    while trees:
+        tree = trees.pop(0)
+        for _, designs in tree.levels_and_designs:
+            # The base level added by Experiment.new has a single Design rather than a list.
+            for design in [designs] if isinstance(designs, Design) else designs:
+                for column in list(design.iv_names) + list(design.extra_data):
+                    if column not in columns:
+                        columns.append(column)
+        trees.extend(tree.branches.values())
+    return columns
+
+
+def _mark_finished(parents):
+    """
+    Mark sections as finished if all their children have finished, from the bottom up.
+
+    """
+    for parent in parents:
+        # The last child is usually the first unfinished one, so check from the end.
+        if all(child.has_finished for child in reversed(parent._children)):
+            parent.has_finished = True
+
+
+# The steps of running a plan that depend on whether callbacks are awaited.
+_PREPARE, _CALL, _ENTER, _EXIT, _PAUSE = 'prepare', 'call', 'enter', 'exit', 'pause'
+
+
+def _plan_steps(experiment, plan):
+    """
+    Run a plan compiled by |Experiment.compile_run_plan|,
+    leaving to the runner the steps that depend on whether callbacks are awaited.
+    Those are yielded as ``(step, value, section)`` tuples, and the runner sends back the result:
+
+    - ``(_PREPARE, future, section)``: the prepared data of `section`, once `future` is done.
+    - ``(_CALL, results, section)``: the results returned by the function callback of `section`.
+    - ``(_ENTER, context, section)``: the value returned by entering the context manager of `section`.
+    - ``(_EXIT, (context, exc_info), section)``: the value returned by exiting `context` with `exc_info`,
+      which suppresses the exception if true.
+    - ``(_PAUSE, section, section)``: `section` is a lowest-level section and its callbacks are entered.
+      The runner may hand control to the caller; the result is ignored.
+
+    An exception raised while performing a step should be thrown into the generator,
+    which exits the entered context managers as nested ``with`` statements would.
+
+    """
+    events, demo = plan
+    session_data = experiment.session_data
+    debug = logger.isEnabledFor(DEBUG)
+    prefetcher = experiment._start_prefetcher(plan)
+
+    # The exit index and the context manager (or None) of each section that has been entered.
+    entered = []
+    i = 0
+    n_events = len(events)
+    try:
+        while i < n_events:
+            try:
+                while i < n_events:
+                    event = events[i]
+                    i += 1
+
+                    if type(event) is EnterEvent:
+                        section, callback, is_context, prepare, pause, exit_index = event
+                        if debug:
+                            logger.debug('Running {}.'.format(section.description))
+                        if not demo:
+                            section.has_started = True
+
+                        if prepare:
+                            session_data.setdefault('prepared', {})[section.level] = \
+                                yield _PREPARE, prefetcher.future(section), section
+
+                        context = None
+                        if is_context:
+                            context = callback(experiment, section)
+                            session_data[section.level] = yield _ENTER, context, section
+                        elif callback is not None:
+                            results = yield _CALL, callback(experiment, section), section
+                            if results and not demo:
+                                section.add_data(results)
+
+                        entered.append((exit_index, context))
+                        if pause:
+                            yield _PAUSE, section, section
+
+                    else:
+                        section, finish, ancestors = event
+                        if finish and not demo:
+                            section.has_finished = True
+                        context = entered.pop()[1]
+                        if context is not None:
+                            yield _EXIT, (context, (None, None, None)), section
+                        _mark_finished(ancestors)
+
+            except BaseException:
+                i = yield from _unwind(events, entered, sys.exc_info())
+
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+
+
+def _unwind(events, entered, exc_info):
+    """
+    Exit the entered context managers after an exception, as nested ``with`` statements would,
+    yielding an exit step for each (see ``_plan_steps``).
+    If a context manager suppresses the exception, return the index of the event to continue from.
+    Otherwise, the exception is raised again.
+
+    """
+    while entered:
+        exit_index, context = entered.pop()
+        if context is None:
+            continue
+        try:
+            suppressed = yield _EXIT, (context, exc_info), events[exit_index].section
+        except BaseException:
+            exc_info = sys.exc_info()
+            continue
+        if suppressed:
+            _mark_finished(events[exit_index].ancestors)
+            return exit_index + 1
+    raise exc_info[1]
+
+
+class SectionStepper:
+    """
+    A cursor over the lowest-level sections of a running section, returned by |Experiment.step_section|.
+
+    Each call to |SectionStepper.advance| exits the context managers of the previous lowest-level section
+    (and of any parent sections that have ended), marks it as finished,
+    and enters the context managers of the next one, calling any function callbacks on the way.
+    The frontend keeps control between calls.
+    A stepper can be used as a context manager, which closes it on exit.
+
+    Parameters
+    ----------
+    steps : generator
+        A generator yielding each lowest-level section while its callbacks are entered.
+    demo : bool, optional
+        Data will only be saved if `demo` is False (the default).
+
+    Attributes
+    ----------
+    current : |ExperimentSection| or None
+        The lowest-level section that is currently running, or None before the first call to
+        |SectionStepper.advance| and after the last.
+    finished : bool
+        Whether every section has been run.
+
+    """
+    def __init__(self, steps, demo=False):
+        self._steps = steps
+        self.demo = demo
+        self.current = None
+        self.finished = False
+
+    def advance(self):
+        """
+        Finish the current lowest-level section, and start the next one.
+
+        Returns
+        -------
+        |ExperimentSection| or None
+            The next lowest-level section, or None if there are none left.
+
+        """
+        if self.finished:
+            return None
+        try:
+            self.current = next(self._steps)
+        except StopIteration:
+            self.current = None
+            self.finished = True
+        return self.current
+
+    def record(self, results):
+        """
+        Record results of the current lowest-level section,
+        as if returned by a function callback.
+
+        Parameters
+        ----------
+        results : dict
+            Elements to be added to the current section's |ExperimentSection.data|.
+
+        """
+        if self.current is None:
+            raise ValueError('No section is running')
+        if results and not self.demo:
+            self.current.add_data(results)
+
+    def close(self):
+        """
+        Stop running, exiting all context managers that are entered.
+        They are exited as if an exception had occurred,
+        so only code in ``finally`` blocks (or ``__exit__`` methods) is run.
+        The current lowest-level section is not marked as finished.
+
+        """
+        self._steps.close()
+        self.current = None
+        self.finished = True
+
+    def __iter__(self):
+        while True:
+            section = self.advance()
+            if section is None:
+                return
+            yield section
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _Prefetcher:
+    """
+    Calls prepare callbacks in a thread pool, for the sections following the running one at each level.
+
+    Parameters
+    ----------
+    experiment : |Experiment|
+    run_order : function
+        Called with no arguments, returns an iterator over every section in the order they will be run.
+
+    """
+    def __init__(self, experiment, run_order):
+        self.experiment = experiment
+        self.executor = ThreadPoolExecutor(max_workers=max(experiment.prepare_lookahead_by_level.values()))
+        self.upcoming = {level: (section for section in run_order() if section.level == level)
+                         for level in experiment.prepare_callback_by_level}
+        self.pending = {level: deque() for level in experiment.prepare_callback_by_level}
+
+    def _submit(self, section):
+        callback = self.experiment.prepare_callback_by_level[section.level]
+        return self.executor.submit(callback, self.experiment, section)
+
+    def future(self, section):
+        """
+        Get the future of the prepare callback for `section`,
+        and start the prepare callbacks of the sections after it.
+
+        """
+        level = section.level
+        pending = self.pending[level]
+        upcoming = self.upcoming[level]
+
+        # Discard anything before this section.
+        while pending and pending[0][0] is not section:
+            pending.popleft()[1].cancel()
+
+        if not pending:
+            for next_section in upcoming:
+                if next_section is section:
+                    pending.append((section, self._submit(section)))
+                    break
+            else:
+                # The section is not in the run order; prepare it now.
+                return self._submit(section)
+
+        while len(pending) <= self.experiment.prepare_lookahead_by_level[level]:
+            next_section = next(upcoming, None)
+            if next_section is None:
+                break
+            pending.append((next_section, self._submit(next_section)))
+
+        return pending.popleft()[1]
+
+    def close(self):
+        for pending in self.pending.values():
+            for _, future in pending:
+                future.cancel()
+        self.executor.shutdown(wait=False)
 
 
 def _get_func_reference(func):
@@ -21,8 +21,10 @@ the |Experiment.base_section|--the experiment itself, essentially--must tell eac
 import itertools
 import random
 import logging
-from collections import deque, namedtuple
+import heapq
+from collections import namedtuple, Counter, defaultdict
 from math import factorial
+import numpy as np
 from experimentator._util import ClassSchema
 
 logger = logging.getLogger(__name__)
@@ -50,6 +52,9 @@ class Ordering:
         (as opposed to repeating each condition within the order).
 
     """
+    # Attributes computed from the conditions, which are not part of the ordering's state.
+    _CACHED_ATTRIBUTES = ('_grouped',)
+
     def __init__(self, number=1):
         self.number = number
         self.all_conditions = []
@@ -80,9 +85,40 @@ class Ordering:
 
         """
         self.all_conditions = self.number * list(conditions)
+        self._clear_cached_attributes()
 
         return IndependentVariable((), ())
 
+    @property
+    def is_deterministic(self):
+        """
+        Whether |Ordering.first_pass| always has the same result for the same conditions.
+        Only the first passes of deterministic orderings are cached (see |DesignTree.cache_enabled|).
+        True for the orderings in this module whose first passes are deterministic, and False otherwise,
+        including for subclasses, which may override this.
+
+        """
+        return type(self) in _DETERMINISTIC_ORDERINGS
+
+    def count_orders(self, counts):
+        """
+        Count the values of the IV that this ordering would create one level up,
+        without calling |Ordering.first_pass|.
+        Used to plan the size of an experiment before creating it (see |DesignTree.plan|).
+
+        Parameters
+        ----------
+        counts : sequence of int
+            For each distinct condition, the number of times it would be passed to |Ordering.first_pass|.
+
+        Returns
+        -------
+        int
+            The number of values of the new IV; 0 for atomic orderings, which create no IV.
+
+        """
+        return 0
+
     def get_order(self, data=None):
         """
         Get an order of conditions.
@@ -99,10 +135,49 @@ class Ordering:
         list of dict
             A list of conditions,
             where each condition is a dictionary mapping IV names to IV values.
+            The dictionaries are the ones passed to |Ordering.first_pass|, not copies;
+            sections in the same condition share them.
 
         """
         return self.all_conditions
 
+    def iter_order(self, data=None):
+        """
+        Iterate over an order of conditions.
+        The order is one that |Ordering.get_order| could return,
+        but subclasses may override this to generate it lazily, one condition at a time.
+
+        Parameters
+        ----------
+        data : dict, optional
+            A dictionary describing the data of the parent section.
+
+        Yields
+        ------
+        dict
+            A condition, a dictionary mapping IV names to IV values.
+
+        """
+        yield from self.get_order(data)
+
+    def get_orders(self, data_list):
+        """
+        Get orders of conditions for several sections at once.
+        Subclasses may override this to order conditions for many sections faster than one at a time.
+
+        Parameters
+        ----------
+        data_list : sequence of dict
+            For each section to order, a dictionary describing the data of its parent section.
+
+        Returns
+        -------
+        list of list of dict
+            For each element of `data_list`, a list of conditions as returned by |Ordering.get_order|.
+
+        """
+        return [self.get_order(data) for data in data_list]
+
     @staticmethod
     def possible_orders(conditions, unique=True):
         """
@@ -126,11 +201,25 @@ class Ordering:
         else:
             yield from itertools.permutations(conditions)
 
+    def __getstate__(self):
+        return {key: value for key, value in self.__dict__.items() if key not in self._CACHED_ATTRIBUTES}
+
     def __eq__(self, other):
         if isinstance(other, type(self)):
-            return self.__dict__ == other.__dict__
+            return self.__getstate__() == other.__getstate__()
         return False
 
+    def _clear_cached_attributes(self):
+        for attribute in self._CACHED_ATTRIBUTES:
+            self.__dict__.pop(attribute, None)
+
+    def _group_conditions(self):
+        # The distinct conditions and the index of each condition among them.
+        # Computed once, rather than for every order; orderings loaded from a file compute it on first use.
+        if '_grouped' not in self.__dict__:
+            self._grouped = _group_distinct(self.all_conditions)
+        return self._grouped
+
 
 class Shuffle(Ordering):
     """
@@ -143,6 +232,7 @@ class Shuffle(Ordering):
         Conditions are duplicated *before* shuffling.
     avoid_repeats : bool, optional
         If True (default is False), no identical conditions will appear back-to-back.
+        This is not possible if one condition makes up more than half of the conditions (after duplication).
 
     """
     def __init__(self, number=1, avoid_repeats=False):
@@ -152,6 +242,37 @@ class Shuffle(Ordering):
     def __repr__(self):
         return '{}(number={}, avoid_repeats={})'.format(self.__class__.__name__, self.number, self.avoid_repeats)
 
+    def first_pass(self, conditions):
+        """
+        Handle operations that should only be performed once,
+        initializing the object before ordering conditions.
+        For |Shuffle|, the conditions are duplicated (if |Ordering.number| > 1)
+        and, if `avoid_repeats` is True, checked for whether repeats can be avoided.
+        This method should not be called manually.
+
+        Parameters
+        ----------
+        conditions : sequence of dict
+            A list of conditions, where each condition is a dictionary mapping IV names to IV values.
+
+        Returns
+        -------
+        iv_name : tuple
+            An empty tuple.
+        iv_values : tuple
+            An empty tuple.
+
+        Raises
+        ------
+        ValueError
+            If `avoid_repeats` is True and one condition makes up more than half of the order.
+
+        """
+        iv = super().first_pass(conditions)
+        if self.avoid_repeats:
+            _check_repeats_avoidable(self._group_conditions()[1])
+        return iv
+
     def get_order(self, data=None):
         """
         Get an order of conditions.
@@ -170,13 +291,262 @@ class Shuffle(Ordering):
             where each condition is a dictionary mapping IV names to IV values.
 
         """
+        if self.avoid_repeats:
+            _, groups = self._group_conditions()
+            return [self.all_conditions[i] for i in _shuffle_without_repeats(groups)]
+
         conditions = self.all_conditions.copy()
         random.shuffle(conditions)
+        return conditions
+
+    def iter_order(self, data=None):
+        """
+        Iterate over a random order of conditions.
+        Unless `avoid_repeats` is True, the order is generated lazily,
+        so taking the first conditions of a long order is fast,
+        and the memory used grows only with the number of conditions taken.
+
+        Parameters
+        ----------
+        data : dict, optional
+            A dictionary describing the data of the parent section.
+            Unused for atomic orderings.
+
+        Yields
+        ------
+        dict
+            A condition, a dictionary mapping IV names to IV values.
+
+        """
         if self.avoid_repeats:
-            while _has_repeats(conditions):
-                random.shuffle(conditions)
+            yield from self.get_order(data)
+            return
+
+        # A Fisher-Yates shuffle that records only the positions it has swapped, rather than copying the list.
+        conditions = self.all_conditions
+        n = len(conditions)
+        swapped = {}
+        for i in range(n):
+            j = random.randrange(i, n)
+            current = swapped.pop(i, i)
+            if j == i:
+                yield conditions[current]
+            else:
+                yield conditions[swapped.get(j, j)]
+                swapped[j] = current
 
-        return conditions
+    def get_order_matrix(self, n_orders):
+        """
+        Get several random orders at once, as indices into the conditions.
+
+        Parameters
+        ----------
+        n_orders : int
+            The number of orders to generate.
+
+        Returns
+        -------
+        |numpy array|
+            An integer array with one row per order.
+            Each row is a permutation of the indices of the (duplicated) conditions.
+
+        """
+        if self.avoid_repeats:
+            _, groups = self._group_conditions()
+            return np.array([_shuffle_without_repeats(groups) for _ in range(n_orders)],
+                            dtype=int).reshape(n_orders, len(groups))
+
+        # Sorting random keys gives each row an independent, uniformly random permutation.
+        # Seeding from the random module keeps orders reproducible with random.seed, like Shuffle.get_order.
+        rng = np.random.RandomState(random.getrandbits(32))
+        return np.argsort(rng.random_sample((n_orders, len(self.all_conditions))), axis=1)
+
+    def get_orders(self, data_list):
+        """
+        Get orders of conditions for several sections at once.
+        For |Shuffle|, the orders are generated together by |Shuffle.get_order_matrix|.
+
+        Parameters
+        ----------
+        data_list : sequence of dict
+            For each section to order, a dictionary describing the data of its parent section.
+            Unused for atomic orderings.
+
+        Returns
+        -------
+        list of list of dict
+            For each element of `data_list`, a list of conditions.
+
+        """
+        conditions = self.all_conditions
+        return [[conditions[i] for i in row] for row in self.get_order_matrix(len(data_list)).tolist()]
+
+
+class ConstrainedShuffle(Ordering):
+    """
+    This ordering randomly shuffles the conditions,
+    subject to constraints on the sequence.
+    A random order is repaired by swapping conditions until it satisfies every constraint.
+
+    Parameters
+    ----------
+    number : int, optional
+        Number of times each condition should appear (default=1).
+        Conditions are duplicated *before* shuffling.
+    max_run : dict, optional
+        Maps IV names to the maximum number of consecutive conditions allowed to have the same value of that IV.
+        For example, ``{'target': 3}`` allows at most three conditions in a row with the same ``'target'``.
+    forbidden_transitions : list, optional
+        Pairs ``[before, after]`` of dictionaries mapping IV names to IV values.
+        A condition matching every item of `before`
+        may not be immediately followed by a condition matching every item of `after`.
+    segments : int, optional
+        Split the order into this many parts of equal length (default=1),
+        each containing every condition equally often
+        (for example, ``segments=2`` for equal counts in each half).
+        `number` must be divisible by `segments`.
+    max_iterations : int, optional
+        The maximum number of swaps to try before giving up.
+        The default is 100 times the length of the order.
+
+    Notes
+    -----
+    Orders are not sampled uniformly from the orders satisfying the constraints,
+    but each order is random.
+    If the constraints are impossible to satisfy, or very hard,
+    |Design.get_order| will raise a ``ValueError`` after `max_iterations` swaps.
+
+    """
+    _CACHED_ATTRIBUTES = Ordering._CACHED_ATTRIBUTES + ('_constraints',)
+
+    def __init__(self, number=1, max_run=None, forbidden_transitions=None, segments=1, max_iterations=None):
+        super().__init__(number=number)
+        self.max_run = max_run or {}
+        self.forbidden_transitions = [list(transition) for transition in forbidden_transitions or []]
+        self.segments = segments
+        self.max_iterations = max_iterations
+
+    def __repr__(self):
+        return '{}(number={}, max_run={!r}, forbidden_transitions={!r}, segments={}, max_iterations={})'.format(
+            self.__class__.__name__, self.number, self.max_run, self.forbidden_transitions,
+            self.segments, self.max_iterations)
+
+    def first_pass(self, conditions):
+        """
+        Handle operations that should only be performed once,
+        initializing the object before ordering conditions.
+        For |ConstrainedShuffle|, the conditions are duplicated and the constraints are checked.
+        This method should not be called manually.
+
+        Parameters
+        ----------
+        conditions : sequence of dict
+            A list of conditions, where each condition is a dictionary mapping IV names to IV values.
+
+        Returns
+        -------
+        iv_name : tuple
+            An empty tuple.
+        iv_values : tuple
+            An empty tuple.
+
+        """
+        if self.number % self.segments:
+            raise ValueError('ConstrainedShuffle number ({}) must be divisible by segments ({})'.format(
+                self.number, self.segments))
+        if any(limit < 1 for limit in self.max_run.values()):
+            raise ValueError('ConstrainedShuffle max_run values must be at least 1')
+        iv = super().first_pass(conditions)
+        self._index_constraints()
+        return iv
+
+    def get_order(self, data=None):
+        """
+        Get an order of conditions.
+        For |ConstrainedShuffle|, returns the conditions in a random order satisfying the constraints.
+
+        Parameters
+        ----------
+        data : dict, optional
+            A dictionary describing the data of the parent section.
+            Unused for atomic orderings.
+
+        Returns
+        -------
+        list of dict
+            A list of conditions,
+            where each condition is a dictionary mapping IV names to IV values.
+
+        """
+        distinct, groups = self._group_conditions()
+        if not groups:
+            return []
+        runs, forbidden = self._index_constraints()
+
+        # The duplicated conditions repeat in order, so each segment of the list contains each condition equally often.
+        n = len(groups)
+        segment_length = n // self.segments
+        sequence = []
+        for start in range(0, n, segment_length):
+            segment = groups[start:start+segment_length]
+            random.shuffle(segment)
+            sequence.extend(segment)
+
+        def violations(t):
+            # Violations beginning at position t.
+            count = t + 1 < n and forbidden[sequence[t]][sequence[t+1]]
+            for values, limit in runs:
+                if t + limit < n:
+                    value = values[sequence[t]]
+                    count += all(values[sequence[t+d]] == value for d in range(1, limit + 1))
+            return count
+
+        reach = max([limit for _, limit in runs] + [1])
+        violations_by_position = [violations(t) for t in range(n)]
+        bad = _IndexedSet(t for t in range(n) if violations_by_position[t])
+        max_iterations = 100 * n if self.max_iterations is None else self.max_iterations
+
+        for _ in range(max_iterations):
+            if not bad:
+                break
+            i = min(bad.choice() + random.randint(0, reach), n - 1)
+            j = i - i % segment_length + random.randrange(segment_length)
+            if sequence[i] == sequence[j]:
+                continue
+
+            affected = sorted(set(range(max(i - reach, 0), i + 1)) | set(range(max(j - reach, 0), j + 1)))
+            old = sum(violations_by_position[t] for t in affected)
+            sequence[i], sequence[j] = sequence[j], sequence[i]
+            new = [violations(t) for t in affected]
+            # Only accept swaps that don't add violations; otherwise violations persist in long orders.
+            if sum(new) > old:
+                sequence[i], sequence[j] = sequence[j], sequence[i]
+                continue
+
+            for t, count in zip(affected, new):
+                violations_by_position[t] = count
+                if count:
+                    bad.add(t)
+                else:
+                    bad.discard(t)
+
+        if bad:
+            raise ValueError('Could not satisfy the constraints of {} in {} iterations'.format(self, max_iterations))
+
+        return [distinct[group] for group in sequence]
+
+    def _index_constraints(self):
+        # The constraints in terms of the indices of distinct conditions, computed once like the groups.
+        if '_constraints' not in self.__dict__:
+            distinct, _ = self._group_conditions()
+            runs = [([condition.get(iv_name) for condition in distinct], limit)
+                    for iv_name, limit in self.max_run.items()]
+            forbidden = [[any(_matches(before_condition, before) and _matches(after_condition, after)
+                              for before, after in self.forbidden_transitions)
+                          for after_condition in distinct]
+                         for before_condition in distinct]
+            self._constraints = runs, forbidden
+        return self._constraints
 
 
 class NonAtomicOrdering(Ordering):
@@ -241,21 +611,25 @@ class CompleteCounterbalance(NonAtomicOrdering):
     Notes
     -----
     The number of possible orderings can get very large very quickly.
-    Therefore, a complete counterbalance is not recommended for more than 3 conditions.
     The number of unique orderings can be determined by
     ``factorial(number * k) // number**k``,
     where `k` is the number of conditions (assuming all conditions are unique).
     For example, with 5 conditions there are 120 possible orders;
     with 3 conditions and ``number==2``, there are 90 unique orders.
+    Orders are not stored; the levels of the new IV are integers
+    and each order is generated from its integer when it is needed.
+    However, because every order is used at the level above,
+    a complete counterbalance is still not recommended for more than 4 or 5 conditions.
 
     """
     iv_name = 'counterbalance_order'
+    _CACHED_ATTRIBUTES = NonAtomicOrdering._CACHED_ATTRIBUTES + ('_counted',)
 
     def first_pass(self, conditions):
         """
         Handle operations that should only be performed once,
         initializing the object before ordering conditions.
-        For |CompleteCounterbalance|, all possible orders are determined.
+        For |CompleteCounterbalance|, the number of possible orders is determined.
         This method should not be called manually.
 
         Parameters
@@ -268,22 +642,96 @@ class CompleteCounterbalance(NonAtomicOrdering):
         -------
         iv_name : str or tuple
             The name of the IV to be created one level up, ``'counterbalance_order'``.
-        iv_values : tuple
+        iv_values : list of int
             Values of the IV to be created one level up,
             integers each associated with an order of the conditions.
 
         """
         conditions = list(conditions)
         self.all_conditions = self.number * conditions
+        self._clear_cached_attributes()
 
-        # Warn because this might hang if this method is accidentally used with too many possible orders.
-        non_distinct_orders = factorial(len(self.all_conditions))
-        equivalent_orders = factorial(self.number)**len(conditions)
-        logger.warning("Creating IV '{}' with {} levels.".format(
-            self.iv_name, non_distinct_orders//equivalent_orders))
+        iv = self.iv
+        # Warn because the number of orders determines the size of the level above.
+        logger.warning("Creating IV '{}' with {} levels.".format(self.iv_name, len(iv.values)))
+        return iv
 
-        self.order_ivs = dict(enumerate(self.possible_orders(self.all_conditions)))
-        return self.iv
+    @property
+    def iv(self):
+        if self.order_ivs:
+            # Experiments saved by earlier versions stored every order.
+            return super().iv
+
+        _, counts = self._count_conditions()
+        return IndependentVariable(self.iv_name, list(range(_n_permutations(counts))))
+
+    def count_orders(self, counts):
+        """
+        Count the distinct orders of conditions, without calling |Ordering.first_pass|.
+
+        Parameters
+        ----------
+        counts : sequence of int
+            For each distinct condition, the number of times it would be passed to |Ordering.first_pass|.
+
+        Returns
+        -------
+        int
+
+        """
+        return _n_permutations([self.number * count for count in counts])
+
+    def get_order(self, data=None):
+        """
+        Get an order of conditions.
+        For |CompleteCounterbalance|, the order is the one in position ``data['counterbalance_order']``
+        of the lexicographic ordering of all distinct permutations of the conditions.
+
+        Parameters
+        ----------
+        data : dict, optional
+            A dictionary describing the data of the parent section.
+
+        Returns
+        -------
+        list of dict
+            A list of conditions,
+            where each condition is a dictionary mapping IV names to IV values.
+
+        """
+        if self.order_ivs:
+            return super().get_order(data)
+
+        distinct, counts = self._count_conditions()
+        counts = counts.copy()
+        rank = data[self.iv_name]
+        n_remaining = len(self.all_conditions)
+        # The number of distinct permutations of the remaining conditions.
+        n_orders = factorial(n_remaining)
+        for count in counts:
+            n_orders //= factorial(count)
+
+        order = []
+        while n_remaining:
+            for i, count in enumerate(counts):
+                if not count:
+                    continue
+                n_orders_starting_here = n_orders * count // n_remaining
+                if rank < n_orders_starting_here:
+                    order.append(distinct[i])
+                    counts[i] -= 1
+                    n_remaining -= 1
+                    n_orders = n_orders_starting_here
+                    break
+                rank -= n_orders_starting_here
+
+        return order
+
+    def _count_conditions(self):
+        # The distinct conditions and how many times each appears, computed once rather than for every order.
+        if '_counted' not in self.__dict__:
+            self._counted = _count_distinct(self.all_conditions)
+        return self._counted
 
 
 class Sorted(NonAtomicOrdering):
@@ -356,6 +804,24 @@ class Sorted(NonAtomicOrdering):
         else:
             return IndependentVariable((), ())
 
+    def count_orders(self, counts):
+        """
+        Count the values of the IV that this ordering would create one level up,
+        without calling |Ordering.first_pass|.
+
+        Parameters
+        ----------
+        counts : sequence of int
+            For each distinct condition, the number of times it would be passed to |Ordering.first_pass|.
+
+        Returns
+        -------
+        int
+            2 if `order` is ``'both'``, otherwise 0.
+
+        """
+        return 2 if self.order == 'both' else 0
+
     def get_order(self, data=None):
         """
         Get an order of conditions.
@@ -397,19 +863,29 @@ class LatinSquare(NonAtomicOrdering):
         If True (the default), first-order order effects will be balanced
         Each condition will appear the same number of times
         immediately before and immediately after every other condition.
-        Balanced latin squares can only be constructed with an even number of conditions.
+        Balanced latin squares can only be constructed with an even number of conditions,
+        unless `williams` is True.
     uniform : bool, optional
         If True (default is False), the Latin square will be randomly sampled
         from a uniform distribution of Latin squares of size NxN.
         Otherwise, the sampling will be biased.
         The construction of balanced, uniform Latin squares is not implemented.
+    iterations : int, optional
+        The mixing length used when sampling uniform Latin squares.
+        See |latin_square|.
+    seed : int, optional
+        Seed for constructing the Latin square, to construct the same square every time.
+    williams : bool, optional
+        If True (default is False) and `balanced` is True,
+        an odd number of conditions is balanced with a Williams design:
+        a pair of Latin squares, giving 2N rows (and 2N levels of the new IV).
+        See |williams_design|.
 
     Notes
     -----
-    The algorithm for computing unbalanced Latin squares is not very efficient.
-    It is not recommended to construct unbalanced, uniform Latin squares of order above 5;
-    for non-uniform, unbalanced Latin squares it is safe to go up to an order of 10.
-    Higher than that, computation times increase rapidly.
+    Uniform Latin squares are sampled with a Markov chain,
+    which takes under a second up to an order of about 50 with the default `iterations`.
+    Non-uniform, unbalanced Latin squares are constructed directly and can be of any order.
 
     The algorithm for computing balanced Latin squares is fast only because it is not robust;
     it is very biased and only samples from the same limited set of balanced Latin squares.
@@ -419,16 +895,27 @@ class LatinSquare(NonAtomicOrdering):
     """
     iv_name = 'latin_square_row'
 
-    def __init__(self, number=1, balanced=True, uniform=False):
+    def __init__(self, number=1, balanced=True, uniform=False, iterations=None, seed=None, williams=False):
         if balanced and uniform:
             raise ValueError('Cannot create a balanced, uniform Latin square')
         super().__init__(number=number)
         self.balanced = balanced
         self.uniform = uniform
+        self.iterations = iterations
+        self.seed = seed
+        self.williams = williams
 
     def __repr__(self):
-        return '{}(number={}, balanced={}, uniform={})'.format(
-            self.__class__.__name__, self.number, self.balanced, self.uniform)
+        return '{}(number={}, balanced={}, uniform={}, iterations={}, seed={}, williams={})'.format(
+            self.__class__.__name__, self.number, self.balanced, self.uniform, self.iterations, self.seed,
+            self.williams)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Orderings saved by earlier versions.
+        self.__dict__.setdefault('iterations', None)
+        self.__dict__.setdefault('seed', None)
+        self.__dict__.setdefault('williams', False)
 
     def first_pass(self, conditions):
         """
@@ -454,8 +941,11 @@ class LatinSquare(NonAtomicOrdering):
         self.all_conditions = list(conditions)
         order = len(self.all_conditions)
 
-        if self.balanced:
-            square = balanced_latin_square(order)
+        if self.balanced and self.williams:
+            square = williams_design(order, seed=self.seed)
+
+        elif self.balanced:
+            square = balanced_latin_square(order, seed=self.seed)
 
         else:
             if self.uniform:
@@ -465,20 +955,183 @@ class LatinSquare(NonAtomicOrdering):
             logger.warning('Constructing Latin square of order {} from a {}uniform distribution...'.format(
                 order, uniform_string))
 
-            square = latin_square(order, uniform=self.uniform, reduced=not self.uniform, shuffle=not self.uniform)
+            square = latin_square(order, uniform=self.uniform, reduced=not self.uniform, shuffle=not self.uniform,
+                                  iterations=self.iterations, seed=self.seed)
             logger.warning('Latin square construction complete.')
 
         self.order_ivs = dict(enumerate(self.number * [self.all_conditions[i] for i in row] for row in square))
 
-        logger.warning("Creating IV '{}' with {} levels.".format(self.iv_name, order))
+        logger.warning("Creating IV '{}' with {} levels.".format(self.iv_name, len(square)))
         return self.iv
 
+    @property
+    def is_deterministic(self):
+        """
+        Whether |Ordering.first_pass| always constructs the same square; true only if `seed` is given.
+
+        """
+        return type(self) is LatinSquare and self.seed is not None
 
-def _has_repeats(seq):
-    return any(first == second for first, second in zip(seq[:-1], seq[1:]))
+    def count_orders(self, counts):
+        """
+        Count the rows of the Latin square, without calling |Ordering.first_pass|.
 
+        Parameters
+        ----------
+        counts : sequence of int
+            For each distinct condition, the number of times it would be passed to |Ordering.first_pass|.
+
+        Returns
+        -------
+        int
+
+        """
+        order = sum(counts)
+        if self.balanced and self.williams and order % 2:
+            return 2 * order
+        return order
+
+
+# Orderings whose first passes depend only on the conditions (shuffling happens later, in get_order).
+_DETERMINISTIC_ORDERINGS = (Ordering, Shuffle, ConstrainedShuffle, CompleteCounterbalance, Sorted)
+
+
+def _n_permutations(counts):
+    # The number of distinct permutations of a multiset with these multiplicities.
+    n_permutations = factorial(sum(counts))
+    for count in counts:
+        n_permutations //= factorial(count)
+    return n_permutations
+
+
+def _group_distinct(conditions):
+    """
+    Find the distinct conditions, in order of first appearance,
+    and the index in that list of each condition.
+
+    """
+    distinct = []
+    groups = []
+    index_by_key = {}
+    for condition in conditions:
+        key = _condition_key(condition)
+        if key is None:
+            # Unhashable IV values; fall back to comparing with every distinct condition.
+            index = next((i for i, other in enumerate(distinct) if other == condition), None)
+        else:
+            index = index_by_key.get(key)
+        if index is None:
+            index = len(distinct)
+            distinct.append(condition)
+            if key is not None:
+                index_by_key[key] = index
+        groups.append(index)
+    return distinct, groups
+
+
+def _condition_key(condition):
+    # A hashable key, equal for equal conditions, or None if the condition has unhashable IV values.
+    try:
+        key = tuple(sorted(condition.items()))
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _count_distinct(conditions):
+    distinct, groups = _group_distinct(conditions)
+    counts = [0] * len(distinct)
+    for group in groups:
+        counts[group] += 1
+    return distinct, counts
+
+
+def _matches(condition, spec):
+    return all(iv_name in condition and condition[iv_name] == value for iv_name, value in spec.items())
+
+
+class _IndexedSet:
+    """A set supporting random choice in constant time."""
+    def __init__(self, items=()):
+        self.items = []
+        self.positions = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        position = self.positions.pop(item, None)
+        if position is not None:
+            last = self.items.pop()
+            if position < len(self.items):
+                self.items[position] = last
+                self.positions[last] = position
+
+    def choice(self):
+        return random.choice(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def _check_repeats_avoidable(groups):
+    counts = Counter(groups)
+    if counts and max(counts.values()) > (len(groups) + 1) // 2:
+        raise ValueError('Cannot avoid repeats: one condition appears {} times in an order of length {}'.format(
+            max(counts.values()), len(groups)))
+
+
+def _shuffle_without_repeats(groups, rng=random):
+    """
+    Randomly order the items of `groups` so that no two consecutive items are equal,
+    returning a list of indices into `groups`.
+    The order must be possible (see `_check_repeats_avoidable`).
+
+    Each position is filled with a random remaining item, excluding items equal to the previous one,
+    unless one value has so many items remaining that it must fill this position
+    for the rest of the order to be possible.
 
-def latin_square(order, reduced=False, uniform=True, shuffle=False):
+    """
+    positions = defaultdict(list)
+    for i, group in enumerate(groups):
+        positions[group].append(i)
+    for group_positions in positions.values():
+        rng.shuffle(group_positions)
+
+    # The remaining items in no particular order, and a heap of groups by remaining count (with stale entries).
+    remaining = list(groups)
+    largest = [(-len(group_positions), group) for group, group_positions in positions.items()]
+    heapq.heapify(largest)
+
+    order = []
+    previous = None
+    while remaining:
+        while -largest[0][0] != len(positions[largest[0][1]]):
+            heapq.heappop(largest)
+        # Because this group has more than half the remaining items, random draws find it quickly.
+        # Likewise, the previous group never has more than half.
+        forced = largest[0][1] if -largest[0][0] > len(remaining) // 2 else None
+
+        idx = rng.randrange(len(remaining))
+        while remaining[idx] == previous or (forced is not None and remaining[idx] != forced):
+            idx = rng.randrange(len(remaining))
+        group = remaining[idx]
+        remaining[idx] = remaining[-1]
+        remaining.pop()
+
+        order.append(positions[group].pop())
+        heapq.heappush(largest, (-len(positions[group]), group))
+        previous = group
+
+    return order
+
+
+def latin_square(order, reduced=False, uniform=True, shuffle=False, iterations=None, seed=None):
     """
     Constructs a Latin square of size `order` x `order`.
     Each row and column will contain every element of ``range(order)`` exactly once.
@@ -493,13 +1146,21 @@ def latin_square(order, reduced=False, uniform=True, shuffle=False):
         unless `shuffle` is also True.
     uniform : bool, optional
         If True (the default), the Latin square will be sampled from a uniform distribution of Latin squares.
-        Set to False to relax this constraint and allow for a faster run time.
+        Set to False to relax this constraint and allow for a faster run time (see Notes).
     shuffle : bool, optional
         If True (default is False),
         after construction of the Latin square its rows will be shuffled randomly,
         then its columns, and then the elements will be randomly permuted.
         Shuffling is irrelevant when `uniform` is True.
         Otherwise, it adds some randomness, though the resulting Latin square will still be biased.
+    iterations : int, optional
+        When `uniform` is True, the number of (proper) Latin squares the Markov chain used for sampling visits
+        before stopping (see Notes).
+        The default is ``order**2``.
+    seed : int, optional
+        Seed for the random number generator, to construct the same square every time.
+        By default, the square is drawn using the state of Python's :mod:`random` module,
+        so it is reproducible with ``random.seed``.
 
     Returns
     -------
@@ -513,13 +1174,22 @@ def latin_square(order, reduced=False, uniform=True, shuffle=False):
 
     Notes
     -----
-    This function uses a naive algorithm to construct latin squares,
-    randomly generating elements and starting over whenever a collision is encountered.
-    It will take a long time to construct Latin squares of order 5,
-    when sampling from a uniform distribution.
-    However, if a uniform distribution is not required,
-    it is recommended to also set `reduced` and `shuffle` to True for fastest run times.
-    In this case, latin squares up to an order of about 10 can be constructed in a reasonable amount of time.
+    Uniform Latin squares are sampled using the Markov chain of Jacobson and Matthews (1996),
+    starting from a cyclic Latin square.
+    Each step changes the square locally, possibly passing through 'improper' squares,
+    and the Latin squares it visits are uniformly distributed in the long run.
+    Roughly one in ``order / 2`` steps visits a Latin square,
+    so the default mixing length amounts to about ``order**3 / 2`` steps,
+    taking under a second up to an order of about 50.
+    Shorter chains under-sample the squares with many intercalates.
+    Only the approximation to uniformity depends on `iterations`;
+    the result is always a valid Latin square.
+    Reduced squares are obtained by permuting the columns and rows of a square,
+    which preserves uniformity.
+
+    When a uniform distribution is not required,
+    a cyclic Latin square is constructed and then its rows, columns, and elements are randomly permuted.
+    This is fast at any order, but only samples from the Latin squares isotopic to a cyclic square.
 
     Examples
     --------
@@ -538,37 +1208,106 @@ def latin_square(order, reduced=False, uniform=True, shuffle=False):
       [4, 3, 0, 1, 2]]  #random
 
     """
-    numbers = list(range(order))
-    square = []
+    rng = _rng(seed)
+    if uniform:
+        if iterations is None:
+            iterations = _mixing_length(order)
+        square = np.array(_jacobson_matthews(order, iterations, rng))
+    else:
+        square = _shuffle_latin_square(np.add.outer(np.arange(order), np.arange(order)) % order, rng=rng)
+
     if reduced:
-        while not _is_latin_rect(square):
-            square = [numbers]   # To get a uniform sampling of latin squares, we must start over every time.
-            for row in range(1, order):
-                square.append(_new_row(order, reduced_row=row))
-                if uniform and not _is_latin_rect(square):
-                    break
-                elif not uniform:
-                    while not _is_latin_rect(square):
-                        square[-1] = _new_row(order, reduced_row=row)
-
-    else:  # Not reduced.
-        while not _is_latin_rect(square):
-            square = []
-            for _ in range(order):
-                square.append(_new_row(order))
-                if uniform and not _is_latin_rect(square):
-                    break
-                elif not uniform:
-                    while not _is_latin_rect(square):
-                        square[-1] = _new_row(order)
+        square = _reduce_latin_square(square)
 
     if shuffle:
-        _shuffle_latin_square(square)
+        square = _shuffle_latin_square(square, rng=rng)
+
+    return square.tolist()
+
+
+def _rng(seed):
+    # Without a seed, draw one from the random module, so that random.seed makes results reproducible.
+    return random.Random(random.getrandbits(32) if seed is None else seed)
 
-    return square
 
+def _mixing_length(order):
+    # The default number of proper squares the Jacobson-Matthews chain visits.
+    return order**2
 
-def balanced_latin_square(order):
+
+def _jacobson_matthews(order, iterations, rng):
+    """
+    Run the Jacobson-Matthews Markov chain on the incidence cube of a Latin square,
+    starting from a cyclic square, until it has visited `iterations` proper squares, and return the last one.
+
+    The cube has a 1 at (row, column, symbol) when the cell (row, column) contains symbol.
+    Only its positive entries are stored, as line lists: the symbols of each cell,
+    the columns of each symbol in a row, and the rows of each symbol in a column.
+    Every line has exactly one positive entry,
+    except in an improper square, which has a single -1 entry at `improper`
+    whose three lines have two positive entries each.
+
+    """
+    if order < 2:
+        return [list(range(order))]
+
+    symbols = [[[(r + c) % order] for c in range(order)] for r in range(order)]
+    columns = [[[(s - r) % order] for s in range(order)] for r in range(order)]
+    rows = [[[(s - c) % order] for s in range(order)] for c in range(order)]
+    improper = None
+
+    def increment(r, c, s):
+        nonlocal improper
+        if improper == (r, c, s):
+            improper = None
+        else:
+            symbols[r][c].append(s)
+            columns[r][s].append(c)
+            rows[c][s].append(r)
+
+    def decrement(r, c, s):
+        nonlocal improper
+        if s in symbols[r][c]:
+            symbols[r][c].remove(s)
+            columns[r][s].remove(c)
+            rows[c][s].remove(r)
+        else:
+            improper = (r, c, s)
+
+    # Only proper squares are counted, and the chain stops on one.
+    # Stopping at the first proper square after a fixed number of steps would be biased
+    # towards squares adjacent to many improper squares.
+    proper_steps = 0
+    while proper_steps < iterations:
+        if improper:
+            r, c, s = improper
+            s1 = rng.choice(symbols[r][c])
+            c1 = rng.choice(columns[r][s])
+            r1 = rng.choice(rows[c][s])
+        else:
+            # Choose a zero entry of the cube.
+            r, c, s = rng.randrange(order), rng.randrange(order), rng.randrange(order - 1)
+            s1 = symbols[r][c][0]
+            if s >= s1:
+                s += 1
+            c1 = columns[r][s][0]
+            r1 = rows[c][s][0]
+
+        increment(r, c, s)
+        increment(r, c1, s1)
+        increment(r1, c, s1)
+        increment(r1, c1, s)
+        decrement(r, c, s1)
+        decrement(r, c1, s)
+        decrement(r1, c, s)
+        decrement(r1, c1, s1)
+        if not improper:
+            proper_steps += 1
+
+    return [[cell[0] for cell in row] for row in symbols]
+
+
+def balanced_latin_square(order, seed=None):
     """
     Constructs a row-balanced latin square of order `order`.
     In a row-balanced Latin square, immediate order effects are accounted for.
@@ -581,6 +1320,8 @@ def balanced_latin_square(order):
     order : int
         Order of the Latin square to construct.
         Must be even.
+    seed : int, optional
+        Seed for the random number generator, to construct the same square every time.
 
     Returns
     -------
@@ -615,73 +1356,114 @@ def balanced_latin_square(order):
     if order % 2:
         raise ValueError('Cannot compute a balanced Latin square with an odd order')
 
-    original_numbers = range(order)
-    column_starts = [0, 1]
-    for first, last in zip(original_numbers[2:], reversed(original_numbers[2:])):
-        column_starts.append(last)
-        column_starts.append(first)
-        if len(column_starts) == order:
-            break
+    return _shuffle_latin_square(_williams_square(order), shuffle_columns=False, rng=_rng(seed)).tolist()
 
-    square = []
-    for start in column_starts:
-        column = deque(original_numbers)
-        column.rotate(-start)
-        square.append(list(column))
-    square = list(zip(*square))
-    square = [list(row) for row in square]
 
-    return _shuffle_latin_square(square, shuffle_columns=False)
+def williams_design(order, seed=None):
+    """
+    Constructs a Williams design of order `order`:
+    a set of rows (orderings of ``range(order)``) in which
+    every element appears equally often in each position
+    and immediately follows every other element equally often.
+    For an even order, this is a balanced Latin square, as returned by |balanced_latin_square|.
+    For an odd order, it is a pair of Latin squares, the second the mirror image of the first,
+    and has ``2 * order`` rows.
 
+    Parameters
+    ----------
+    order : int
+        Number of elements.
+    seed : int, optional
+        Seed for the random number generator, to construct the same design every time.
 
-def _shuffle_latin_square(square, shuffle_columns=True, shuffle_rows=True, shuffle_items=True):
+    Returns
+    -------
+    array-like
+        A Williams design of size `order` x `order` (even `order`) or ``2 * order`` x `order` (odd `order`).
+
+    See Also
+    --------
+    balanced_latin_square
+    LatinSquare
+
+    Notes
+    -----
+    The design is computed in closed form.
+    Like |balanced_latin_square|, its elements and rows (but not its columns) are then randomly permuted.
+
+    Examples
+    --------
+    >>> williams_design(3)
+    [[2, 0, 1],
+     [1, 0, 2],
+     [0, 1, 2],
+     [0, 2, 1],
+     [2, 1, 0],
+     [1, 2, 0]]  # random
+
+    """
+    rng = _rng(seed)
+    design = _williams_square(order)
+    if order % 2:
+        design = np.concatenate([design, design[:, ::-1]])
+
+    design = design[_permutation(len(design), rng)]
+    return _permutation(order, rng)[design].tolist()
+
+
+def _williams_square(order):
+    # The first row is 0, 1, n-1, 2, n-2, ...,
+    # and each column is the sequence of numbers rotated to begin at the element in the first row.
+    column_starts = [0]
+    for first, last in zip(range(1, order), reversed(range(1, order))):
+        if len(column_starts) < order:
+            column_starts.append(first)
+        if len(column_starts) < order:
+            column_starts.append(last)
+
+    return np.add.outer(np.arange(order), column_starts) % order
+
+
+def _shuffle_latin_square(square, shuffle_columns=True, shuffle_rows=True, shuffle_items=True, rng=random):
+    square = np.asarray(square)
     order = len(square)
 
     if shuffle_rows:
-        random.shuffle(square)
+        square = square[_permutation(order, rng)]
 
     if shuffle_columns:
-        square = list(zip(*square))
-        random.shuffle(square)
-        square = list(zip(*square))
-        square = [list(row) for row in square]
+        square = square[:, _permutation(order, rng)]
 
     if shuffle_items:
-        new_factors = list(range(order))
-        random.shuffle(new_factors)
-        new_square = []
-        for row in square:
-            new_row = row.copy()
-            for original_factor, new_factor in zip(range(order), new_factors):
-                new_row[row.index(original_factor)] = new_factor
-            new_square.append(new_row)
-        square = new_square
+        square = _permutation(order, rng)[square]
 
     assert(_is_latin_rect(square))
 
     return square
 
 
-def _is_latin_rect(matrix):
-    if not matrix:
-        return False
-    return (all(len(set(row)) == len(row) for row in matrix) and
-            all(len(set(column)) == len(column) for column in zip(*matrix)))
+def _permutation(n, rng):
+    permutation = list(range(n))
+    rng.shuffle(permutation)
+    return np.array(permutation, dtype=int)
 
 
-def _new_row(order, reduced_row=None):
-    numbers = list(range(order))
-    if reduced_row is not None:
-        new_row = [reduced_row]
-        remaining_numbers = list(set(numbers) - set(new_row))
-        random.shuffle(remaining_numbers)
-        new_row.extend(remaining_numbers)
+def _reduce_latin_square(square):
+    # Permute the columns to put the first row in order, then the rows to put the first column in order.
+    square = square[:, np.argsort(square[0])]
+    return square[np.argsort(square[:, 0])]
 
-    else:
-        new_row = numbers.copy()
-        random.shuffle(new_row)
 
-    return new_row
+def _is_latin_rect(matrix):
+    matrix = np.asarray(matrix, dtype=int)
+    if not matrix.size:
+        return False
+
+    # Count the occurrences of each element in each row and each column.
+    n_elements = matrix.max() + 1
+    rows, columns = np.indices(matrix.shape)
+    return (np.bincount((rows * n_elements + matrix).ravel()).max() == 1 and
+            np.bincount((columns * n_elements + matrix).ravel()).max() == 1)
 
 
 by_name = {
@@ -695,6 +1477,8 @@ by_name = {
     'sort': Sorted,
     'latinsquare': LatinSquare,
     'latin_square': LatinSquare,
+    'constrainedshuffle': ConstrainedShuffle,
+    'constrained_shuffle': ConstrainedShuffle,
 }
 
 
@@ -0,0 +1,333 @@
+"""
+This module contains |ReadOnlySection|, a read-only view of an experiment saved in a columnar format,
+and the functions that write and open that format.
+Use |Experiment.save_columns| and |Experiment.open_readonly| rather than calling these functions directly.
+
+The format is a directory holding one ``.npy`` file per data column and per section attribute,
+so that numeric and string data can be memory-mapped rather than parsed.
+Several processes opening the same directory share the operating system's page cache,
+rather than each holding its own copy of the experiment.
+
+"""
+import os
+import numpy as np
+from experimentator import yaml
+from experimentator.section import ExperimentSection
+
+META_FILENAME = 'meta.yaml'
+
+
+def save_columns(section, directory):
+    """
+    Save an |ExperimentSection| and its descendants in columnar format.
+
+    Parameters
+    ----------
+    section : |ExperimentSection|
+        The section to save. All of its bottom-level descendants must be at the same level.
+    directory : str
+        The directory to save in. It will be created if necessary.
+
+    """
+    levels = [section.level] + section.levels
+    sections_by_depth = [[section]]
+    for level in levels[1:]:
+        children = [child for parent in sections_by_depth[-1] for child in parent]
+        if any(child.level != level for child in children):
+            raise ValueError('Cannot save a heterogeneous experiment in columnar format')
+        sections_by_depth.append(children)
+    bottom = sections_by_depth[-1]
+
+    os.makedirs(os.path.join(directory, 'sections'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'columns'), exist_ok=True)
+
+    # Every section covers a contiguous range of bottom-level rows, because sections are stored depth-first.
+    row_bounds = np.arange(len(bottom) + 1)
+    for depth in reversed(range(len(levels))):
+        sections = sections_by_depth[depth]
+        if depth < len(levels) - 1:
+            child_bounds = np.concatenate([[0], np.cumsum([len(s) for s in sections])])
+            row_bounds = row_bounds[child_bounds]
+            _save(directory, 'sections', '{}.children'.format(depth), child_bounds)
+        _save(directory, 'sections', '{}.rows'.format(depth), row_bounds)
+        _save(directory, 'sections', '{}.has_started'.format(depth), np.array([s.has_started for s in sections]))
+        _save(directory, 'sections', '{}.has_finished'.format(depth), np.array([s.has_finished for s in sections]))
+
+    for depth, level in enumerate(levels[1:]):
+        _save(directory, 'columns', 'level.{}'.format(depth + 1), np.array([s.data[level] for s in bottom]))
+
+    columns = []
+    for s in bottom:
+        for key in s.data:
+            if key not in levels and key not in columns:
+                columns.append(key)
+    pickled = []
+    for i, column in enumerate(columns):
+        array = _to_array([s.data.get(column, np.nan) for s in bottom])
+        if array.dtype.hasobject:
+            pickled.append(column)
+        _save(directory, 'columns', str(i), array)
+
+    # Above the bottom level, each section's own values (which a child may override) are saved by depth,
+    # for the keys that any section at that depth has.
+    keys_by_depth = [[key for key in columns if any(key in s.data for s in sections)]
+                     for sections in sections_by_depth]
+    pickled_section_columns = []
+    for depth, sections in enumerate(sections_by_depth[:-1]):
+        for key in keys_by_depth[depth]:
+            name = '{}.column.{}'.format(depth, columns.index(key))
+            array = _to_array([s.data.get(key, np.nan) for s in sections])
+            if array.dtype.hasobject:
+                pickled_section_columns.append(name)
+            _save(directory, 'sections', name, array)
+
+    meta = {
+        'levels': levels,
+        'columns': columns,
+        'pickled_columns': pickled,
+        'pickled_section_columns': pickled_section_columns,
+        'keys_by_depth': keys_by_depth,
+    }
+    with open(os.path.join(directory, META_FILENAME), 'w') as f:
+        yaml.dump(meta, f)
+
+
+def open_columns(directory):
+    """
+    Open an experiment saved by |save_columns|.
+
+    Parameters
+    ----------
+    directory : str
+        The directory the experiment was saved in.
+
+    Returns
+    -------
+    |ReadOnlySection|
+        The top-level section.
+
+    """
+    with open(os.path.join(directory, META_FILENAME), 'r') as f:
+        meta = yaml.load(f)
+    return ReadOnlySection(_ColumnStore(directory, meta), 0, 0)
+
+
+def _save(directory, kind, name, array):
+    np.save(os.path.join(directory, kind, name + '.npy'), array, allow_pickle=array.dtype.hasobject)
+
+
+def _to_array(values):
+    try:
+        array = np.array(values)
+    except ValueError:  # Ragged sequences.
+        array = None
+    if array is None or array.ndim != 1 or (array.dtype.kind in 'US' and not all(isinstance(v, str)
+                                                                                 for v in values)):
+        # Compound values, or strings mixed with missing values, can only be stored as Python objects.
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+    return array
+
+
+class _ColumnStore:
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.levels = meta['levels']
+        self.columns = meta['columns']
+        self.pickled_columns = set(meta['pickled_columns'])
+        self.pickled_section_columns = set(meta['pickled_section_columns'])
+        self.keys_by_depth = meta['keys_by_depth']
+        self._arrays = {}
+
+    def section_array(self, depth, name):
+        return self._load('sections', '{}.{}'.format(depth, name))
+
+    def level_numbers(self, depth):
+        return self._load('columns', 'level.{}'.format(depth))
+
+    def section_column(self, depth, key):
+        name = '{}.column.{}'.format(depth, self.columns.index(key))
+        return self._load('sections', name, pickled=name in self.pickled_section_columns)
+
+    def column(self, key):
+        return self._load('columns', str(self.columns.index(key)), pickled=key in self.pickled_columns)
+
+    def _load(self, kind, name, pickled=False):
+        if (kind, name) not in self._arrays:
+            path = os.path.join(self.directory, kind, name + '.npy')
+            if pickled:
+                self._arrays[kind, name] = np.load(path, allow_pickle=True)
+            else:
+                self._arrays[kind, name] = np.load(path, mmap_mode='r')
+        return self._arrays[kind, name]
+
+
+class ReadOnlySection:
+    """
+    A read-only view of a section of an experiment saved in columnar format,
+    mirroring the reading interface of |ExperimentSection|.
+    Data is read from memory-mapped files when it is accessed;
+    nothing is loaded when the view is created.
+
+    Like |ExperimentSection|, |ReadOnlySection| implements Python's sequence protocol with 1-based indexing.
+
+    Attributes
+    ----------
+    level : str
+    levels : list of str
+    data : dict
+        Data associated with this section,
+        including the data of its parent sections but not of its children.
+        Values missing from this section but present in others at its level are NaN.
+    dataframe : |DataFrame|
+        The data of every bottom-level section in this section.
+    is_bottom_level : bool
+    is_top_level : bool
+    has_started : bool
+    has_finished : bool
+    description : str
+
+    """
+    def __init__(self, store, depth, index):
+        self._store = store
+        self._depth = depth
+        self._index = index
+
+    @property
+    def level(self):
+        return self._store.levels[self._depth]
+
+    @property
+    def levels(self):
+        return self._store.levels[self._depth+1:]
+
+    @property
+    def is_bottom_level(self):
+        return self._depth == len(self._store.levels) - 1
+
+    @property
+    def is_top_level(self):
+        return self._depth == 0
+
+    @property
+    def has_started(self):
+        return bool(self._store.section_array(self._depth, 'has_started')[self._index])
+
+    @property
+    def has_finished(self):
+        return bool(self._store.section_array(self._depth, 'has_finished')[self._index])
+
+    @property
+    def _rows(self):
+        rows = self._store.section_array(self._depth, 'rows')
+        return slice(int(rows[self._index]), int(rows[self._index + 1]))
+
+    @property
+    def data(self):
+        row = self._rows.start
+        data = {level: _scalar(self._store.level_numbers(depth)[row])
+                for depth, level in enumerate(self._store.levels[1:self._depth+1], start=1)}
+        keys = self._store.keys_by_depth[self._depth]
+        if self.is_bottom_level:
+            data.update((key, _scalar(self._store.column(key)[row])) for key in keys)
+        else:
+            data.update((key, _scalar(self._store.section_column(self._depth, key)[self._index])) for key in keys)
+        return data
+
+    @property
+    def description(self):
+        if self.is_top_level:
+            return self.level
+        return '{} {}'.format(self.level, self.data[self.level])
+
+    @property
+    def dataframe(self):
+        from pandas import DataFrame
+        rows = self._rows
+        data = DataFrame({level: self._store.level_numbers(depth)[rows]
+                          for depth, level in enumerate(self._store.levels[1:], start=1)})
+        for key in self._store.columns:
+            data[key] = self._store.column(key)[rows]
+        return data.set_index(self.levels)
+
+    def subsection(self, **section_numbers):
+        """
+        Find a single, descendant |ReadOnlySection| based on section numbers.
+        See |ExperimentSection.subsection|.
+
+        """
+        depths = [self._store.levels.index(level) for level in section_numbers if level in self._store.levels]
+        if len(depths) < len(section_numbers) or not depths or min(depths) <= self._depth:
+            raise ValueError('Could not find specified section.')
+
+        depth = max(depths)
+        rows = self._store.section_array(depth, 'rows')
+        first_rows = np.asarray(rows[:-1])
+        matches = (first_rows >= self._rows.start) & (first_rows < self._rows.stop) & (rows[1:] > rows[:-1])
+        for level, number in section_numbers.items():
+            matches &= self._store.level_numbers(self._store.levels.index(level))[first_rows] == number
+
+        indices = np.flatnonzero(matches)
+        if not len(indices):
+            raise ValueError('Could not find specified section.')
+        return ReadOnlySection(self._store, depth, int(indices[0]))
+
+    def walk(self):
+        """
+        Walk the tree depth-first, starting from here.
+        Yields this section and every descendant section.
+
+        """
+        yield self
+        for child in self:
+            yield from child.walk()
+
+    def __len__(self):
+        if self.is_bottom_level:
+            return 0
+        children = self._store.section_array(self._depth, 'children')
+        return int(children[self._index + 1] - children[self._index])
+
+    def __getitem__(self, item):
+        item = self._convert_index_object(item)
+
+        if isinstance(item, slice):
+            return [self._child(idx) for idx in range(*item.indices(len(self)))]
+
+        elif isinstance(item, tuple):
+            section = self
+            for idx in item:
+                section = section[idx]
+            return section
+
+        else:
+            if item < 0:
+                item += len(self)
+            if not 0 <= item < len(self):
+                raise IndexError('ReadOnlySection index out of range')
+            return self._child(item)
+
+    def _child(self, idx):
+        first_child = self._store.section_array(self._depth, 'children')[self._index]
+        return ReadOnlySection(self._store, self._depth + 1, int(first_child) + idx)
+
+    _convert_index_object = ExperimentSection._convert_index_object
+    _convert_index = staticmethod(ExperimentSection._convert_index)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self._child(idx)
+
+    def __eq__(self, other):
+        if isinstance(other, type(self)):
+            return (self._store.directory, self._depth, self._index) == \
+                (other._store.directory, other._depth, other._index)
+        return False
+
+    def __repr__(self):
+        return '<ReadOnlySection {}>'.format(self.description)
+
+
+def _scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
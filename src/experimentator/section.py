@@ -4,8 +4,12 @@ This module contains the |ExperimentSection| class, which is imported in `__init
 """
 import collections
 import itertools
+import numpy as np
 import networkx as nx
 
+# The number of sections created at a time from a lazily generated order.
+_CHUNK_SIZE = 1000
+
 
 class ExperimentSection:
     """
@@ -89,13 +93,43 @@ class ExperimentSection:
 
         """
         self = cls(tree, data)
-        if not self.is_bottom_level:
-            # Create the section tree. Creating any section also creates the sections below it.
-            self.append_design_tree(self.get_next_tree(), _renumber=False)
-            self._number_children()
-
+        self._create_descendants([self])
         return self
 
+    @staticmethod
+    def _create_descendants(sections):
+        """
+        Create the sections below new, empty sections, one level at a time.
+        All sections that share a tree are ordered together, with a single call to |Design.get_orders|.
+
+        """
+        while sections:
+            groups = collections.OrderedDict()
+            for section in sections:
+                if section.is_bottom_level:
+                    continue
+
+                # Sections created together share a tree, and so the (cached) next tree.
+                key = id(section.tree)
+                next_tree = next(section.tree)
+                if isinstance(next_tree, dict):
+                    branch = section.data[section.heterogeneous_design_iv_name]
+                    key, next_tree = (key, branch), next_tree[branch]
+
+                groups.setdefault(key, (next_tree, []))[1].append(section)
+
+            sections = []
+            for tree, parents in groups.values():
+                for design in tree.levels_and_designs[0].design:
+                    for parent, condition_order in zip(parents, design.get_orders([p.data for p in parents])):
+                        for condition in condition_order:
+                            child = ExperimentSection(tree, _child_data(parent.data, condition))
+                            parent._children.append(child)
+                            sections.append(child)
+
+                for parent in parents:
+                    parent._number_children()
+
     @property
     def level(self):
         return self.tree[0].name
@@ -118,6 +152,91 @@ class ExperimentSection:
         data = DataFrame(section.data for section in self.walk() if section.is_bottom_level)
         return data.set_index(self.levels)
 
+    def long_dataframe(self, columns=None):
+        """
+        Get compound data (e.g., a time series for every trial) in long format.
+        Every element of a compound value becomes its own row,
+        identified by the section's location, the column name, and the position within the value.
+
+        Parameters
+        ----------
+        columns : list of str, optional
+            The compound columns to expand.
+            By default, every column with an array-like value in any bottom-level section is expanded.
+
+        Returns
+        -------
+        |DataFrame|
+            A single column named ``'value'``,
+            indexed by the levels, ``'variable'`` (the column name), and ``'sample'``.
+
+        See Also
+        --------
+        experimentator.section.ExperimentSection.iter_long_dataframes
+
+        """
+        from pandas import concat
+        return concat(list(self.iter_long_dataframes(columns)))
+
+    def iter_long_dataframes(self, columns=None, chunksize=100):
+        """
+        Iterate over the data of |ExperimentSection.long_dataframe| in chunks,
+        to process or write it without holding all of it in memory at once.
+
+        Parameters
+        ----------
+        columns : list of str, optional
+            The compound columns to expand.
+            By default, every column with an array-like value in any bottom-level section is expanded.
+        chunksize : int, optional
+            Number of bottom-level sections per chunk (default 100).
+
+        Yields
+        ------
+        |DataFrame|
+
+        """
+        from pandas import DataFrame
+        levels = self.levels
+        sections = [section for section in self.walk() if section.is_bottom_level]
+        if columns is None:
+            columns = self._compound_columns(sections)
+
+        empty = True
+        for start in range(0, len(sections), chunksize):
+            chunk = sections[start:start+chunksize]
+            paths = [[section.data.get(level) for level in levels] for section in chunk]
+            for column in columns:
+                values = [(i, np.ravel(np.asarray(section.data[column])))
+                          for i, section in enumerate(chunk) if _is_compound(section.data.get(column))]
+                if not values:
+                    continue
+                section_indices, arrays = zip(*values)
+                lengths = np.array([len(array) for array in arrays])
+                rows = np.repeat(section_indices, lengths)
+                starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+                path_columns = np.array(paths, dtype=object)[rows].T
+
+                data = {level: path_column for level, path_column in zip(levels, path_columns)}
+                data.update(variable=column, sample=np.arange(len(rows)) - starts, value=np.concatenate(arrays))
+                empty = False
+                yield DataFrame(data, columns=levels + ['variable', 'sample', 'value']).set_index(
+                    levels + ['variable', 'sample'])
+
+        if empty:
+            yield DataFrame(columns=levels + ['variable', 'sample', 'value']).set_index(
+                levels + ['variable', 'sample'])
+
+    def _compound_columns(self, sections=None):
+        if sections is None:
+            sections = [section for section in self.walk() if section.is_bottom_level]
+        columns = []
+        for section in sections:
+            for column, value in section.data.items():
+                if column not in columns and _is_compound(value):
+                    columns.append(column)
+        return columns
+
     @property
     def levels(self):
         levels = []
@@ -216,7 +335,9 @@ class ExperimentSection:
             The tree to append.
         to_start : bool, optional
             If True, the sections will be inserted at the beginning of the section.
-            If False (the default), they will be appended to the end.
+            If False (the default), they will be appended to the end,
+            generating their order lazily and creating them a chunk at a time
+            (see |ExperimentSection.stream_design_tree|).
 
         Notes
         -----
@@ -225,23 +346,78 @@ class ExperimentSection:
         will be automatically replaced with the correct numbers.
 
         """
-        level, designs = tree.levels_and_designs[0]
-
-        if self.level == level:
-            raise ValueError('DesignTree to be appended is at the same level as the current section')
+        if not to_start:
+            for _ in self.stream_design_tree(tree, _renumber=_renumber):
+                pass
+            return
 
-        if to_start:
-            for design in reversed(designs):
-                for new_data in reversed(design.get_order(self.data)):
-                    self.append_child(new_data, tree=tree, to_start=True, _renumber=False)
+        level, designs = tree.levels_and_designs[0]
+        self._check_appended_level(level)
 
-        else:
-            for design in designs:
-                for new_data in design.get_order(self.data):
-                    self.append_child(new_data, tree=tree, _renumber=False)
+        children = []
+        for design in designs:
+            for new_data in design.get_order(self.data):
+                children.append(ExperimentSection(tree, _child_data(self.data, new_data)))
 
+        self._children.extendleft(reversed(children))
         if _renumber:
             self._number_children()
+        self._create_descendants(children)
+
+    def stream_design_tree(self, tree, _renumber=True):
+        """
+        Append all sections associated with the top level of a |DesignTree| to the end of the |ExperimentSection|,
+        creating them as they are iterated over.
+        Like |ExperimentSection.append_design_tree|,
+        but the order of the new sections is generated lazily (see |Design.iter_order|),
+        and the sections are created (with their descendants) a chunk at a time.
+        Each section is yielded once it has been created and numbered
+        (after the sections already at its level),
+        so it can be used, for example run, before the rest of the sections are laid out.
+        Only the sections that have been yielded (or are in the current chunk) are appended.
+
+        Parameters
+        ----------
+        tree : |DesignTree|
+            The tree to append.
+
+        Returns
+        -------
+        iterator of |ExperimentSection|
+            The new children, in order.
+
+        Examples
+        --------
+        Run a long block one trial at a time, as its trials are created:
+
+            >>> block = exp.subsection(participant=1, block=1)
+            >>> for trial in block.stream_design_tree(trial_tree):
+            ...     exp.run_section(trial)
+
+        """
+        level, designs = tree.levels_and_designs[0]
+        self._check_appended_level(level)
+        return self._stream_design_tree(tree, level, designs, _renumber)
+
+    def _stream_design_tree(self, tree, level, designs, renumber):
+        number = sum(child.level == level for child in self)
+        conditions = (condition for design in designs for condition in design.iter_order(self.data))
+        while True:
+            children = [ExperimentSection(tree, _child_data(self.data, condition))
+                        for condition in itertools.islice(conditions, _CHUNK_SIZE)]
+            if not children:
+                return
+
+            if renumber:
+                for number, child in enumerate(children, start=number + 1):
+                    child.data[level] = number
+            self._children.extend(children)
+            self._create_descendants(children)
+            yield from children
+
+    def _check_appended_level(self, level):
+        if self.level == level:
+            raise ValueError('DesignTree to be appended is at the same level as the current section')
 
     def append_child(self, data, tree=None, to_start=False, _renumber=True):
         """
@@ -631,3 +807,16 @@ class ExperimentSection:
 
     def __contains__(self, item):
         return item in self._children
+
+
+def _is_compound(value):
+    # Arrays and pandas objects have `ndim`; scalars (including numpy scalars) don't, or have ndim 0.
+    return isinstance(value, (list, tuple)) or getattr(value, 'ndim', 0) > 0
+
+
+def _child_data(parent_data, condition):
+    # The condition is shared by every section in it, so it gets its own layer rather than being copied.
+    # Data added to the section itself goes in the first, empty layer.
+    if not condition:
+        return parent_data.new_child()
+    return collections.ChainMap({}, condition, *parent_data.maps)
@@ -0,0 +1,4 @@
+import sys
+
+# The tests of Experiment.run_section_async use syntax and modules that earlier versions don't have.
+collect_ignore = ['test_async_run.py'] if sys.version_info < (3, 7) else []
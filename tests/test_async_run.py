@@ -0,0 +1,105 @@
+"""Tests for Experiment.run_section_async.
+
+"""
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+
+from experimentator import Experiment
+from tests.test_experiment import (make_blocked_exp, make_simple_exp, check_trial, trial, context, Suppress,
+                                   failing_trial, prepare_trial, noop_trial)
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+async def async_trial(experiment, section):
+    await asyncio.sleep(0)
+    return trial(experiment, section)
+
+
+@asynccontextmanager
+async def async_context(experiment, section):
+    with context(experiment, section) as level:
+        await asyncio.sleep(0)
+        yield level
+
+
+class AsyncSuppress(Suppress):
+    async def __aenter__(self):
+        await asyncio.sleep(0)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await asyncio.sleep(0)
+        return self.__exit__(exc_type, exc_val, exc_tb)
+
+
+def test_run_section_async():
+    exp = make_blocked_exp()
+    exp.add_callback('participant', async_context, is_context=True)
+    with pytest.raises(TypeError):
+        exp.run_section(exp[1])
+    exp = make_blocked_exp()
+    exp.add_callback('trial', async_trial)
+    with pytest.raises(TypeError):
+        exp.run_section(exp[1])
+
+    exp = make_blocked_exp()
+    exp.add_callback('trial', async_trial)
+    exp.add_callback('participant', async_context, is_context=True)
+    exp.add_callback('block', context, is_context=True)
+    exp.experiment_data.update({level: level + 's_seen' for level in ('participant', 'block', 'trial')})
+    run(exp.run_section_async(exp[1]))
+    assert exp.session_data['participant'] == 'participant'
+    assert exp.session_data['blocks_started'] == exp.session_data['blocks_ended'] == 3
+    assert exp.session_data['participants_started'] == exp.session_data['participants_ended'] == 1
+    assert exp[1].has_finished and not exp[2].has_started
+    for row in exp.subsection(participant=1).dataframe.iterrows():
+        check_trial(row)
+
+
+def test_run_section_async_exceptions():
+    exp = make_blocked_exp()
+    exp.add_callback('trial', failing_trial)
+    exp.add_callback('block', AsyncSuppress, is_context=True)
+
+    exp.experiment_data['error'] = ValueError
+    run(exp.run_section_async(exp[1]))
+    assert exp.session_data['exited'] == [(block, ValueError) for block in exp[1]]
+    assert not any(block.has_finished for block in exp[1])
+    assert exp[1][1][1].has_finished and not exp[1][1][2].has_finished and not exp[1][1][3].has_started
+
+    exp.experiment_data['error'] = KeyError
+    with pytest.raises(KeyError):
+        run(exp.run_section_async(exp[2]))
+    assert exp.session_data['exited'][-1] == (exp[2][1], KeyError)
+
+
+def test_run_section_async_plan(monkeypatch):
+    # Like Experiment.run_section, sections are run from a compiled plan,
+    # without searching the tree for each section's parents.
+    exp = make_blocked_exp()
+    exp.add_callback('trial', noop_trial)
+    calls = []
+    parents = Experiment.parents
+
+    def counting_parents(self, section):
+        calls.append(section)
+        return parents(self, section)
+    monkeypatch.setattr(Experiment, 'parents', counting_parents)
+
+    run(exp.run_section_async(exp[1], from_section=[1, 2]))
+    assert len(calls) == 1
+    assert exp[1].has_finished and not exp[1][1][1].has_started
+
+
+def test_prepare_callback_async():
+    exp = make_simple_exp()
+    prepared = []
+    exp.add_prepare_callback('trial', prepare_trial, prepared, lookahead=2, func_module='tests.test_experiment')
+    exp.add_callback('trial', async_trial)
+
+    run(exp.run_section_async(exp[2]))
+    assert [s for s, _ in prepared] == list(exp[2])
+    assert exp.session_data['prepared']['trial'] == (exp[2][-1].data['a'], exp[2][-1].data['b'])
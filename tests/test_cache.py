@@ -0,0 +1,91 @@
+"""Tests for AssetCache.
+
+"""
+import numpy as np
+import pytest
+
+from experimentator import Design, Experiment
+from experimentator.cache import AssetCache
+
+
+def make_exp():
+    exp = Experiment.blocked({'a': [False, True], 'b': [0, 1, 2]}, 2, block_ivs={'c': [1, 2]})
+    return exp
+
+
+def test_keys():
+    exp = make_exp()
+    trial = exp.subsection(participant=1, block=1, trial=1)
+    cache = AssetCache(dict)
+    assert cache.key(trial) == (('a', trial.data['a']), ('b', trial.data['b']))
+    assert cache.key(exp.subsection(participant=1, block=1)) == (('c', exp[1][1].data['c']),)
+    assert cache.key({'b': 1, 'a': True}) == (('a', True), ('b', 1))
+
+    cache = AssetCache(dict, ivs=['c', 'a'])
+    assert cache.key(trial) == (('c', trial.data['c']), ('a', trial.data['a']))
+    assert cache.get(trial) == {'c': trial.data['c'], 'a': trial.data['a']}
+
+
+def test_lru():
+    loaded = []
+
+    def load(condition):
+        loaded.append(condition['x'])
+        return condition['x']
+
+    cache = AssetCache(load, maxsize=2)
+    for x in [1, 2, 1, 3, 1, 2]:
+        assert cache.get({'x': x}) == x
+    assert loaded == [1, 2, 3, 2]
+    assert {'x': 1} in cache and {'x': 3} not in cache
+    assert cache.cache_info() == (2, 4, 2, 2, 0)
+
+    cache.clear()
+    assert len(cache) == 0 and cache.cache_info().hits == 2
+
+    with pytest.raises(ValueError):
+        AssetCache(load, maxsize=0)
+
+
+def test_maxbytes():
+    cache = AssetCache(lambda condition: np.zeros(condition['n'], dtype=np.uint8), maxsize=None, maxbytes=100)
+    cache.get({'n': 40})
+    cache.get({'n': 50})
+    assert cache.cache_info().nbytes == 90
+    cache.get({'n': 30})
+    assert len(cache) == 2 and {'n': 40} not in cache and cache.cache_info().nbytes == 80
+    cache.get({'n': 200})
+    assert {'n': 200} not in cache and len(cache) == 2
+
+    cache = AssetCache(str, maxbytes=10, sizeof=len)
+    cache.get({'x': 1})
+    assert cache.cache_info().nbytes == len(str({'x': 1})) and len(cache) == 1
+
+
+def test_warm():
+    loaded = []
+
+    def load(condition):
+        loaded.append(condition)
+        return condition['a'], condition['b']
+
+    design = Design({'a': [False, True], 'b': [0, 1, 2]})
+    cache = AssetCache(load)
+    cache.warm(design)
+    assert len(loaded) == len(cache) == 6
+
+    exp = make_exp()
+    for section in exp.walk():
+        if section.is_bottom_level:
+            assert cache.get(section) == (section.data['a'], section.data['b'])
+    assert len(loaded) == 6
+    assert cache.cache_info().misses == 0
+
+
+def test_experiment_asset_cache():
+    exp = make_exp()
+    with pytest.raises(ValueError):
+        exp.asset_cache('images')
+    cache = exp.asset_cache('images', dict, maxsize=10)
+    assert exp.asset_cache('images') is cache is exp.session_data['asset_caches']['images']
+    assert cache.maxsize == 10
@@ -6,13 +6,18 @@ it.
 """
 import sys
 import os
+import shutil
 import filecmp
 from glob import glob
 from contextlib import contextmanager
+import numpy as np
 from numpy import isnan
+from pandas import read_csv
+from pandas.testing import assert_frame_equal
 import pytest
 
-from experimentator import run_experiment_section, QuitSession, Experiment
+from experimentator import run_experiment_section, export_experiment_data, QuitSession, Experiment, yaml
+from experimentator import Design, DesignTree
 from experimentator.__main__ import main
 from experimentator.order import Ordering
 from tests.test_experiment import make_blocked_exp, check_trial
@@ -184,10 +189,324 @@ def test_export():
         os.remove(file)
 
 
+def test_export_many():
+    make_deterministic_exp()
+    Experiment.load('test.yaml').save('test-2.yaml')
+    call_cli("exp export test*.yaml test.csv")
+    data = read_csv('test.csv', index_col=[0, 1, 2, 3])
+    assert data.index.names == ['source', 'participant', 'block', 'trial']
+    assert list(data.index.get_level_values('source').unique()) == ['test-2.yaml', 'test.yaml']
+    assert len(data) == 2 * len(Experiment.load('test.yaml').dataframe)
+
+    call_cli('exp export test.yaml test-2.yaml test.csv')
+    data = read_csv('test.csv', index_col=[0, 1, 2, 3])
+    assert list(data.index.get_level_values('source').unique()) == ['test.yaml', 'test-2.yaml']
+
+    Experiment.load('test.yaml').save('other.yaml')
+    call_cli("exp export other.yaml test*.yaml test.csv")
+    data = read_csv('test.csv', index_col=[0, 1, 2, 3])
+    assert list(data.index.get_level_values('source').unique()) == ['other.yaml', 'test-2.yaml', 'test.yaml']
+    os.remove('other.yaml')
+
+    export_experiment_data(['test.yaml', 'test-2.yaml'], 'test.csv', processes=1)
+    data = read_csv('test.csv', index_col=[0, 1, 2, 3])
+    assert list(data.index.get_level_values('source').unique()) == ['test.yaml', 'test-2.yaml']
+
+    with pytest.raises(ValueError):
+        export_experiment_data('not-a-file*.yaml', 'test.csv')
+
+    for file in glob('test*.yaml*') + glob('test.csv*'):
+        os.remove(file)
+
+
+def series_trial(experiment, section):
+    return {'series': list(range(section.data['trial']))}
+
+
+def test_long_export():
+    exp = make_blocked_exp()
+    exp.add_callback('trial', series_trial)
+    exp.filename = 'test.yaml'
+    exp.run_section(exp.subsection(participant=1, block=1))
+    exp.save()
+
+    call_cli('exp export test.yaml test.csv --long')
+    data = read_csv('test.csv', index_col=[0, 1, 2, 3, 4])
+    assert list(data.columns) == ['value']
+    assert len(data) == sum(range(1, 9))
+    assert data.loc[(1, 1, 3, 'series')]['value'].tolist() == [0, 1, 2]
+
+    call_cli('exp export test.yaml test.csv --skip series')
+    assert 'series' not in read_csv('test.csv').columns
+
+    for file in glob('test.yaml*') + glob('test.csv*'):
+        os.remove(file)
+
+
+def array_trial(experiment, section):
+    return {'samples': np.full(5000, section.data['trial'], dtype=np.float32)}
+
+
+def test_save_arrays():
+    exp = make_blocked_exp()
+    exp.add_callback('trial', array_trial)
+    exp.run_section(exp.subsection(participant=1, block=1))
+    exp.save('test.yaml')
+    assert not os.path.exists('test.yaml.arrays')
+    exp.save('test.yaml', min_array_bytes=4096)
+    assert os.path.getsize('test.yaml') < 5000 * len(exp.dataframe)
+    assert len(glob('test.yaml.arrays/*.npy')) == 8
+
+    exp = Experiment.load('test.yaml')
+    samples = exp.subsection(participant=1, block=1, trial=3).data['samples']
+    assert isinstance(samples, np.memmap)
+    assert samples.dtype == np.float32
+    assert np.all(samples == 3)
+
+    with pytest.raises(ValueError):
+        yaml.load('!npy test.yaml.arrays/0.npy')
+
+    # Arrays that are no longer referenced are removed.
+    exp.subsection(participant=1, block=1, trial=3).data['samples'] = np.zeros(2000)
+    exp.save('test.yaml', min_array_bytes=4096)
+    assert len(glob('test.yaml.arrays/*.npy')) == 8
+    assert np.all(Experiment.load('test.yaml').subsection(participant=1, block=1, trial=3).data['samples'] == 0)
+
+    # The threshold is saved with the experiment, so later saves (e.g., by exp run) keep arrays out of line.
+    exp = Experiment.load('test.yaml')
+    assert exp.min_array_bytes == 4096
+    exp.filename = 'test.yaml'
+    exp.save()
+    call_cli('exp run test.yaml participant 1 block 2')
+    # Block 2 has the same arrays as block 1, except trial 3 whose array in block 1 was replaced.
+    assert len(glob('test.yaml.arrays/*.npy')) == 9
+    assert isinstance(Experiment.load('test.yaml').subsection(participant=1, block=2, trial=1).data['samples'],
+                      np.memmap)
+
+    # Arrays already stored stay out of line even without a threshold.
+    exp = Experiment.load('test.yaml')
+    exp.min_array_bytes = None
+    exp.subsection(participant=1, block=1, trial=3).data['samples'] = np.zeros(2000)
+    exp.save('test.yaml')
+    assert len(glob('test.yaml.arrays/*.npy')) == 8
+    assert Experiment.load('test.yaml').subsection(participant=1, block=1, trial=3).data['samples'] == 2000 * [0]
+
+    shutil.rmtree('test.yaml.arrays')
+    for file in glob('test.yaml*'):
+        os.remove(file)
+
+
+def replacing_trial(experiment, section):
+    if section.data['trial'] > 1:
+        raise QuitSession('Nope!')
+    return {'samples': np.zeros(5000, dtype=np.float32)}
+
+
+def test_save_arrays_backup():
+    exp = make_blocked_exp()
+    exp.add_callback('trial', array_trial)
+    exp.run_section(exp.subsection(participant=1, block=1))
+    exp.add_callback('trial', replacing_trial)
+    exp.save('test.yaml', min_array_bytes=4096)
+
+    # The backup written when the run fails refers to arrays that the experiment file no longer does.
+    with pytest.raises(QuitSession):
+        run_experiment_section('test.yaml', participant=1, block=1)
+    backup, = glob('test.yaml.*-backup')
+    assert np.all(Experiment.load('test.yaml').subsection(participant=1, block=1, trial=1).data['samples'] == 0)
+    assert np.all(Experiment.load(backup).subsection(participant=1, block=1, trial=1).data['samples'] == 1)
+
+    # Once the backup is removed, so are its arrays.
+    os.remove(backup)
+    Experiment.load('test.yaml').save()
+    assert len(glob('test.yaml.arrays/*.npy')) == 8
+
+    shutil.rmtree('test.yaml.arrays')
+    for file in glob('test.yaml*'):
+        os.remove(file)
+
+
+def test_load_earlier_version():
+    # Saved by version 0.3.1, before fractional designs and the new Latin square parameters.
+    exp = Experiment.load('tests/experiment_0.3.1.yaml')
+    designs = [design for level in exp.tree.levels_and_designs[1:] for design in level.design]
+    assert all(design.resolution is None and design.strength is None for design in designs)
+    assert designs[1].ordering.williams is False
+
+    exp.add_callback('trial', lambda experiment, section: {'result': 1})
+    exp.run_section(exp.subsection(participant=1))
+    assert exp.subsection(participant=1).has_finished
+    assert len(exp.dataframe) == 16
+
+
+def test_append_to_earlier_version():
+    # Saved by version 0.3.1, without any participants yet.
+    # That version added extra data to conditions when ordering them, so the saved conditions lack it.
+    exp = Experiment.load('tests/experiment_0.3.1_extra_data.yaml')
+    exp.append_child({})
+    exp[1].append_design_tree(next(exp[1].tree))
+    for section in list(exp[1].walk())[1:]:
+        assert section.data['practice'] is False
+        if section.is_bottom_level:
+            assert section.data['target'] == 'x'
+    assert len(exp.dataframe) == 8
+
+
+def test_open_readonly():
+    exp = make_blocked_exp()
+    exp.filename = 'test.yaml'
+    exp.run_section(exp.subsection(participant=1, block=2))
+    exp.save_columns()
+
+    readonly = Experiment.open_readonly('test.yaml')
+    assert readonly.levels == exp.levels
+    assert len(readonly) == len(exp)
+    assert [s.description for s in readonly.walk()] == [s.description for s in exp.walk()]
+    columns = readonly.dataframe.columns
+    assert readonly.dataframe.equals(exp.dataframe[columns])
+    # Columns with missing values anywhere in the experiment are stored as floats.
+    assert_frame_equal(readonly[1, 2].dataframe, exp[1, 2].dataframe[readonly[1, 2].dataframe.columns],
+                       check_dtype=False)
+    assert [s.data for s in readonly[1][1:]] == [dict(s.data) for s in exp[1][1:]]
+
+    block = readonly.subsection(participant=1, block=2)
+    assert block.data == dict(exp.subsection(participant=1, block=2).data)
+    assert block.has_finished and not readonly[1, 1].has_started
+    assert block.subsection(trial=3).data == dict(exp.subsection(participant=1, block=2, trial=3).data)
+    assert readonly.subsection(block=2) == readonly[1, 2]
+    with pytest.raises(ValueError):
+        readonly.subsection(participant=100)
+    with pytest.raises(IndexError):
+        readonly[len(exp) + 1]
+
+    exp[1].append_child({'a': True}, tree=exp[1, 1, 1].tree)
+    with pytest.raises(ValueError):
+        exp.save_columns()
+
+    shutil.rmtree('test.yaml.columns')
+
+
+def test_open_readonly_branches():
+    # The IV 'x' is at the block level in one branch, and at the trial level in both.
+    tree = DesignTree.new([('participant', Design(ordering=Ordering(2))),
+                           ('session', Design(ivs={'design': ['a', 'b']}))],
+                          a=[('block', Design(ivs={'x': [1]})), ('trial', Design(ivs={'x': [2, 3]}))],
+                          b=[('block', Design()), ('trial', Design(ivs={'x': [5, 6], 'y': [7]}))])
+    exp = Experiment.new(tree)
+    exp.save_columns('test.columns')
+    readonly = Experiment.open_readonly('test.columns')
+
+    for section, readonly_section in zip(exp.walk(), readonly.walk()):
+        data = readonly_section.data
+        for key, value in data.items():
+            if key in section.data:
+                assert value == section.data[key]
+            else:
+                assert isnan(value)
+        assert set(section.data) <= set(data)
+
+    sessions = {s.data['design']: s for s in readonly[1]}
+    assert sessions['a'][1].data['x'] == 1
+    assert sessions['a'][1, 1].data['x'] in (2, 3)
+    assert isnan(sessions['b'][1].data['x'])
+    assert 'y' not in sessions['b'][1].data
+
+    shutil.rmtree('test.columns')
+
+
+def extra_result_trial(experiment, section):
+    return {'result': 1, 'extra': 2}
+
+
+def test_incremental_export():
+    exp = make_blocked_exp()
+    exp.filename = 'test.yaml'
+    exp.save()
+
+    call_cli('exp export test.yaml test.csv --incremental')
+    assert not os.path.exists('test.csv')
+
+    call_cli('exp run test.yaml participant 1 block 1')
+    call_cli('exp export test.yaml test.csv --incremental')
+    data = read_csv('test.csv', index_col=[0, 1, 2])
+    assert len(data) == 8
+    assert all(data.index.get_level_values('block') == 1)
+
+    call_cli('exp run test.yaml participant 1 block 2')
+    call_cli('exp export test.yaml test.csv --incremental')
+    data = read_csv('test.csv', index_col=[0, 1, 2])
+    assert len(data) == 16
+    assert not data.index.duplicated().any()
+
+    call_cli('exp export test.yaml test.csv --incremental')
+    assert len(read_csv('test.csv', index_col=[0, 1, 2])) == 16
+
+    # New result columns cause the file to be rewritten.
+    exp = Experiment.load('test.yaml')
+    exp.add_callback('trial', extra_result_trial)
+    exp.run_section(exp.subsection(participant=1, block=3))
+    exp.export_data('test.csv', incremental=True)
+    data = read_csv('test.csv', index_col=[0, 1, 2])
+    assert len(data) == 24
+    assert 'extra' in data.columns
+    assert data['extra'].isnull().sum() == 16
+
+    for file in glob('test.yaml*') + glob('test.csv*'):
+        os.remove(file)
+
+
+def test_incremental_export_branches():
+    tree = DesignTree.new([('participant', Design(ordering=Ordering(2))),
+                           ('session', Design(ivs={'design': ['practice', 'test']}, ordering=Ordering()))],
+                          practice=[('trial', Design(ivs={'a': [1, 2]}, extra_data={'feedback': True}))],
+                          test=[('trial', Design(ivs={'b': [1, 2]}))])
+    exp = Experiment.new(tree)
+    exp.add_callback('trial', extra_result_trial)
+    exp.run_section(exp.subsection(participant=1, session=1))
+    exp.export_data('test.csv', incremental=True)
+    assert list(read_csv('test.csv', index_col=[0, 1, 2]).columns) == ['design', 'a', 'feedback', 'b',
+                                                                        'result', 'extra']
+
+    # Columns of the other branch were written from the start, so its sections are appended.
+    exp.subsection(participant=1, session=1, trial=1).data['result'] = 100
+    exp.run_section(exp.subsection(participant=1, session=2))
+    exp.export_data('test.csv', incremental=True)
+    data = read_csv('test.csv', index_col=[0, 1, 2])
+    assert len(data) == 4
+    assert data['result'].tolist() == 4 * [1]
+    assert data['b'].notnull().tolist() == [False, False, True, True]
+
+    for file in glob('test.csv*'):
+        os.remove(file)
+
+
 def bad_trial(experiment, section):
     raise QuitSession('Nope!')
 
 
+def test_plan(capsys):
+    call_cli('exp plan tests/test.yml')
+    out, _ = capsys.readouterr()
+    assert out.splitlines()[:5] == ['participant            12',
+                                    'session                36',
+                                    'block                  60',
+                                    'trial                 528',
+                                    'total                 636']
+    assert 'Estimated file size' in out
+    assert 'Warning' not in out
+
+
+def test_plan_file_size():
+    levels = [('participant', Design(ordering=Ordering(20))),
+              ('block', Design(ivs={'b': [0, 1, 2]}, extra_data={'practice': False}, ordering=Ordering())),
+              ('trial', Design(ivs={'a': list(range(10)), 'c': ['left side', 'right side']},
+                               extra_data={'target': 'x'}, ordering=Ordering(3)))]
+    plan = DesignTree.plan(levels)
+    Experiment.new(DesignTree.new(levels), filename='test.yaml').save()
+    assert abs(plan.disk / os.path.getsize('test.yaml') - 1) < 0.1
+    os.remove('test.yaml')
+
+
 def test_exception():
     exp = make_blocked_exp()
     exp.add_callback('trial', bad_trial)
@@ -1,13 +1,17 @@
 """Tests for objects in experimentator/design.py
 
 """
-from collections import OrderedDict
-from itertools import product
+from collections import OrderedDict, Counter
+from copy import copy, deepcopy
+from math import factorial
+from itertools import product, combinations
 import pytest
 import numpy as np
 
-from experimentator import Design, DesignTree
-from experimentator.order import Shuffle, Ordering, CompleteCounterbalance, Sorted
+from experimentator import Design, DesignTree, yaml
+from experimentator.section import ExperimentSection
+from experimentator.design import fractional_factorial, orthogonal_array
+from experimentator.order import Shuffle, Ordering, CompleteCounterbalance, Sorted, LatinSquare
 
 
 def make_immutable(list_of_dicts):
@@ -131,6 +135,73 @@ def test_design_matrix_with_continuous_iv():
         yield check_design_matrix, d.get_order(), iv_names, iv_values, matrix
 
 
+def test_design_matrix_native_values():
+    matrix = np.array([[0, 1.5], [1, -1.5], [1, 1.5]])
+    d = Design(ivs=[('a', ['low', 'high']), ('b', None)], design_matrix=matrix)
+    d.first_pass()
+    assert d.get_order() == [{'a': 'low', 'b': 1.5}, {'a': 'high', 'b': -1.5}, {'a': 'high', 'b': 1.5}]
+    assert all(type(value) in (str, float) for condition in d.get_order() for value in condition.values())
+
+
+def check_strength(matrix, strength):
+    matrix = np.asarray(matrix)
+    for columns in combinations(range(matrix.shape[1]), strength):
+        rows, counts = np.unique(matrix[:, columns], axis=0, return_counts=True)
+        assert len(rows) == np.prod([len(np.unique(matrix[:, column])) for column in columns])
+        assert len(set(counts)) == 1
+
+
+def test_sorted_with_extra_data():
+    d = Design(ivs={'a': [3, 1, 2]}, ordering=Sorted(order='ascending'), extra_data={'practice': True})
+    d.first_pass()
+    assert d.get_order() == [{'a': 1, 'practice': True}, {'a': 2, 'practice': True}, {'a': 3, 'practice': True}]
+
+
+def test_fractional_factorial():
+    for n_factors, resolution, n_runs in [(3, 3, 4), (7, 3, 8), (4, 4, 8), (8, 4, 16), (16, 4, 32), (5, 5, 16),
+                                          (10, 5, 128), (3, 5, 8)]:
+        matrix = fractional_factorial(n_factors, resolution)
+        assert matrix.shape == (n_runs, n_factors)
+        assert set(matrix.flat) == {-1, 1}
+        yield check_strength, matrix, resolution - 1
+
+    with pytest.raises(ValueError):
+        fractional_factorial(4, 2)
+
+
+def test_orthogonal_array():
+    for n_levels, n_factors, strength, n_runs in [(3, 4, 2, 9), (3, 13, 2, 27), (5, 6, 2, 25), (5, 6, 3, 125),
+                                                  (7, 4, 3, 343), (2, 7, 2, 8), (3, 2, 2, 9), (3, 3, 1, 3)]:
+        matrix = orthogonal_array(n_levels, n_factors, strength)
+        assert matrix.shape == (n_runs, n_factors)
+        assert set(matrix.flat) == set(range(n_levels))
+        yield check_strength, matrix, strength
+
+    with pytest.raises(ValueError):
+        orthogonal_array(4, 3)
+    with pytest.raises(ValueError):
+        orthogonal_array(3, 5, strength=3)
+
+
+def test_fractional_design():
+    d = Design(ivs=[(name, ['low', 'high']) for name in 'abcdefgh'], resolution=4)
+    d.first_pass()
+    order = d.get_order()
+    assert len(order) == 16
+    check_strength([[condition[name] for name in 'abcdefgh'] for condition in order], 3)
+
+    d = Design(ivs={'a': [1, 2, 3], 'b': [1, 2, 3], 'c': [1, 2, 3], 'd': [1, 2, 3]}, strength=2, ordering=Ordering())
+    d.first_pass()
+    assert len(d.get_order()) == 9
+
+    with pytest.raises(ValueError):
+        Design(ivs={'a': [1, 2, 3], 'b': [1, 2]}, resolution=3).first_pass()
+    with pytest.raises(ValueError):
+        Design(ivs={'a': [1, 2, 3], 'b': [1, 2]}, strength=2).first_pass()
+    with pytest.raises(ValueError):
+        Design(ivs={'a': [1, 2]}, design_matrix=[[0], [1]], resolution=3)
+
+
 def check_design(design, iv_names, iv_values, n, data, matrix):
     assert set(design.iv_names) == set(iv_names)
     assert len(design.get_order(data)) == n
@@ -284,6 +355,23 @@ def test_heterogeneous_design_tree():
     yield check_equality, test_block.levels_and_designs[0][0], 'trial'
 
 
+def test_cached_next_tree():
+    tree = make_heterogeneous_tree()
+    participant = next(tree)
+    assert next(tree) is participant
+    assert next(participant) is participant.branches
+    assert len(tree) == 4
+
+    copied = copy(tree)
+    assert '_next' not in copied.__dict__
+    assert copied == tree
+    assert '_next' not in yaml.load(yaml.dump(tree)).__dict__
+
+    tree.add_base_level()
+    assert len(tree) == 5
+    assert next(tree).levels_and_designs[0].name == 'participant'
+
+
 def test_bad_heterogeneity():
     main_structure = [
         ('participant', Design(ivs={'a': [1, 2], 'b': [1, 2]}, ordering=Shuffle(3))),
@@ -358,6 +446,12 @@ def test_design_from_spec():
     spec.pop('name')
     assert Design.from_dict(spec) == Design(ordering=CompleteCounterbalance(3))
 
+    spec = {
+        'ivs': [('a', [1, 2]), ('b', [1, 2]), ('c', [1, 2])],
+        'resolution': 3,
+    }
+    assert Design.from_dict(spec) == Design(ivs=[('a', [1, 2]), ('b', [1, 2]), ('c', [1, 2])], resolution=3)
+
 
 def test_design_tree_from_spec():
     spec = {
@@ -505,3 +599,118 @@ def test_bizarre_equality():
     assert (design == 1) is False
     tree = DesignTree.new([('a', design)])
     assert (tree == 1) is False
+
+
+def count_levels(tree):
+    tree.add_base_level()
+    section = ExperimentSection.new(tree)
+    return Counter(descendant.level for descendant in section.walk() if descendant is not section)
+
+
+def test_plan():
+    levels = [
+        ('participant', Design(ordering=Shuffle(3))),
+        ('block', Design(ivs={'b': [1, 2]}, ordering=CompleteCounterbalance())),
+        ('trial', [Design(ivs={'a': [1, 2]}, ordering=LatinSquare(2)),
+                   Design(ivs={'c': [1, 2, 3]}, ordering=Sorted(order='ascending'))]),
+    ]
+    plan = DesignTree.plan(deepcopy(levels))
+    assert DesignTree.plan(deepcopy(levels)) == plan
+    assert plan.sections == count_levels(DesignTree.new(levels))
+    assert list(plan.sections) == ['participant', 'block', 'trial']
+    assert plan.n_sections == sum(plan.sections.values())
+    assert plan.memory > plan.disk > 0
+    assert not plan.warnings
+
+    with open('tests/test.yml') as f:
+        spec = yaml.load(f)['design']
+    plan = DesignTree.plan_spec(deepcopy(spec))
+    assert plan.sections == count_levels(DesignTree.from_spec(spec))
+
+    plan = DesignTree.plan([('participant', Design()),
+                            ('block', Design(ivs={'a': list(range(6))}, ordering=CompleteCounterbalance()))])
+    assert plan.sections['participant'] == factorial(6)
+    assert len(plan.warnings) == 1
+
+
+def make_cacheable_levels(seed=1, values=(1, 2, 3)):
+    return [('participant', Design(ordering=Shuffle(2))),
+            ('block', Design(ivs={'a': values}, ordering=LatinSquare(seed=seed), extra_data={'x': 1})),
+            ('trial', Design(ivs={'b': [1, 2]}, ordering=CompleteCounterbalance()))]
+
+
+def fail_first_pass(levels_and_designs):
+    raise AssertionError('The first pass should have been cached')
+
+
+def test_first_pass_cache(tmpdir, monkeypatch):
+    make_levels = make_cacheable_levels
+
+    # Off by default.
+    DesignTree.clear_cache()
+    DesignTree.new(make_levels())
+    assert not DesignTree._first_pass_cache
+
+    DesignTree.cache_dir = str(tmpdir)
+    try:
+        first = DesignTree.new(make_levels())
+        assert len(DesignTree._first_pass_cache) == 1
+        assert len(tmpdir.listdir()) == 1
+        second = DesignTree.new(make_levels())
+        assert len(DesignTree._first_pass_cache) == 1
+        assert first == second
+        assert first[1].design[0].get_order({'latin_square_row': 0}) is not \
+            second[1].design[0].get_order({'latin_square_row': 0})
+
+        DesignTree.new(make_levels(seed=2))
+        assert len(DesignTree._first_pass_cache) == 2
+        DesignTree.new(make_levels(seed=None))
+        assert len(DesignTree._first_pass_cache) == 2
+
+        # IV values that can only be iterated once aren't used for the key.
+        tree = DesignTree.new(make_levels(values=(value for value in (1, 2, 3))))
+        assert len(DesignTree._first_pass_cache) == 2
+        assert len(tree[1].design[0].get_order({'latin_square_row': 0})) == 2 * 3
+
+        # Values are compared exactly, not by their (abbreviated) repr.
+        values = np.arange(2000)
+        changed = values.copy()
+        changed[1000] = -1
+        assert repr(values) == repr(changed)
+        assert DesignTree._cache_key(DesignTree._to_levels([('a', Design(ivs={'a': values}))])) != \
+            DesignTree._cache_key(DesignTree._to_levels([('a', Design(ivs={'a': changed}))]))
+
+        # Reloaded from disk once the in-memory cache is empty.
+        DesignTree.clear_cache()
+        with monkeypatch.context() as m:
+            m.setattr(DesignTree, '_first_pass', staticmethod(fail_first_pass))
+            assert DesignTree.new(make_levels()) == first
+        assert len(DesignTree._first_pass_cache) == 1
+    finally:
+        DesignTree.cache_dir = None
+        DesignTree.clear_cache()
+
+
+def test_first_pass_cache_in_memory(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    DesignTree.clear_cache()
+    DesignTree.cache_enabled = True
+    try:
+        first = DesignTree.new(make_cacheable_levels())
+        assert len(DesignTree._first_pass_cache) == 1
+        with monkeypatch.context() as m:
+            m.setattr(DesignTree, '_first_pass', staticmethod(fail_first_pass))
+            assert DesignTree.new(make_cacheable_levels()) == first
+        assert not tmpdir.listdir()
+
+        # Nothing to fall back on once the in-memory cache is empty.
+        DesignTree.clear_cache()
+        with monkeypatch.context() as m:
+            m.setattr(DesignTree, '_first_pass', staticmethod(fail_first_pass))
+            with pytest.raises(AssertionError):
+                DesignTree.new(make_cacheable_levels())
+        assert DesignTree.new(make_cacheable_levels()) == first
+        assert not tmpdir.listdir()
+    finally:
+        DesignTree.cache_enabled = False
+        DesignTree.clear_cache()
@@ -1,11 +1,15 @@
 """Tests for Experiment object.
 
 """
+import time
+import pickle
+import threading
 from contextlib import contextmanager
 import pytest
 
 from experimentator.order import Shuffle, CompleteCounterbalance
 from experimentator import Design, DesignTree, Experiment
+from experimentator.experiment import EnterEvent, ExitEvent
 
 from tests.test_design import check_equality
 
@@ -424,3 +428,179 @@ def test_demo_parent_has_started():
     experiment = Experiment.from_yaml_file('tests/test.yml')
     experiment.run_section(experiment[1][2], demo=True)
     assert not experiment.has_started
+
+
+def test_step_section():
+    exp = Experiment.blocked({'a': [False, True]}, 2,
+                             block_ivs={'b': [0, 1, 2]},
+                             orderings={'trial': Shuffle(4), 'block': CompleteCounterbalance()})
+    for level in ('participant', 'block'):
+        exp.add_callback(level, context, is_context=True)
+    exp.experiment_data.update({level: level + 's_seen' for level in ('participant', 'block', 'trial')})
+
+    stepper = exp.step_section(exp[1])
+    assert stepper.current is None
+    with pytest.raises(ValueError):
+        stepper.record({'result': 0})
+
+    trial_section = stepper.advance()
+    assert trial_section is exp.subsection(participant=1, block=1, trial=1)
+    assert trial_section.has_started and not trial_section.has_finished
+    assert exp.session_data['participant'] == 'participant'
+    assert exp.session_data['blocks_started'] == 1 and 'blocks_ended' not in exp.session_data
+
+    stepper.record(trial(exp, trial_section))
+    next_section = stepper.advance()
+    assert next_section is exp.subsection(participant=1, block=1, trial=2)
+    assert trial_section.has_finished
+    assert trial_section.data['result'] == trial_result(**trial_section.data)['result']
+    stepper.record(trial(exp, next_section))
+
+    for trial_section in stepper:
+        stepper.record(trial(exp, trial_section))
+    assert stepper.finished and stepper.current is None and stepper.advance() is None
+    assert exp[1].has_finished
+    assert exp.session_data['blocks_started'] == exp.session_data['blocks_ended'] == 3
+    assert exp.session_data['participants_ended'] == 1
+    assert exp.subsection(participant=1).dataframe['result'].notnull().all()
+
+    exp.run_section(exp[2])
+    assert exp.session_data['participants_ended'] == 2
+
+
+def test_step_section_close():
+    exp = make_blocked_exp()
+    exp.experiment_data.update({level: level + 's_seen' for level in ('participant', 'block', 'trial')})
+    exp.add_callback('block', context, is_context=True)
+
+    with exp.step_section(exp[1], from_section=[1, 3]) as stepper:
+        assert stepper.advance() is exp.subsection(participant=1, block=1, trial=3)
+        stepper.advance()
+    assert stepper.finished
+    assert 'blocks_ended' not in exp.session_data
+    assert exp.subsection(participant=1, block=1, trial=3).has_finished
+    assert not exp.subsection(participant=1, block=1, trial=4).has_finished
+    assert exp[1].has_started and not exp[1].has_finished
+
+
+def prepare_trial(experiment, section, prepared):
+    prepared.append((section, threading.get_ident()))
+    return section.data['a'], section.data['b']
+
+
+def prepared_trial(experiment, section, prepared):
+    assert experiment.session_data['prepared']['trial'] == (section.data['a'], section.data['b'])
+    parent = experiment.parent(section)
+    if section.data['trial'] < len(parent):
+        # The next trial is prepared while this one runs.
+        next_section = parent[section.data['trial'] + 1]
+        for _ in range(100):
+            if any(s is next_section for s, _ in prepared):
+                break
+            time.sleep(0.01)
+        else:
+            assert False
+    return trial(experiment, section)
+
+
+def test_prepare_callback():
+    exp = make_simple_exp()
+    prepared = []
+    with pytest.raises(ValueError):
+        exp.add_prepare_callback('trial', prepare_trial, prepared, lookahead=0)
+    exp.add_prepare_callback('trial', prepare_trial, prepared, lookahead=2, func_module='tests.test_experiment')
+    exp.add_callback('trial', prepared_trial, prepared, func_module='tests.test_experiment')
+
+    exp.run_section(exp[1], from_section=2)
+    assert [s for s, _ in prepared] == list(exp[1][2:])
+    assert threading.get_ident() not in {thread for _, thread in prepared}
+    for row in exp[1].dataframe.iterrows():
+        if row[0] > 1:
+            check_trial(row)
+
+    loaded = pickle.loads(pickle.dumps(exp))
+    assert loaded.prepare_lookahead_by_level == {'trial': 2}
+    assert loaded.prepare_callback_by_level['trial'](loaded, loaded[3][1]) == (loaded[3][1].data['a'],
+                                                                             loaded[3][1].data['b'])
+
+
+def noop_trial(experiment, section):
+    pass
+
+
+def test_run_plan():
+    exp = make_standard_exp()
+    exp.add_callback('block', context, is_context=True)
+    exp.experiment_data.update({level: level + 's_seen' for level in ('participant', 'block', 'trial')})
+
+    plan = exp.compile_run_plan(exp.subsection(participant=1, block=1))
+    enters = [event for event in plan.events if isinstance(event, EnterEvent)]
+    exits = [event for event in plan.events if isinstance(event, ExitEvent)]
+    assert [event.section for event in enters[:4]] == [exp, exp[1], exp[1][1], exp[1][1][1]]
+    assert [event.section for event in exits[-3:]] == [exp[1][1], exp[1], exp]
+    assert sum(event.pause for event in enters) == len(exp[1][1]) == 8
+    assert all(isinstance(plan.events[event.exit_index], ExitEvent) and
+               plan.events[event.exit_index].section is event.section for event in enters)
+    assert enters[2].is_context and enters[2].callback is exp.callback_by_level['block']
+    assert not exits[-3].ancestors and list(exits[-1].ancestors) == [exp[1], exp]
+
+    exp.run_plan(plan)
+    assert exp[1][1].has_finished and not exp[1].has_finished
+    assert exp.session_data['blocks_started'] == exp.session_data['blocks_ended'] == 1
+    for row in exp[1][1].dataframe.iterrows():
+        check_trial(row)
+
+
+def test_run_plan_overhead(monkeypatch):
+    # Running a plan must not search the tree for each section's parents, which is linear in its size.
+    exp = Experiment.within_subjects({'a': list(range(20)), 'b': list(range(50))}, 1, ordering=Shuffle())
+    exp.add_callback('trial', noop_trial)
+    calls = []
+    parents = Experiment.parents
+
+    def counting_parents(self, section):
+        calls.append(section)
+        return parents(self, section)
+    monkeypatch.setattr(Experiment, 'parents', counting_parents)
+
+    plan = exp.compile_run_plan(exp)
+    assert len(calls) == 1
+    exp.run_plan(plan)
+    assert len(calls) == 1
+    assert exp.has_finished
+
+
+class Suppress:
+    def __init__(self, experiment, section):
+        self.exited = experiment.session_data.setdefault('exited', [])
+        self.section = section
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.exited.append((self.section, exc_type))
+        return exc_type is ValueError
+
+
+def failing_trial(experiment, section):
+    if section.data['trial'] == 2:
+        raise experiment.experiment_data['error']
+
+
+def test_run_plan_exceptions():
+    exp = make_blocked_exp()
+    exp.add_callback('trial', failing_trial)
+    exp.add_callback('block', Suppress, is_context=True)
+
+    exp.experiment_data['error'] = ValueError
+    exp.run_section(exp[1])
+    assert exp.session_data['exited'] == [(block, ValueError) for block in exp[1]]
+    assert not any(block.has_finished for block in exp[1])
+    assert exp[1][1][1].has_finished and not exp[1][1][2].has_finished and not exp[1][1][3].has_started
+
+    exp.experiment_data['error'] = KeyError
+    with pytest.raises(KeyError):
+        exp.run_section(exp[2])
+    assert exp.session_data['exited'][-1] == (exp[2][1], KeyError)
+    assert exp[2].has_started and not exp[2][2].has_started
@@ -2,10 +2,16 @@
 
 """
 from math import factorial
-from itertools import product
+from itertools import product, islice
+from collections import Counter
+import random
+import numpy as np
 import pytest
 
-from experimentator.order import Shuffle, LatinSquare, Ordering, CompleteCounterbalance, Sorted, OrderSchema
+from experimentator import yaml
+from experimentator.order import (Shuffle, LatinSquare, Ordering, CompleteCounterbalance, Sorted, OrderSchema,
+                                  ConstrainedShuffle,
+                                  latin_square, balanced_latin_square, williams_design, _is_latin_rect)
 
 CONDITIONS_3 = [{'a': c} for c in range(3)]
 
@@ -99,6 +105,103 @@ def test_shuffle_generator_condition():
     yield check_repeats, o.get_order()
 
 
+def test_shuffle_avoid_repeats_constrained():
+    o = Shuffle(1000, avoid_repeats=True)
+    o.first_pass(CONDITIONS_3)
+    check_repeats(o.get_order())
+
+    # One condition must take every other position.
+    o = Shuffle(avoid_repeats=True)
+    o.first_pass(3 * [{'a': 1}] + [{'a': 2}, {'a': 3}])
+    assert [c['a'] for c in o.get_order()][::2] == [1, 1, 1]
+    check_repeats(o.get_order())
+
+    with pytest.raises(ValueError):
+        Shuffle(avoid_repeats=True).first_pass(3 * [{'a': 1}] + [{'a': 2}])
+
+
+def test_shuffle_avoid_repeats_distinct_conditions():
+    # Conditions are told apart by value, even if they can't be hashed.
+    conditions = CONDITIONS_2_3 + [{'a': [1], 'b': 10}]
+    o = Shuffle(2, avoid_repeats=True)
+    o.first_pass(conditions)
+    random.seed(0)
+    first = Counter()
+    for _ in range(700):
+        order = o.get_order()
+        check_repeats(order)
+        assert Counter(map(repr, order)) == Counter(map(repr, 2 * conditions))
+        first[repr(order[0])] += 1
+    assert len(first) == 7 and min(first.values()) > 50
+    matrix = o.get_order_matrix(3)
+    assert matrix.shape == (3, 14)
+    assert all(sorted(row) == list(range(14)) for row in matrix.tolist())
+
+    # The grouping of the conditions isn't saved, but a loaded ordering still avoids repeats.
+    assert '_grouped' not in o.__getstate__()
+    loaded = yaml.load(yaml.dump(o))
+    assert loaded == o
+    check_repeats(loaded.get_order())
+
+
+def test_shuffle_order_matrix():
+    o = Shuffle(2)
+    o.first_pass(CONDITIONS_2_3)
+    matrix = o.get_order_matrix(50)
+    assert matrix.shape == (50, 12)
+    assert all(sorted(row) == list(range(12)) for row in matrix.tolist())
+    assert len(set(map(tuple, matrix.tolist()))) > 1
+
+    random.seed(1)
+    first = o.get_order_matrix(5)
+    random.seed(1)
+    assert np.array_equal(o.get_order_matrix(5), first)
+
+    orders = o.get_orders(5 * [{}])
+    assert len(orders) == 5
+    assert all(Counter(map(repr, order)) == Counter(map(repr, 2 * CONDITIONS_2_3)) for order in orders)
+
+    o = Shuffle(3, avoid_repeats=True)
+    o.first_pass(CONDITIONS_3)
+    for order in o.get_orders(20 * [{}]):
+        assert len(order) == 9
+        check_repeats(order)
+
+
+def test_constrained_shuffle():
+    o = ConstrainedShuffle(200, max_run={'a': 2}, forbidden_transitions=[[{'b': 10}, {'b': 20}]], segments=2)
+    o.first_pass(CONDITIONS_2_3)
+    order = o.get_order()
+    assert len(order) == 1200
+    assert not any(first['b'] == 10 and second['b'] == 20 for first, second in zip(order[:-1], order[1:]))
+    assert not any(order[i]['a'] == order[i+1]['a'] == order[i+2]['a'] for i in range(len(order) - 2))
+    assert all(order[:600].count(condition) == 100 for condition in CONDITIONS_2_3)
+    assert not o.get_order() == o.get_order() == o.get_order()
+
+    o = ConstrainedShuffle(2, max_run={'a': 1}, max_iterations=100)
+    o.first_pass([{'a': 1}, {'a': 1}, {'a': 2}])
+    with pytest.raises(ValueError):
+        o.get_order()
+
+    with pytest.raises(ValueError):
+        ConstrainedShuffle(3, segments=2).first_pass(CONDITIONS_3)
+
+
+def test_constrained_shuffle_saved():
+    o = ConstrainedShuffle(4, max_run={'a': 1})
+    o.first_pass(CONDITIONS_2_2)
+    o.get_order()
+
+    # The index of the conditions isn't saved, but a loaded ordering still satisfies the constraints.
+    assert '_grouped' not in o.__getstate__()
+    loaded = yaml.load(yaml.dump(o))
+    assert loaded == o
+    for _ in range(5):
+        order = loaded.get_order()
+        assert all(order.count(condition) == 4 for condition in CONDITIONS_2_2)
+        assert all(c1['a'] != c2['a'] for c1, c2 in zip(order[:-1], order[1:]))
+
+
 def check_unique(o, iv_values):
     iv_combinations = set(product(iv_values, repeat=2)) - {(iv_value, iv_value) for iv_value in iv_values}
     assert not any(o.get_order({o.iv_name: one_iv_value}) == o.get_order({o.iv_name: another_iv_value})
@@ -135,6 +238,40 @@ def test_counterbalance_generator_condition():
     yield check_counterbalance_number, o, len(CONDITIONS_3), iv_values, 1
 
 
+def test_counterbalance_unranking():
+    o = CompleteCounterbalance(2)
+    _, iv_values = o.first_pass(CONDITIONS_3)
+    orders = [o.get_order({o.iv_name: iv_value}) for iv_value in iv_values]
+    assert orders == sorted(orders, key=lambda order: [c['a'] for c in order])
+    assert o.order_ivs == {}
+
+    o = CompleteCounterbalance()
+    _, iv_values = o.first_pass([{'a': c} for c in range(10)])
+    assert len(iv_values) == factorial(10)
+    assert [c['a'] for c in o.get_order({o.iv_name: iv_values[-1]})] == list(reversed(range(10)))
+
+
+def test_counterbalance_saved():
+    o = CompleteCounterbalance()
+    _, iv_values = o.first_pass(CONDITIONS_WITH_REPEAT)
+    # A plain list, which is saved as a YAML sequence.
+    assert type(iv_values) is list and all(type(value) is int for value in iv_values)
+    orders = [o.get_order({o.iv_name: iv_value}) for iv_value in iv_values]
+
+    # The counts of the conditions aren't saved, but a loaded ordering gives the same orders.
+    assert '_counted' not in o.__getstate__()
+    loaded = yaml.load(yaml.dump(o))
+    assert [loaded.get_order({o.iv_name: iv_value}) for iv_value in iv_values] == orders
+
+
+def test_counterbalance_legacy_orders():
+    o = CompleteCounterbalance()
+    o.all_conditions = CONDITIONS_3
+    o.order_ivs = {0: CONDITIONS_3, 1: list(reversed(CONDITIONS_3))}
+    assert o.iv == (o.iv_name, [0, 1])
+    assert o.get_order({o.iv_name: 1}) == list(reversed(CONDITIONS_3))
+
+
 def check_sorted(o, n_conditions):
     assert len(o.get_order({o.iv_name: 'ascending'})) == n_conditions * o.number
     if o.order == 'both':
@@ -203,6 +340,24 @@ def test_latin_square_generator_condition():
         yield check_latin_square_row, o.get_order({iv_name: iv_value})
 
 
+def test_shuffle_iter_order():
+    o = Shuffle(2)
+    o.first_pass(CONDITIONS_2_3)
+    orders = [list(o.iter_order()) for _ in range(3)]
+    assert all(Counter(map(repr, order)) == Counter(map(repr, 2 * CONDITIONS_2_3)) for order in orders)
+    assert not orders[0] == orders[1] == orders[2]
+
+    o = Shuffle(50000)
+    o.first_pass(CONDITIONS_3)
+    first = list(islice(o.iter_order(), 10))
+    assert len(first) == 10
+    assert all(condition in CONDITIONS_3 for condition in first)
+
+    o = Ordering(2)
+    o.first_pass(CONDITIONS_3)
+    assert list(o.iter_order()) == o.get_order()
+
+
 def test_latin_square_repeat():
     o = LatinSquare(2)
     iv_name, iv_values = o.first_pass(CONDITIONS_2_2)
@@ -213,12 +368,104 @@ def test_latin_square_repeat():
         yield check_latin_square_row, ord[:len(ord)//2]
 
 
+def test_uniform_latin_square():
+    for order in (1, 2, 5, 20):
+        square = latin_square(order)
+        assert _is_latin_rect(square) and len(square) == order
+
+    square = latin_square(6, reduced=True, seed=1)
+    assert _is_latin_rect(square)
+    assert square[0] == [row[0] for row in square] == list(range(6))
+    assert square == latin_square(6, reduced=True, seed=1)
+
+    # Every one of the 576 Latin squares of order 4 should be about equally likely.
+    # The critical value of the chi-squared distribution with 575 degrees of freedom at p = 0.0001 is about 702.
+    n_draws = 20 * 576
+    counts = Counter(tuple(map(tuple, latin_square(4, seed=seed))) for seed in range(n_draws))
+    assert len(counts) == 576
+    expected = n_draws / 576
+    assert sum((count - expected)**2 / expected for count in counts.values()) < 702
+
+    o = LatinSquare(balanced=False, uniform=True, seed=3)
+    iv_name, iv_values = o.first_pass(CONDITIONS_6)
+    other = LatinSquare(balanced=False, uniform=True, seed=3)
+    other.first_pass(CONDITIONS_6)
+    assert o.order_ivs == other.order_ivs
+
+
+def test_latin_square_global_seed():
+    for construct in (lambda: latin_square(6), lambda: latin_square(6, uniform=False),
+                      lambda: balanced_latin_square(6), lambda: williams_design(5)):
+        random.seed(1)
+        first = construct()
+        random.seed(1)
+        assert construct() == first
+
+
+def test_non_uniform_latin_square():
+    square = latin_square(100, uniform=False)
+    assert _is_latin_rect(square) and len(square) == 100
+
+    square = latin_square(7, reduced=True, uniform=False)
+    assert square[0] == [row[0] for row in square] == list(range(7))
+    assert latin_square(7, uniform=False, seed=4) == latin_square(7, uniform=False, seed=4)
+
+    o = LatinSquare(balanced=False)
+    iv_name, iv_values = o.first_pass([{'a': c} for c in range(30)])
+    assert len(iv_values) == 30
+    assert _is_latin_rect([[c['a'] for c in o.get_order({iv_name: iv_value})] for iv_value in iv_values])
+
+
+def test_balanced_latin_square():
+    square = balanced_latin_square(8)
+    assert _is_latin_rect(square)
+    transitions = [(first, second) for row in square for first, second in zip(row[:-1], row[1:])]
+    assert len(set(transitions)) == len(transitions) == 8 * 7
+
+    assert not _is_latin_rect([[0, 1], [0, 1]])
+    assert not _is_latin_rect([[0, 0, 1]])
+    assert _is_latin_rect([[0, 1, 2], [2, 0, 1]])
+
+
+def test_williams_design():
+    for order in (3, 5, 6):
+        design = williams_design(order)
+        assert len(design) == (2 * order if order % 2 else order)
+        transitions = Counter((first, second) for row in design for first, second in zip(row[:-1], row[1:]))
+        assert len(transitions) == order * (order - 1)
+        assert len(set(transitions.values())) == 1
+        assert all(set(Counter(column).values()) == {len(design) // order} for column in zip(*design))
+
+    o = LatinSquare(williams=True)
+    iv_name, iv_values = o.first_pass(CONDITIONS_3)
+    assert len(iv_values) == 6
+    yield check_unique, o, iv_values
+
+
+def test_latin_square_saved_by_earlier_version():
+    saved = """!!python/object:experimentator.order.LatinSquare
+all_conditions: [{a: 0}, {a: 1}]
+balanced: true
+number: 1
+order_ivs:
+  0: [{a: 0}, {a: 1}]
+  1: [{a: 1}, {a: 0}]
+uniform: false
+"""
+    o = yaml.load(saved)
+    assert repr(o) == repr(LatinSquare())
+    assert (o.iterations, o.seed, o.williams) == (None, None, False)
+    assert o.get_order({o.iv_name: 1}) == [{'a': 1}, {'a': 0}]
+
+
 def check_repr(obj):
     assert obj == eval(repr(obj))
 
 
 def test_reprs():
-    for ord in (CompleteCounterbalance(), Shuffle(), LatinSquare(), Ordering(), Sorted()):
+    for ord in (CompleteCounterbalance(), Shuffle(), LatinSquare(), LatinSquare(uniform=True, balanced=False, seed=2),
+                LatinSquare(williams=True), ConstrainedShuffle(2, {'a': 2}, [[{'a': 1}, {'a': 2}]], segments=2),
+                Ordering(), Sorted()):
         yield check_repr, ord
 
 
@@ -234,6 +481,17 @@ def test_schema_list():
     assert OrderSchema.from_any(['Shuffle', 2]) == Shuffle(2)
 
 
+def test_schema_constrained_shuffle():
+    spec = {
+        'name': 'constrained_shuffle',
+        'number': 4,
+        'max_run': {'a': 3},
+        'forbidden_transitions': [[{'a': 1}, {'a': 2}]],
+    }
+    assert OrderSchema.from_any(spec) == ConstrainedShuffle(4, max_run={'a': 3},
+                                                            forbidden_transitions=[[{'a': 1}, {'a': 2}]])
+
+
 def test_schema_dict():
     spec = {
         'name': 'sorted',
@@ -6,7 +6,7 @@ import pytest
 
 from experimentator import Design, DesignTree
 from experimentator.section import ExperimentSection
-from experimentator.order import Ordering
+from experimentator.order import Ordering, Shuffle
 
 from tests.test_design import make_heterogeneous_tree
 
@@ -75,6 +75,54 @@ def test_appending_tree():
         section.append_design_tree(make_tree(['session', 'block', 'trial'], {}))
 
 
+def test_streaming_tree():
+    section = ExperimentSection.new(make_tree(['session', 'block', 'trial'], {}))
+    tree = DesignTree.new([('block', [Design({'c': [1, 2]}, extra_data={'foo': 'bar'}, ordering=Shuffle(1500))]),
+                           ('trial', [Design({'a': [1, 2]}, ordering=Ordering())])])
+    blocks = section.stream_design_tree(tree)
+    first = next(blocks)
+    # Only the first chunk has been created.
+    assert len(section) == 6 + 1000
+    assert first.data['block'] == 7 and first.data['foo'] == 'bar'
+    assert len(first) == 2 and first[2].data['trial'] == 2
+
+    assert [block.data['block'] for block in blocks] == list(range(8, 3007))
+    assert len(section) == 6 + 3000
+    assert sum(block.data.get('c') == 1 for block in section) == 1500
+
+    with pytest.raises(ValueError):
+        section.stream_design_tree(make_tree(['session', 'block', 'trial'], {}))
+
+    # As when appending to the start, section numbers are left alone if not renumbering.
+    section = ExperimentSection.new(make_tree(['session', 'block', 'trial'], {}))
+    section.append_design_tree(tree, _renumber=False)
+    assert len(section) == 6 + 3000
+    assert all('block' not in block.data for block in section[7:])
+
+
+def test_siblings_ordered_independently():
+    tree = DesignTree.new([('experiment', [Design()]),
+                           ('participant', [Design(ordering=Ordering(20))]),
+                           ('block', [Design(ivs={'a': range(10)}, ordering=Shuffle())])])
+    section = ExperimentSection.new(tree)
+    orders = [tuple(block.data['a'] for block in participant) for participant in section]
+    assert len(orders) == 20
+    assert all(sorted(order) == list(range(10)) for order in orders)
+    assert len(set(orders)) > 1
+    assert all(block.data['block'] == i for participant in section for i, block in enumerate(participant, 1))
+
+
+def test_shared_conditions():
+    section = ExperimentSection.new(make_tree(['session', 'block', 'trial'], {'foo': 'bar'}))
+    first, second = section[1][1], section[2][1]
+    assert first.data['foo'] == second.data['foo'] == 'bar'
+    assert first.data.maps[1] is second.data.maps[1]
+
+    first.add_data({'a': 100})
+    assert first.data['a'] == 100
+    assert second.data['a'] == 0
+
+
 def test_append_child():
     section = ExperimentSection.new(make_tree(['session', 'block', 'trial'], {}))
     section.append_child(dict(test=True))
@@ -231,3 +279,25 @@ def test_as_graph():
     assert len(graph[(('session', 1),)]) == 6
     assert set(graph.node[(('session', 1),)]) == {'_has_started', '_has_finished'}
     assert set(graph.node[(('session', 1), ('block', 1))]) == {'_has_started', '_has_finished', 'a', 'b', 'd'}
+
+
+def test_long_dataframe():
+    import numpy as np
+    section = ExperimentSection.new(make_tree(['session', 'block', 'trial'], {}))
+    for block in section:
+        for trial in block:
+            trial.add_data({'series': np.arange(trial.data['trial']), 'scalar': 1})
+    section[1][1].add_data({'other': [5.0, 6.0]})
+
+    long = section.long_dataframe()
+    assert list(long.columns) == ['value']
+    assert long.index.names == ['block', 'trial', 'variable', 'sample']
+    assert len(long) == 6 * sum(range(1, 7)) + 2
+    assert set(long.index.get_level_values('variable')) == {'series', 'other'}
+    assert long.loc[(3, 4, 'series')]['value'].tolist() == [0, 1, 2, 3]
+    assert long.loc[(1, 1, 'other')]['value'].tolist() == [5.0, 6.0]
+
+    assert len(section.long_dataframe(['other'])) == 2
+    chunks = list(section.iter_long_dataframes(['series'], chunksize=4))
+    assert len(chunks) == 9
+    assert pd.concat(chunks).equals(section.long_dataframe(['series']))
@@ -18,3 +18,40 @@ def test_round_trip(data):
         assert np.all(cmp)
     else:
         assert cmp
+
+
+def test_array_store(tmpdir):
+    from experimentator._patched_yaml import array_store
+    filename = str(tmpdir.join('data.yaml'))
+    data = {'small': np.arange(3), 'large': np.arange(5000, dtype=np.float32), 'large_2d': np.eye(50)}
+
+    with array_store(filename, min_bytes=1024):
+        dumped = yaml.dump(data)
+    assert len(tmpdir.join('data.yaml.arrays').listdir()) == 2
+    assert '!npy' in dumped
+
+    with array_store(filename):
+        loaded = yaml.load(dumped)
+    assert loaded['small'] == [0, 1, 2]
+    assert isinstance(loaded['large'], np.memmap)
+    assert loaded['large'].dtype == np.float32
+    assert np.all(loaded['large'] == data['large'])
+    assert np.all(loaded['large_2d'] == data['large_2d'])
+
+    # Loaded arrays are dumped again to the same files.
+    with array_store(filename, min_bytes=1024):
+        assert yaml.dump(loaded) == dumped
+    assert len(tmpdir.join('data.yaml.arrays').listdir()) == 2
+
+
+def test_array_store_per_thread(tmpdir):
+    from threading import Thread
+    from experimentator._patched_yaml import array_store
+
+    dumped = []
+    thread = Thread(target=lambda: dumped.append(yaml.dump(np.zeros(3))))
+    with array_store(str(tmpdir.join('test.yaml')), min_bytes=0):
+        assert '!npy' in yaml.dump(np.zeros(3))
+        thread.start()
+        thread.join()
+    assert '!npy' not in dumped[0]